@@ -14,5 +14,5 @@ py.test .
 
 rm -f run-list.txt
 
-python reprocess_create_run_list.py
+python reprocess_create_run_list.py --merge
 
@@ -14,6 +14,16 @@ py.test .
 
 rm -f reprocess-s3.log
 
+# The checkpoint and work queue only carry over between agents and reruns
+# on storage they all mount
+if [ -n "${REPROCESS_SHARED_DIR:-}" ]; then
+  export REPROCESS_CHECKPOINT="${REPROCESS_SHARED_DIR}/reprocess-checkpoint"
+  export REPROCESS_QUEUE="${REPROCESS_SHARED_DIR}/reprocess-queue.db"
+  log "Checkpoint and work queue under ${REPROCESS_SHARED_DIR}"
+else
+  warn "REPROCESS_SHARED_DIR not set, the checkpoint is local to this agent\n"
+fi
+
 python reprocess_s3_documents.py
 
 
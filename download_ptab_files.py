@@ -0,0 +1,85 @@
+#!/usr/bin/env python 3.5
+
+#Description:   This script downloads the weekly PTAB zip files from the USPTO
+#bulk data site for a range of dates. The file names are built the same way
+#retrieve_ptab_files.sh always has, the files are probed and downloaded several
+#at a time, and a download that is cut off is resumed from where it stopped.
+#Every finished file is recorded with its size and SHA-256 in a manifest, and
+#files already downloaded are only checked against it.
+
+import sys, os, time, argparse
+
+from s3_upload.ptab_download import DownloadManifest, PtabDownloader, week_names, DOWNLOADED, PRESENT, MISSING, ERROR
+
+#download all weekly archives from startdate to enddate
+def downloadArchives(startdate, enddate):
+    names = list(week_names(startdate, enddate))
+    counts = dict.fromkeys([DOWNLOADED, PRESENT, MISSING, ERROR], 0)
+    received = 0
+    start = time.time()
+
+    with PtabDownloader(baseURL, droplocation, manifest, workers=args.workers) as downloader:
+        for result in downloader.run(names):
+            counts[result.status] += 1
+            if result.status == DOWNLOADED:
+                received += result.size
+                print('-- Downloaded file: {} ({} bytes in {:.1f}s)'.format(result.name, result.size, result.seconds))
+            elif result.status == MISSING:
+                print('-- File does not exist: {}{}'.format(baseURL, result.name))
+            elif result.status == ERROR:
+                print('-- Download failed: {} {}'.format(result.name, result.error))
+
+    elapsed = max(time.time() - start, 1e-9)
+    print('-- {} of {} files downloaded, {} already present, {} missing, {} failed'.format(
+          counts[DOWNLOADED], len(names), counts[PRESENT], counts[MISSING], counts[ERROR]))
+    print('-- {} bytes in {:.1f}s ({:.0f} bytes/s)'.format(received, elapsed, received / elapsed))
+    return counts[ERROR] == 0
+
+if __name__ == '__main__':
+    scriptpath = os.path.dirname(os.path.abspath(__file__))
+    baseURL = 'https://bulkdata.uspto.gov/data2/patent/trial/appeal/board/'
+    manifestpath = os.path.join(scriptpath, 'logs', 'ptabdownloads.db')
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+                        '-s',
+                        '--startdate',
+                        required=False,
+                        help='Specify first date to download - format YYYYMMDD',
+                        type=str,
+                        default='19970702'
+                       )
+    parser.add_argument(
+                        '-e',
+                        '--enddate',
+                        required=False,
+                        help='Specify last date to download - format YYYYMMDD',
+                        type=str,
+                        default=time.strftime('%Y%m%d')
+                       )
+    parser.add_argument(
+                        '-d',
+                        '--droplocation',
+                        required=False,
+                        help='Specify directory to download to',
+                        type=str,
+                        default=os.path.join('files', 'PTAB')
+                       )
+    parser.add_argument(
+                        '-w',
+                        '--workers',
+                        required=False,
+                        help='Specify number of files to download at a time',
+                        type=int,
+                        default=4
+                       )
+    args = parser.parse_args()
+    droplocation = os.path.join(scriptpath, args.droplocation)
+
+    manifest = DownloadManifest(manifestpath)
+    try:
+        ok = downloadArchives(args.startdate, args.enddate)
+    finally:
+        manifest.close()
+
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,75 @@
+#!/usr/bin/env python 3.5
+
+#Organization:  Commerce Data Service
+#Description:   One-time import of the solrComplete.log / solrcomplete.txt completion
+#logs written by the Solr loaders into the completion ledger (logs/solrcomplete.db).
+#Each path passed is walked recursively, so the nested logs/solr_upload trees and the
+#per-series extractedfiles and PTAB directories can all be imported in one run. Logs
+#under logs/solr_upload, written for documents sent to Solr from S3, are imported
+#into the S3 namespace of the core so the local JSON loads do not skip them.
+
+import os, logging, time, argparse
+
+from s3_upload.ledger import Ledger, LOG_NAMES, S3_LOG_DIR, s3_namespace
+
+#completion log files under path, path itself when it is a file
+def logFiles(path):
+    if not os.path.isdir(path):
+        yield path
+        return
+    for dirpath, dirnames, filenames in os.walk(path):
+        for name in filenames:
+            if name in LOG_NAMES:
+                yield os.path.join(dirpath, name)
+
+#logs of documents sent from S3 are kept in their own namespace
+def ledgerFor(fname):
+    if S3_LOG_DIR in os.path.abspath(fname).split(os.sep):
+        return s3ledger
+    return ledger
+
+if __name__ == '__main__':
+    #logging configuration
+    logging.basicConfig(
+                        filename='logs/import-solr-logs-'+time.strftime('%Y%m%d')+'.txt',
+                        level=logging.INFO,
+                        format='%(asctime)s - %(name)s - %(levelname)s -%(message)s',
+                        datefmt='%Y%m%d %H:%M:%S'
+                       )
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+                        '-c',
+                        '--core',
+                        required=True,
+                        help='Specify the Solr core the logs were written for (e.g. ptab, oadata_3_shard1_replica1)',
+                        type=str
+                       )
+    parser.add_argument(
+                        '-l',
+                        '--ledger',
+                        required=False,
+                        help='Specify the ledger file to import into',
+                        type=str,
+                        default=os.path.join('logs', 'solrcomplete.db')
+                       )
+    parser.add_argument(
+                        'paths',
+                        help='Log files or directories to import (directories are searched recursively)',
+                        nargs='+'
+                       )
+    args = parser.parse_args()
+    logging.info("-- [JOB START]  ----------------")
+
+    ledger = Ledger(args.ledger, args.core, commit_every=10000)
+    s3ledger = Ledger(args.ledger, s3_namespace(args.core), commit_every=10000)
+    for path in args.paths:
+        n = 0
+        for fname in logFiles(path):
+            n += ledgerFor(fname).import_log(fname)
+        logging.info('-- Imported {} entries from: {}'.format(n, path))
+        print('Imported {} entries from {}'.format(n, path))
+    for l in (ledger, s3ledger):
+        logging.info('-- Ledger now holds {} entries for: {}'.format(len(l), l.namespace))
+        l.close()
+
+    logging.info("-- [JOB END] -------------------")
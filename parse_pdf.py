@@ -3,22 +3,140 @@
   https://github.com/18f/doc_processing_toolkit
 
   This needs to be used because Tika is only able to parse a portion of our files.
+
+  Pass any number of PDF files, directories and weekly PTAB zip archives. They
+  are extracted by a pool of long running worker processes that load the
+  toolkit once, and a PDF that takes longer than the timeout is abandoned so
+  it can not hold up the rest. Directories and archives only have the PDF
+  files without a text file extracted. The PDF members of an archive are read
+  in place, their text files are written where unzipping the archive would have
+  put them, and the members done are kept in a manifest so later runs skip them.
+
+  With --tika the PDFs are sent to one or more tika-server instances instead,
+  --workers requests at a time to each of them.
+
+  With --store the text of every PDF is also kept under the SHA-256 of the PDF,
+  and a PDF whose text is already there is copied instead of extracted. Point
+  machines at a shared directory to share the store.
 '''
-import sys
-from textextraction.extractors import text_extractor
-import os.path
-
-
-filepath = sys.argv[-1]
-base_path = os.path.abspath(os.path.dirname(__file__))
-full_filepath = os.path.join(base_path, filepath)
-
-try:
-    # this will create a file by the same name, in the same location, with the .txt extension
-    file_contents = text_extractor(doc_path=full_filepath, force_convert=False)
-except FileNotFoundError as e:
-    print('Path {} does not exist'.format(full_filepath))
-    print(e)
-except Exception as e:
-    print('Something went wrong. :(')
-    print(e)
+import os, os.path, argparse, zipfile
+
+from s3_upload.extraction import ExtractionPool, ExtractionStats, ExtractionTask, archive_tasks, directory_tasks, OK
+from s3_upload.ledger import Ledger
+from s3_upload.tika import TikaClient
+from s3_upload.textstore import TextStore
+
+
+#manifest of the archive members already extracted, kept open while the
+#archive is being listed or has tasks out
+def openManifest(path):
+    if path not in manifests:
+        manifests[path] = Ledger(manifestpath, os.path.basename(path))
+        outstanding[path] = 0
+    outstanding[path] += 1
+    return manifests[path]
+
+#closes the manifest once the listing and every task of the archive are done,
+#so only the archives in flight hold a database connection
+def releaseManifest(path):
+    outstanding[path] -= 1
+    if outstanding[path] == 0:
+        manifests.pop(path).close()
+        del outstanding[path]
+
+#extraction tasks for the files, directories and archives passed in
+def getTasks(paths):
+    for filepath in paths:
+        full_filepath = os.path.join(base_path, filepath)
+        if full_filepath.endswith('.zip'):
+            manifest = openManifest(full_filepath)
+            try:
+                for task in archive_tasks(full_filepath, manifest):
+                    outstanding[full_filepath] += 1
+                    yield task
+            except (IOError, zipfile.BadZipFile) as e:
+                print('Archive {} could not be read'.format(full_filepath))
+                print(e)
+            finally:
+                releaseManifest(full_filepath)
+        elif os.path.isdir(full_filepath):
+            for task in directory_tasks(full_filepath):
+                yield task
+        elif os.path.isfile(full_filepath):
+            # this will create a file by the same name, in the same location, with the .txt extension
+            yield ExtractionTask(full_filepath, None, os.path.splitext(full_filepath)[0]+'.txt')
+        else:
+            print('Path {} does not exist'.format(full_filepath))
+
+if __name__ == '__main__':
+    base_path = os.path.abspath(os.path.dirname(__file__))
+    manifestpath = os.path.join(base_path, 'logs', 'ptabmanifest.db')
+    manifests = {}
+    outstanding = {}
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+                        'paths',
+                        help='PDF files, directories or PTAB zip archives to extract',
+                        nargs='+'
+                       )
+    parser.add_argument(
+                        '-w',
+                        '--workers',
+                        required=False,
+                        help='Specify number of extraction processes, or of requests to each tika-server',
+                        type=int,
+                        default=os.cpu_count()
+                       )
+    parser.add_argument(
+                        '-t',
+                        '--timeout',
+                        required=False,
+                        help='Specify number of seconds before the extraction of one PDF is abandoned',
+                        type=int,
+                        default=300
+                       )
+    parser.add_argument(
+                        '--tika',
+                        required=False,
+                        help='Specify url of a tika-server to extract with, may be given more than once',
+                        action='append',
+                        default=[]
+                       )
+    parser.add_argument(
+                        '-s',
+                        '--store',
+                        required=False,
+                        help='Specify directory of the text store shared by extraction runs',
+                        default=None
+                       )
+    args = parser.parse_args()
+
+    store = TextStore(os.path.join(base_path, args.store)) if args.store else None
+
+    stats = ExtractionStats()
+    if args.tika:
+        pool = TikaClient(args.tika, max_in_flight=args.workers, timeout=args.timeout, store=store)
+    else:
+        pool = ExtractionPool(workers=args.workers, timeout=args.timeout, store=store)
+
+    with pool:
+        for result in pool.run(getTasks(args.paths)):
+            stats.add(result)
+            if result.task.member is not None:
+                if result.status == OK:
+                    manifests[result.task.source].mark(result.task.member)
+                releaseManifest(result.task.source)
+            print('{}{} {:.2f}s {} pages: {}'.format(result.status, ' (stored)' if result.cached else '',
+                                                     result.seconds, result.pages,
+                                                     result.task.member or result.task.source))
+            if result.error:
+                print(result.error)
+
+    for manifest in manifests.values():
+        manifest.close()
+
+    summary = stats.summary()
+    print('Extracted {ok} of {files} files ({cached} from the text store, {failed} failed, {timeouts} timed out, {errors} errors)'.format(**summary))
+    print('{pages} pages in {seconds:.1f}s, {files_per_second:.2f} files/s, {pages_per_second:.2f} pages/s'.format(**summary))
+    print('Latency per file: mean {latency_mean:.2f}s, p50 {latency_p50:.2f}s, p95 {latency_p95:.2f}s, max {latency_max:.2f}s'.format(**summary))
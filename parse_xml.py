@@ -10,72 +10,70 @@
 #to a file.  Lastly, it sends the documents from the json file to Solr for
 #indexing.
 
-import sys, json, xmltodict, os, logging, time, argparse, glob, requests
+import sys, json, os, logging, time, argparse, glob, zipfile
 import dateutil.parser
 
 from datetime import datetime
 
+from s3_upload.ledger import Ledger
+from s3_upload.ptab import NdjsonWriter, PtabArchive, PtabMetadata
+from s3_upload.solr import Solr
+
 
 #change extension of file name to specified extension
 def changeExt(fname, ext):
     seq = (os.path.splitext(fname)[0], ext)
     return '.'.join(seq)
 
+#name of the processed records file of an archive, archives processed by earlier
+#versions keep their single document JSON file
+def jsonName(fname):
+    fn = changeExt(fname,'json')
+    if os.path.isfile(os.path.abspath(fn)):
+        return fn
+    return changeExt(fname,'ndjson')
+
 #get field(date) and return in a proper iso format
 def formatDate(x, field):
     date = dateutil.parser.parse(x.pop(field))
     dateiso = date.isoformat()+'Z'
     return dateiso
 
-#send document to Solr for indexing
-def sendToSolr(core, json):
-     #add try-catch block
-     jsontext = '{"add":{ "doc":'+json+',"boost":1.0,"overwrite":true, "commitWithin": 1000}}'
-     url = os.path.join(solrURL,"solr",core,"update")
-     headers = {"Content-type" : "application/json"}
-     
-     return requests.post(url, data=jsontext, headers=headers)
-
+#stream the records of a processed archive to Solr
 def readJSON(fname):
     try:
-        with open(os.path.abspath(fname)) as fd:
-            doc = json.loads(fd.read())
-            records = doc['main']['DATA_RECORD']
-            for x in records:
-                docid = x.get('DOCUMENT_IMAGE_ID',x.get('DOCUMENT_NM'))
-                jsontext = json.dumps(x)
-                #need to change this line
-                print(os.path.join(os.path.dirname(fname)))
-                with open(os.path.join(os.path.dirname(fname),'solrcomplete.txt'),'a+') as logfile:
-                    logfile.seek(0)
-                    if docid+"\n" in logfile:
-                       logging.info("-- file: "+docid+"  already processed by Solr")
-                       continue
-                    else:
-                       logging.info("-- Sending file: "+docid+" to Solr")
-                       response = sendToSolr('ptab', jsontext)
-                       r = response.json()
-                       status = r["responseHeader"]["status"]
-                       if status == 0:
-                           logfile.write(docid+"\n")
-                           logging.info("-- Solr update for file: "+docid+" complete")
-                       else:
-                           logging.info("-- Solr error for doc: "+docid+" error: "+', '.join("{!s}={!r}".format(k,v) for (k,v) in rdict.items()))
+        for x in PtabMetadata.read_json(os.path.abspath(fname)):
+            docid = x.get('DOCUMENT_IMAGE_ID',x.get('DOCUMENT_NM'))
+            if docid in ledger:
+                logging.info("-- file: "+docid+"  already processed by Solr")
+                continue
+            jsontext = json.dumps(x)
+            logging.info("-- Sending file: "+docid+" to Solr")
+            logSolrBatches(solr.add_documents([(docid, jsontext)]), ledger)
     except IOError as e:
         logging.error("I/O error({0}): {1}".format(e.errno,e.strerror))
     except:
         logging.error("Unexpected error:", sys.exc_info()[0])
         raise
 
+#record the documents of each completed Solr batch in the completion ledger
+def logSolrBatches(batches, ledger):
+    for batch in batches:
+        if batch.status == 0:
+            ledger.mark_all(batch.keys)
+            logging.info("-- Solr update for {} files complete: ".format(len(batch.keys))+"; ".join(batch.keys))
+        else:
+            logging.error("-- Solr error for batch of {} docs: ".format(len(batch.keys))+\
+            ', '.join("{!s}={!r}".format(k,v) for (k,v) in batch.response.items()))
+            logging.error("-- Files not indexed: "+"; ".join(batch.keys))
+
 #this function contains the code for parsing the xml file
-#and writing the results out to a json file
-def processXML(fname):
+#and writing the results out to a json file, one record per line
+def processXML(fname, source=None):
     try:
-        with open(os.path.abspath(fname)) as fd:
-            fn = changeExt(fname,'json')
-            doc = xmltodict.parse(fd.read())
-            records = doc['main']['DATA_RECORD']
-            for x in records:
+        fn = changeExt(fname,'ndjson')
+        with NdjsonWriter(fn) as outfile:
+            for x in PtabMetadata.records(source or os.path.abspath(fname)):
                 docid = x.get('DOCUMENT_IMAGE_ID',x.get('DOCUMENT_NM'))
                 txtfn = os.path.join(os.path.dirname(fn),'PDF_image',docid+'.txt')
                 if os.path.isfile(txtfn):
@@ -90,15 +88,14 @@ def processXML(fname):
                     with open(txtfn) as dr:
                         text = dr.read()
                         x['textdata'] = text
+                    outfile.write(x)
                 else:
+                    #the partly written file is discarded
                     logging.info("TXT file: "+docid+".txt  does not exist. JSON file creation skipped.")
-                    return 
+                    return
 
-            #transform output to json and save to file with same name
-            with open(fn,'w') as outfile:
-                json.dump(doc,outfile)
-                logging.info("-- Processing of XML file complete")
-                #process new JSON file
+            outfile.commit()
+            logging.info("-- Processing of XML file complete")
     except IOError as e:
         logging.error("I/O error({0}): {1}".format(e.errno,e.strerror))
     except:
@@ -114,8 +111,9 @@ def validDate(s):
         msg = "Not a valid date: '{0}'.".format(s)
         raise argparse.ArgumentTypeError(msg)
 
-def processFile(filename):
-    fn = changeExt(filename,'json')
+#source is an open archive member when the metadata is read from a zip file
+def processFile(filename, source=None):
+    fn = jsonName(filename)
     if os.path.isfile(os.path.abspath(fn)):
         if (args.skipsolr):
             logging.info("-- XML file: "+filename+" already processed.  Skipping Solr process.")
@@ -124,19 +122,30 @@ def processFile(filename):
             readJSON(fn)
     else:
         logging.info("-- Starting processing of XML file: "+filename)
-        processXML(filename)
+        processXML(filename, source)
         if (args.skipsolr):
             logging.info("-- Skipping Solr process.")
         else:
-            if (args.skipsolr):
-                logging.info("Skipping Solr process.")
-            else:
-                logging.info("-- Starting processing of JSON file: "+fn)
-                readJSON(fn)
+            logging.info("-- Starting processing of JSON file: "+fn)
+            readJSON(fn)
+
+#process the metadata xml files of a weekly zip archive without unzipping it,
+#members already unzipped by earlier runs are picked up by the directory crawl
+def processArchive(zipname):
+    try:
+        with PtabArchive(zipname) as archive:
+            for member in archive.members('.xml'):
+                filename = archive.output_path(member,'xml')
+                if not os.path.isfile(filename):
+                    with archive.open(member) as source:
+                        processFile(filename, source)
+    except (IOError, zipfile.BadZipFile) as e:
+        logging.error("-- Archive: "+zipname+" could not be read: "+str(e))
 
 if __name__ == '__main__':
     scriptpath = os.path.dirname(os.path.abspath(__file__))
     solrURL = "http://54.208.116.77:8983"
+    ledgerpath = os.path.join('logs', 'solrcomplete.db')
 
     #logging configuration
     logging.basicConfig(
@@ -162,23 +171,50 @@ if __name__ == '__main__':
                         help="Pass this flag to skip Solr processing",
                         action="store_true"
                        )
+    parser.add_argument(
+                        "-b",
+                        "--batchsize",
+                        required=False,
+                        help="Specify number of documents sent to Solr per update request",
+                        type=int,
+                        default=500
+                       )
+    parser.add_argument(
+                        "--commitwithin",
+                        required=False,
+                        help="Specify number of milliseconds within which Solr commits the documents sent",
+                        type=int,
+                        default=10000
+                       )
 
     args = parser.parse_args()
     logging.info("--SCRIPT ARGUMENTS--------------")
     if args.dates:
         logging.info("Date arguments passed for processing: "+", ".join(args.dates))
     logging.info("Solr Processing set to: "+str(args.skipsolr))
+    logging.info("Solr batch size set to: "+str(args.batchsize))
+    logging.info("Solr commitWithin set to: "+str(args.commitwithin)+"ms")
     logging.info("-- [JOB START]  ----------------")
 
+    solr = Solr(solrURL, 'ptab', batch_size=args.batchsize, commit_within=args.commitwithin)
+    ledger = Ledger(ledgerpath, solr.core, commit_every=args.batchsize)
+
     if args.dates:
        for date in args.dates:
            for dirname in glob.iglob(os.path.join(scriptpath,'files/PTAB','PTAB*'+date)):
                #crawl through each main directory and find the metadata xml file
                for filename in glob.iglob(os.path.join(dirname,'*.xml'),recursive=True):
                    processFile(filename)
+           for zipname in glob.iglob(os.path.join(scriptpath,'files/PTAB','PTAB_'+date+'_WK*.zip')):
+               processArchive(zipname)
     else:
         #crawl through each main directory and find the metadata xml file
         for filename in glob.iglob(os.path.join(scriptpath,'files/PTAB','PTAB*/*.xml')):
             processFile(filename)
+        for zipname in glob.iglob(os.path.join(scriptpath,'files/PTAB','PTAB_*.zip')):
+            processArchive(zipname)
+
+    logSolrBatches(solr.flush(), ledger)
+    ledger.close()
 
     logging.info("-- [JOB END] ----------------")
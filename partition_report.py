@@ -0,0 +1,107 @@
+#!/usr/bin/env python 3.5
+
+#Author:        agent
+#Date:          10/18/26
+#Organization:  Commerce Data Service
+#Description:   Balance report and benchmark for the Partitioner that splits the
+#reprocess run list between the GO agents. For each worker count it shows how
+#far the busiest and the idlest worker are from their fair share of the keys,
+#for the partitioning on the whole md5 digest and for the old one on its first
+#byte. Run lists can be passed as files; without them key sets shaped like the
+#run lists (series directories of sequential appids with a few documents each)
+#are generated.
+
+import time, argparse, hashlib
+
+from s3_upload.partitioner import Partitioner
+
+DOC_CODES = ['Non-Final_Rejection', 'Final_Rejection', 'Restriction_Election_Requirement', 'Notice_of_Allowance']
+
+#keys shaped like the run lists: appids run in order within a series directory
+def generateKeys(series, appids, docsperapp):
+    keys = []
+    for s in series:
+        first = int(s[:2]) * 1000000
+        for appid in range(first, first + appids):
+            for i in range((appid * 7) % docsperapp + 1):
+                keys.append('{}/{}_I{:07X}PXXIFW4_{}.json'.format(s, appid, (appid * 31 + i) % 0xFFFFFFF,
+                                                                 DOC_CODES[(appid + i) % len(DOC_CODES)]))
+    return keys
+
+#keys of a run list file
+def readKeys(fname):
+    with open(fname) as fd:
+        return [l.strip() for l in fd if l.strip()]
+
+#keys per worker when only the first byte of the digest is used
+def legacyShares(keys, n):
+    counts = [0] * n
+    for key in keys:
+        counts[hashlib.md5(key.encode('utf-8')).digest()[0] % n] += 1
+    return counts
+
+#busiest and idlest worker relative to its fair share, in percent
+def skew(counts, weights):
+    total = float(sum(weights))
+    ratios = [c / (sum(counts) * w / total) for c, w in zip(counts, weights)]
+    return (max(ratios) - 1) * 100, (min(ratios) - 1) * 100
+
+def report(name, keys, workercounts, weights):
+    print('-- {}: {} keys'.format(name, len(keys)))
+    print('   {:>7}  {:>20}  {:>20}'.format('workers', 'first byte max/min', 'full digest max/min'))
+    for n in workercounts:
+        w = weights if weights is not None and len(weights) == n else None
+        legacy = skew(legacyShares(keys, n), [1] * n)
+        full = skew(Partitioner.shares(keys, n, w), w or [1] * n)
+        print('   {:>7}  {:>+9.2f}% {:>+9.2f}%  {:>+9.2f}% {:>+9.2f}%{}'.format(
+              n, legacy[0], legacy[1], full[0], full[1], '  weighted' if w else ''))
+
+def benchmark(keys, n, weights):
+    p = Partitioner(keys, 1, n, weights)
+    start = time.time()
+    mine = sum(1 for k in p.get_my_stream())
+    elapsed = max(time.time() - start, 1e-9)
+    print('-- Partitioned {} keys in {:.2f}s ({:.0f} keys/s), worker 1 of {} gets {}'.format(
+          len(keys), elapsed, len(keys) / elapsed, n, mine))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+                        'runlists',
+                        help='Run list files to report on, key sets shaped like them are generated when none are given',
+                        nargs='*'
+                       )
+    parser.add_argument(
+                        '-n',
+                        '--workers',
+                        required=False,
+                        help='Specify worker counts to report on',
+                        nargs='*',
+                        type=int,
+                        default=[2, 3, 4, 7, 10, 12, 16]
+                       )
+    parser.add_argument(
+                        '-w',
+                        '--weights',
+                        required=False,
+                        help='Specify comma separated weights, used for the worker count they match',
+                        type=str,
+                        default=None
+                       )
+    args = parser.parse_args()
+    weights = [float(w) for w in args.weights.split(',')] if args.weights else None
+
+    if args.runlists:
+        keysets = [(fname, readKeys(fname)) for fname in args.runlists]
+    else:
+        keysets = [
+                   ('one series, 1 document per app', generateKeys(['13'], 200000, 1)),
+                   ('three series, up to 4 documents per app', generateKeys(['13', '14m', '14s'], 60000, 4)),
+                   ('small run list', generateKeys(['14m'], 2000, 3)),
+                  ]
+
+    for name, keys in keysets:
+        report(name, keys, args.workers, weights)
+
+    allkeys = [k for name, keys in keysets for k in keys]
+    benchmark(allkeys, max(args.workers), weights if weights and len(weights) == max(args.workers) else None)
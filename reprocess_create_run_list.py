@@ -1,10 +1,25 @@
+import argparse
 import os
 import re
 
+from s3_upload.runlist import SortedListing, merge_join
+
 
 if __name__ == '__main__':
     print("Preparing run list")
 
+    parser = argparse.ArgumentParser(description='Prepare the list of documents missing from the destination')
+    parser.add_argument(
+        '-m', '--merge',
+        action='store_true',
+        help='merge the listings in key order instead of holding the destination keys in memory'
+    )
+    parser.add_argument(
+        '--tmpdir',
+        help='directory for sorting a listing that is not in key order'
+    )
+    args = parser.parse_args()
+
     dst_loc = os.environ['S3_DST_PATH']
     src_loc = os.environ['S3_SRC_PATH']
     test_pfx = ''
@@ -20,30 +35,43 @@ if __name__ == '__main__':
 
     run_list = open("run-list.txt",'w')
 
-    # Read Src List
-    with open('dst-list/dst-list.txt', 'r') as src_list:
-        for l in src_list:
-            l = l.rstrip().lstrip()
+    if args.merge:
+        # Both listings are read once, side by side, in constant memory
+        src = SortedListing('src-list/src-list.txt', p_src, args.tmpdir)
+        dst = SortedListing('dst-list/dst-list.txt', p_dst, args.tmpdir)
+
+        counts = merge_join(src, dst, run_list)
+        run_list.close()
+
+        for listing in (src, dst):
+            if listing.external:
+                print("-- {} was not in key order, sorted it".format(listing.fname))
+        print("-- {} matched, {} missing, {} orphaned".format(counts.matched, counts.missing, counts.orphaned))
 
-            m = p_dst.match(l)
+    else:
+        # Read Src List
+        with open('dst-list/dst-list.txt', 'r') as src_list:
+            for l in src_list:
+                l = l.rstrip().lstrip()
 
-            if m is None:
-                raise RuntimeError("Cannot parse [{}]".format(l))
+                m = p_dst.match(l)
 
-            key = m.group(1) + "_" + m.group(2)
-            dst[key] = l
+                if m is None:
+                    raise RuntimeError("Cannot parse [{}]".format(l))
 
-    with open('src-list/src-list.txt') as dst_list:
-        for l in dst_list:
-            l = l.rstrip().lstrip()
+                key = m.group(1) + "_" + m.group(2)
+                dst[key] = l
 
-            m = p_src.match(l)
+        with open('src-list/src-list.txt') as dst_list:
+            for l in dst_list:
+                l = l.rstrip().lstrip()
 
-            if m is None:
-                raise RuntimeError("Cannot parse [{}]".format(l))
+                m = p_src.match(l)
 
-            key = m.group(1) + "_" + m.group(2)
+                if m is None:
+                    raise RuntimeError("Cannot parse [{}]".format(l))
 
-            if key not in dst:
-                    run_list.write(l + '\n')
+                key = m.group(1) + "_" + m.group(2)
 
+                if key not in dst:
+                        run_list.write(l + '\n')
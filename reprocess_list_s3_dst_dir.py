@@ -1,6 +1,8 @@
 import os
 from s3_upload.s3_uploader import S3Uploader
 
+LIST_WORKERS = 16
+
 if __name__ == '__main__':
     dst_loc = os.environ['S3_DST_PATH']
 
@@ -15,9 +17,8 @@ if __name__ == '__main__':
     print("Feeding from {}".format(dst_loc))
 
 
-    store = S3Uploader('uspto-bdr')
-    list = store.get_file_list(dst_loc)
+    # the listing is split by appid and the parts listed concurrently
+    store = S3Uploader('uspto-bdr', max_pool_connections=LIST_WORKERS)
+    count = store.write_listing(dst_loc, "dst-list.txt", workers=LIST_WORKERS)
 
-    with open("dst-list.txt", 'w') as outfile:
-        for x in list:
-            outfile.write(x.key + '\n')
+    print("Listed {} keys".format(count))
@@ -2,16 +2,16 @@ import os
 
 from s3_upload.s3_uploader import S3Uploader
 
+LIST_WORKERS = 16
+
 if __name__ == '__main__':
     print("Preparing list of S3 SRC dir")
 
     src_loc = os.environ['S3_SRC_PATH']
     print("Feeding from {}".format(src_loc))
 
-    store = S3Uploader('uspto-bdr')
-    list = store.get_file_list(src_loc)
-
+    # the listing is split by appid and the parts listed concurrently
+    store = S3Uploader('uspto-bdr', max_pool_connections=LIST_WORKERS)
+    count = store.write_listing(src_loc, "src-list.txt", workers=LIST_WORKERS)
 
-    with open("src-list.txt",'w') as outfile:
-        for x in list:
-            outfile.write(x.key+'\n')
+    print("Listed {} keys".format(count))
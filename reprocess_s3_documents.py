@@ -1,10 +1,32 @@
+import argparse
+import hashlib
 import logging
+import os
+import socket
 
 import boto3
 
+from s3_upload.checkpoint import Checkpoint
 from s3_upload.s3_uploader import S3Uploader
 from s3_upload.partitioner import Partitioner
+from s3_upload.pipeline import Pipeline
 from s3_upload.util import Util
+from s3_upload.workqueue import WorkQueue, LeasedKeys, LeasedKey
+
+# Path of the work queue shared by the agents of the stage. When it is set the
+# agents lease chunks of the run list from it instead of each taking a fixed
+# part, so a slow agent does not hold up the stage.
+QUEUE_VAR = 'REPROCESS_QUEUE'
+QUEUE_CHUNK_SIZE = 100
+
+# Directory of the checkpoint files of finished documents, one directory
+# under it per run list. On storage shared by the agents, a rerun of the run
+# list skips what any of them finished before, whatever the number of
+# agents; on local storage only what the agent itself finished.
+CHECKPOINT_VAR = 'REPROCESS_CHECKPOINT'
+
+# How often the pipeline queue depths are logged, in documents
+DEPTH_LOG_EVERY = 1000
 
 
 def get_file_list(list_file):
@@ -14,55 +36,175 @@ def get_file_list(list_file):
             l = l.lstrip().rstrip()
             yield l
 
-if __name__ == '__main__':
-    print("Reprocess S3 documents")
 
-    #logging configuration
-    logging.basicConfig(
-                        filename='reprocess-s3.log',
-                        level=logging.INFO,
-                        format='%(asctime)s - %(name)s - %(levelname)s -%(message)s',
-                        datefmt='%Y%m%d %H:%M:%S'
-                       )
-    stderrLogger=logging.StreamHandler()
-    stderrLogger.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
-    logging.getLogger().addHandler(stderrLogger)
+def run_list_id(list_file):
+    # Names the run list by its content, so the agents of one run share a
+    # work queue and a new run list does not pick up the last one's
+    digest = hashlib.sha256()
+    with open(list_file, "rb") as runlist:
+        for block in iter(lambda: runlist.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
 
-    boto3.set_stream_logger('boto3.resources', logging.WARN)
 
+def worker_name():
+    return '{}-{}'.format(socket.gethostname(), os.environ.get('GO_JOB_RUN_INDEX', '1'))
 
-    list_file = "run-list/run-list.txt"
 
-    files = get_file_list(list_file)
+def key_of(item):
+    # Items are run list keys, or LeasedKey pairs in work queue mode
+    return item.key if isinstance(item, LeasedKey) else item
+
 
-    p = Partitioner(files)
+def pending(items, checkpoint, counts, leased=None):
+    for item in items:
+        if key_of(item) in checkpoint:
+            counts['skipped'] += 1
+            if leased is not None:
+                leased.done(item)
+        else:
+            yield item
 
-    store = S3Uploader('uspto-bdr')
 
-    n = 0
+def fetch(item):
+    key = key_of(item)
+    return key, store.get_document(key)
 
-    for x in p.get_my_stream():
 
-        obj = store.get_obj(x)
-        meta = {}
+def transform(fetched):
+    key, body = fetched
+    meta = {}
+    jsontext = Util.reprocess_document(body, key, meta)
+    return jsontext, Util.get_store_url(meta)
 
-        objdata = obj.get()
 
-        n += 1
-        logging.info('Processing #{}  [{}]'.format(n, x))
+def post(doc):
+    jsontext, url = doc
+    store.post_document(jsontext, url)
+    return url
 
-        jsontext = objdata['Body'].read()
-        jsontext = Util.reprocess_document(jsontext, obj.key, meta)
 
-        url = Util.get_store_url(meta)
+def process(pipeline, items, checkpoint, counts, leased=None):
+    # Runs items through the pipeline, marking each document in the checkpoint
+    # once it is written. Failed documents are logged and left out of the
+    # checkpoint. In work queue mode every key is reported back to leased, so
+    # a chunk is completed only once all its documents are written, or handed
+    # back for another try when some failed; otherwise a rerun tries them.
+    results = pipeline.run(pending(items, checkpoint, counts, leased))
+    try:
+        for result in results:
+            if result.item is None:
+                # Reading the run list or the work queue failed
+                raise result.error
 
-        store.post_document(jsontext, url)
+            key = key_of(result.item)
+            if result.error is not None:
+                counts['failed'] += 1
+                logging.error('Failed to {} [{}]: {!r}'.format(result.stage, key, result.error))
+            else:
+                counts['done'] += 1
+                logging.info('Done #{} [{}]. Written to {}'.format(counts['done'], key, result.value))
+                checkpoint.mark(key)
+                if counts['done'] % DEPTH_LOG_EVERY == 0:
+                    logging.info('Pipeline queue depths {}'.format(pipeline.depths()))
 
-        logging.info('Done. Written to {}'.format(url))
+            if leased is not None:
+                leased.done(result.item, result.error is not None)
+                for lease in leased.keep():
+                    logging.info('Chunk {} was taken over by another worker'.format(lease.chunk))
+    finally:
+        results.close()
+        if leased is not None:
+            leased.release()
 
-    logging.info('{} documents processed'.format(n))
 
+def log_summary(pipeline):
+    for stage, summary in pipeline.summary().items():
+        logging.info('{}: {threads} threads, {items} items, {errors} errors, {utilization:.0%} busy, '
+                     'input queue {queue_mean:.1f} mean {queue_max} max of {queue_size}'.format(stage, **summary))
 
 
+if __name__ == '__main__':
+    print("Reprocess S3 documents")
+
+    #logging configuration
+    logging.basicConfig(
+                        filename='reprocess-s3.log',
+                        level=logging.INFO,
+                        format='%(asctime)s - %(name)s - %(levelname)s -%(message)s',
+                        datefmt='%Y%m%d %H:%M:%S'
+                       )
+    stderrLogger=logging.StreamHandler()
+    stderrLogger.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+    logging.getLogger().addHandler(stderrLogger)
+
+    boto3.set_stream_logger('boto3.resources', logging.WARN)
 
 
+    parser = argparse.ArgumentParser(description='Reprocess S3 documents')
+    parser.add_argument(
+        '--fetchers',
+        type=int,
+        default=8,
+        help='threads reading documents from S3'
+    )
+    parser.add_argument(
+        '--transformers',
+        type=int,
+        default=1,
+        help='threads reprocessing documents'
+    )
+    parser.add_argument(
+        '--storers',
+        type=int,
+        default=8,
+        help='threads writing documents to S3'
+    )
+    parser.add_argument(
+        '--queue-size',
+        type=int,
+        default=32,
+        help='documents held between two stages'
+    )
+    args = parser.parse_args()
+
+    list_file = "run-list/run-list.txt"
+
+    files = get_file_list(list_file)
+    run_id = run_list_id(list_file)
+
+    checkpoint_dir = os.path.join(os.environ.get(CHECKPOINT_VAR, 'reprocess-checkpoint'), run_id[:16])
+    checkpoint = Checkpoint(checkpoint_dir, worker_name())
+    logging.info('{} documents done in earlier runs of the run list, checkpoint {}'.format(len(checkpoint), checkpoint_dir))
+
+    store = S3Uploader('uspto-bdr', max_pool_connections=args.fetchers + args.storers)
+
+    pipeline = Pipeline(
+        fetch,
+        transform,
+        post,
+        fetchers=args.fetchers,
+        transformers=args.transformers,
+        storers=args.storers,
+        queue_size=args.queue_size
+    )
+
+    counts = {'done': 0, 'failed': 0, 'skipped': 0}
+
+    if os.environ.get(QUEUE_VAR):
+        queue = WorkQueue(os.environ[QUEUE_VAR])
+        chunks = queue.load(files, QUEUE_CHUNK_SIZE, run_id)
+        logging.info('Work queue {}, {} chunks loaded by this worker'.format(os.environ[QUEUE_VAR], chunks))
+
+        # The keys of successive chunks go through one running pipeline
+        leased = LeasedKeys(queue)
+        process(pipeline, leased, checkpoint, counts, leased)
+        logging.info('Work queue chunks {}'.format(queue.counts()))
+        queue.close()
+    else:
+        p = Partitioner(files)
+        process(pipeline, p.get_my_stream(), checkpoint, counts)
+    log_summary(pipeline)
+
+    checkpoint.close()
+    logging.info('{done} documents processed, {failed} failed, {skipped} done before'.format(**counts))
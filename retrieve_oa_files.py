@@ -8,13 +8,18 @@
 #with PALM data from flat files, and gets the post date from a CMS RESTFUL service.
 #It then transforms the resulting dictionary to JSON and sends it to Solr for indexing.
 
-import sys, os, shutil, logging, time, argparse, glob, json, requests, collections
+import sys, os, shutil, logging, time, argparse, glob, json, collections
 
-from datetime import datetime
 from lxml import etree
-import pandas as pd
 
+from s3_upload import cms
+from s3_upload.cms import CmsDateResolver, DocDateCache
+from s3_upload.ledger import Ledger, s3_namespace
+from s3_upload.oa_records import DocumentPool, DocumentRecord
+from s3_upload.oa_xml import OAXmlExtractor
+from s3_upload.palm import PalmCache, PalmIndex
 from s3_upload.s3_uploader import S3Uploader
+from s3_upload.solr import Solr
 from s3_upload.util import Util
 
 #get public app IDs from app ID file
@@ -91,147 +96,91 @@ def changeExt(fname, ext):
     seq = (os.path.splitext(fname)[0], ext)
     return '.'.join(seq)
 
-#get metadata and text from P tags in XML document
-def getText(node):
-    contents = ''
-    if node.tag == '{urn:us:gov:doc:uspto:common}LI' and node.text is not None:
-        contents += (node.get('{http://www.wipo.int/standards/XMLSchema/ST96/Common}liNumber')+' '+node.text +
-                     ''.join(map(getText, node)) +
-                     (node.tail or ''))
-    #ignore data table text
-    elif node.tag == '{urn:us:gov:doc:uspto:common}DataTable':
-        return contents
-    #ignore image paragraphs
-    elif node.tag == '{http://www.wipo.int/standards/XMLSchema/ST96/Common}Image':
-        return contents
-    else:
-        contents += ((node.text or '') +
-                    ''.join(map(getText, node)) +
-                    (node.tail or ''))
-    return contents
-
-#code for parsing XML file
-def parseXML(fname):
-    try:
-        textdata = ''
-        parser = etree.XMLParser(remove_pis=True)
-        tree = etree.parse(fname, parser=parser)
-        root = tree.getroot()
-        namespaces = {'uspat':'urn:us:gov:doc:uspto:patent',
-                      'uscom':'urn:us:gov:doc:uspto:common',
-                      'com':'http://www.wipo.int/standards/XMLSchema/ST96/Common'}
-        for item in root.xpath('//uspat:DocumentMetadata', namespaces=namespaces):
-            doccontent['documentcode'] = item.find('uscom:DocumentCode', namespaces=namespaces).text
-            doccontent['documentsourceidentifier'] = item.find('uscom:DocumentSourceIdentifier', namespaces=namespaces).text
-            partyid = doccontent['partyidentifier'] = item.find('com:PartyIdentifier', namespaces=namespaces)
-            if partyid is not None:
-                doccontent['partyidentifier'] = partyid.text
-            else:
-                doccontent['partyidentifier'] = ''
-            doccontent['groupartunitnumber'] = item.find('uscom:GroupArtUnitNumber', namespaces = namespaces).text
-        for item in root.xpath('//uscom:P', namespaces=namespaces):
-            textdata += getText(item)+'\n'
-        doccontent['textdata'] = textdata
-        return True
-    except IOError as e:
-        logging.error('XML Parse file: '+fname+' I/O error({0}): {1}'.format(e.errno,e.strerror))
-        return False
-    except etree.XMLSyntaxError:
-        logging.error('-- Skipping invalid XML from file: '+fname)
-        badfiles.append(fname)
-        return False
-
-
-def loadPALMdata():
+def loadPALMdata(palmfname):
     logging.info('-- Loading PALM data')
-    dataframe =  pd.read_csv(os.path.join(palmfilespath, 'app'+series+'.csv'), encoding = 'latin-1')
-    logging.info('-- PALM data loaded into dataframe')
-    return dataframe
-
-#deal with na values and set type as string
-def fixNaValues(dataframe,series):
-    for col in series:
-        dataframe[col] = dataframe[col].fillna('')
-        dataframe[col] = dataframe[col].astype('str')
-
-#code for extracting PALM data from PALM series file and combine with other elements from XML file
-def getPALMData(fileappid):
+    cache = PalmCache(palmcachepath)
+    if not cache.is_cached(palmfname):
+        logging.info('-- Building PALM cache for: '+palmfname)
+    palm = PalmIndex(cache.load(palmfname))
+    logging.info('-- PALM data indexed for {} app IDs'.format(len(palm)))
+    return palm
+
+#set up a parse worker process, the PALM data travels with each task
+def initParseWorker(logconfig):
+    logging.basicConfig(**logconfig)
+
+#pair each file still to be parsed with its CMS doc date and PALM record, yields a list of tasks per chunk of files
+#the lookups run on the calling thread (the CMS date cache is a sqlite connection of this thread)
+def docTasks(filenames, chunksize=5000):
+    for start in range(0, len(filenames), chunksize):
+        chunk = []
+        for filename in filenames[start:start+chunksize]:
+            fn = changeExt(filename, 'json')
+            if os.path.isfile(fn):
+                logging.info('File: '+fn+' already exists')
+            else:
+                chunk.append(filename)
+        records = palm.records(os.path.basename(filename).split('_')[0] for filename in chunk)
+        pairs = []
+        for filename in chunk:
+            parts = os.path.basename(filename).split('_')
+            if parts[0] in records:
+                pairs.append((parts[0], parts[1]))
+        docdates = resolver.resolve(pairs)
+        logging.info('-- Resolved {} doc dates from CMS service'.format(len(docdates)))
+        tasks = []
+        for filename in chunk:
+            parts = os.path.basename(filename).split('_')
+            tasks.append((filename, docdates.get((parts[0], parts[1])), records.get(parts[0])))
+        yield tasks
+
+#build the JSON document of one XML file from the XML, PALM data and CMS doc date
+def processDocument(task):
+    filename, docdate, record = task
+    logging.info('-- Start Processing file: '+filename)
+    fn = changeExt(filename, 'json')
+    fileappid = (os.path.basename(filename)).split('_')[0]
+    ifwnum = (os.path.basename(filename)).split('_')[1]
+    doccontent = collections.OrderedDict()
+    #type set to oa for office actions
+    doccontent['type'] = 'oa'
+    doccontent['appid'] = fileappid
+    #IFW number for action
+    doccontent['ifwnumber'] = ifwnum
     try:
-        logging.info('-- Starting PALM data match process')
-        values = df[(df['APPL_ID'] == float(fileappid))]
-        series = ['FILE_DT','EFFECTIVE_FILING_DT','ABANDON_DT','DN_NSRD_CURR_LOC_DT',\
-        'APP_STATUS_DT','PATENT_ISSUE_DT','ABANDON_DT']
-        fixNaValues(values, series)
-
-        if len(values.index) == 1:
-            for index, row in values.iterrows():
-                doccontent['appl_id'] = row.APPL_ID
-                doccontent['file_dt'] = Util.convertToUTC(row.FILE_DT, '%d-%b-%y')
-                doccontent['effective_filing_dt'] = Util.convertToUTC(row.EFFECTIVE_FILING_DT, '%d-%b-%y')
-                doccontent['inv_subj_matter_ty'] = row.INV_SUBJ_MATTER_TY
-                doccontent['appl_ty'] = row.APPL_TY
-                doccontent['dn_examiner_no'] = row.DN_EXAMINER_NO
-                doccontent['dn_dw_dn_gau_cd'] = row.DN_DW_DN_GAU_CD
-                doccontent['dn_pto_art_class_no'] = row.DN_PTO_ART_CLASS_NO
-                doccontent['dn_pto_art_subclass_no'] = row.DN_PTO_ART_SUBCLASS_NO
-                doccontent['confirm_no'] = row.CONFIRM_NO
-                doccontent['dn_intppty_cust_no'] = row.DN_INTPPTY_CUST_NO
-                doccontent['atty_dkt_no'] = row.ATTY_DKT_NO
-                doccontent['dn_nsrd_curr_loc_cd'] = row.DN_NSRD_CURR_LOC_CD
-                doccontent['dn_nsrd_curr_loc_dt'] = Util.convertToUTC(row.DN_NSRD_CURR_LOC_DT, '%d-%b-%y')
-                doccontent['app_status_no'] = row.APP_STATUS_NO
-                doccontent['app_status_dt'] = Util.convertToUTC(row.APP_STATUS_DT, '%d-%b-%y')
-                doccontent['wipo_pub_no'] = row.WIPO_PUB_NO
-                doccontent['patent_no'] = row.PATENT_NO
-                doccontent['patent_issue_dt'] = Util.convertToUTC(row.PATENT_ISSUE_DT, '%d-%b-%y')
-                doccontent['abandon_dt'] = Util.convertToUTC(row.ABANDON_DT, '%d-%b-%y')
-                doccontent['disposal_type'] = row.DISPOSAL_TYPE
-                doccontent['se_in'] = row.SE_IN
-                doccontent['pct_no'] = row.PCT_NO
-                doccontent['invn_ttl_tx'] = row.INVN_TTL_TX
-                doccontent['aia_in'] = row.AIA_IN
-                doccontent['continuity_type'] = row.CONTINUITY_TYPE
-                doccontent['frgn_priority_clm'] = row.FRGN_PRIORITY_CLM
-                doccontent['usc_119_met'] = row.USC_119_MET
-                doccontent['fig_qt'] = row.FIG_QT
-                doccontent['indp_claim_qt'] = row.INDP_CLAIM_QT
-                doccontent['efctv_claims_qt'] = row.EFCTV_CLAIMS_QT
-                logging.info('-- PALM data written to doccontent dictionary')
-                return True
-        else:
-            logging.error('-- Application ID: '+fileappid+' not found in PALM data')
-            notfoundPALM.append(fileappid)
-            return False
+        #get metadata and text from P tags in XML document
+        doccontent.update(OAXmlExtractor.extract(filename))
     except IOError as e:
-        logging.error('PALM Extract file: '+fileappid+' I/O error({0}): {1}'.format(e.errno,e.strerror))
-        return False
-
-#get official application doc date
-def getDocDate(appid, ifwnum):
-    try:
-        params = [{"businessUnitId": appid,
-              "documentId": ifwnum}]
-        headers = {'Content-type': 'application/json'}
-        response = requests.post(cmsURL, json=params, headers=headers)
-        r = response.json()
-        if 'httpStatus' in r:
-            doc_date = ''
-            logging.info('-- App ID: '+appid+', IFW#: '+ifwnum+' not found from CMS service')
-            notfoundCMS.append(appid+', '+ifwnum)
-        elif 'officialDocumentDate' in r[0]:
-            doc_date = Util.convertToUTC(r[0]['officialDocumentDate'], '%Y-%m-%d')
-        else:
-            logging.info('-- CMS RESTFUL call neither contained an error or the doc date')
-            doc_date = ''
-        doccontent['doc_date'] = doc_date
-        return True
-    except requests.exceptions.RequestException as e:
-        logging.error('-- CMS Restful error for: '+appid+', '+ifwnum+', error: '+e)
-        notfoundCMS.append(appid+', '+ifwnum)
-        return False
+        logging.error('XML Parse file: '+filename+' I/O error({0}): {1}'.format(e.errno,e.strerror))
+        logging.error('-- Parsing of file: '+filename+' failed')
+        return DocumentRecord(filename, fn)
+    except etree.XMLSyntaxError:
+        logging.error('-- Skipping invalid XML from file: '+filename)
+        logging.error('-- Parsing of file: '+filename+' failed')
+        return DocumentRecord(filename, fn, badfile=filename)
+    if record is None:
+        logging.error('-- Application ID: '+fileappid+' not found in PALM data')
+        logging.error('-- Extraction of PALM data for file: '+filename+' failed')
+        return DocumentRecord(filename, fn, notfoundpalm=fileappid)
+    doccontent.update(record)
+    notfounddate = None
+    if docdate.status == cms.NOT_FOUND:
+        logging.info('-- App ID: '+fileappid+', IFW#: '+ifwnum+' not found from CMS service')
+        notfounddate = fileappid+', '+ifwnum
+    elif docdate.status == cms.NO_DATE:
+        logging.info('-- CMS RESTFUL call neither contained an error or the doc date')
+    elif docdate.status == cms.ERROR:
+        logging.error('-- CMS Restful error for: '+fileappid+', '+ifwnum)
+        logging.error('-- Retrieval of Doc Date for file: '+filename+' failed')
+        return DocumentRecord(filename, fn, notfounddate=fileappid+', '+ifwnum)
+    doccontent['doc_date'] = docdate.doc_date
+    if not writeToJSON(fn, doccontent):
+        logging.error('-- write to JSON for file: '+filename+' failed')
+        return DocumentRecord(filename, fn, notfounddate=notfounddate)
+    return DocumentRecord(filename, fn, True, notfounddate=notfounddate)
 
 #write dictionary to JSON file
-def writeToJSON(fname):
+def writeToJSON(fname, doccontent):
     try:
         with open(fname,'w') as outfile:
             json.dump(doccontent,outfile)
@@ -241,108 +190,75 @@ def writeToJSON(fname):
         logging.error('Write to JSON: '+fname+' I/O error({0}): {1}'.format(e.errno,e.strerror))
         return False
 
-#read JSON file and set up for sending to Solr
+#read JSON file and queue it for Solr indexing, returns the number of documents Solr accepted
 def readJSON(fname):
     try:
         fpath,filename = os.path.split(fname)
         docid = filename.split('_')[0]+', '+filename.split('_')[1]
+        if docid in ledger:
+            logging.info('-- File: '+docid+' already processed by Solr')
+            return 0
         with open(fname, 'r') as fd:
             jsontext = fd.read().replace('\n', '')
-            with open(os.path.join(os.path.dirname(fname), 'solrComplete.log'), 'a+') as logfile:
-                logfile.seek(0)
-                if docid+'\n' in logfile:
-                    logging.info('-- File: '+docid+' already processed by Solr')
-                else:
-                    logging.info('-- Sending file: '+fname+' to Solr')
-                    response = sendToSolr('oadata_3_shard1_replica1', jsontext)
-                    r = response.json()
-                    status = r['responseHeader']['status']
-                    if status == 0:
-                        logfile.write(docid+"\n")
-                        logging.info('-- Solr update for file: '+docid+' complete')
-                        return True
-                    else:
-                        logging.info('-- Solr error for doc: '+docid+' error: '+\
-                        ', '.join("{!s}={!r}".format(k,v) for (k,v) in r.items()))
-                        return False
+        logging.info('-- Sending file: '+fname+' to Solr')
+        return logSolrBatches(solr.add_documents([(docid, jsontext)]), ledger)
     except IOError as e:
         logging.error('Read JSON file: '+fname+' I/O error({0}): {1}'.format(e.errno,e.strerror))
-        return False
+        return 0
     except:
         logging.error('Unexpected error:', sys.exc_info()[0])
         raise
-        return False
 
-#read JSON file and set up for sending to Solr
+#read JSON file and queue it for Solr indexing, returns the number of documents Solr accepted
 def postFromS3ToSOLR(obj):
 
     if not Util.allowed_key(obj.key):
-        return
+        return 0
 
     try:
-
-        log_dir_path = os.path.join("logs", "solr_upload", Util.log_directory(obj.key))
-        logging.info("Log dir for file " + log_dir_path )
-        os.makedirs(log_dir_path, exist_ok=True)
-
-        second_log_dir_path = os.path.join("logs", "solr_upload", Util.secondary_log_directory(obj.key))
-        logging.info("Secondary Log dir for file " + second_log_dir_path )
-        os.makedirs(second_log_dir_path, exist_ok=True)
-
         docid = Util.doc_id(obj.key)
 
-        with open(os.path.join(log_dir_path, 'solrComplete.log'), 'a+') as logfile:
-
-            with open(os.path.join(second_log_dir_path, 'solrComplete.log'), 'a+') as sec_logfile:
+        if docid in s3ledger:
+            logging.info('-- File: '+docid+' already processed by Solr')
+            return 0
 
-                logfile.seek(0)
-                doc_log_entry = docid + '\n'
-                if doc_log_entry in logfile or doc_log_entry in sec_logfile:
-                    logging.info('-- File: '+docid+' already processed by Solr')
-                else:
+        objdata = obj.get()
+        jsontext = objdata['Body'].read()
+        jsontext = Util.reprocess_document(jsontext, obj.key)
 
-                    objdata = obj.get()
-                    jsontext = objdata['Body'].read()
-                    jsontext = Util.reprocess_document(jsontext, obj.key)
-
-                    logging.info('-- Sending file: '+obj.key+' to Solr')
-                    response = sendToSolr('oadata_3_shard1_replica1', jsontext)
-                    r = response.json()
-                    status = r['responseHeader']['status']
-                    if status == 0:
-                        logfile.write(doc_log_entry)
-                        sec_logfile.write(doc_log_entry)
-                        logging.info('-- Solr update for file: '+docid+' complete')
-                        return True
-                    else:
-                        logging.info('-- Solr error for doc: '+docid+' error: '+ \
-                        ', '.join("{!s}={!r}".format(k,v) for (k,v) in r.items()))
-                        return False
+        logging.info('-- Sending file: '+obj.key+' to Solr')
+        return logSolrBatches(solr.add_documents([(docid, jsontext)]), s3ledger)
     except IOError as e:
         logging.error('Read JSON file: '+ obj.key +' I/O error({0}): {1}'.format(e.errno,e.strerror))
-        return False
+        return 0
     except:
         logging.error('Unexpected error:', sys.exc_info()[0])
         raise
 
-
-#send document to Solr for indexin
-def sendToSolr(core, json):
-    try:
-        jsontext = '{"add":{ "doc":'+json+',"boost":1.0,"overwrite":true, "commitWithin": 1000}}'
-        url = os.path.join(solrURL,"solr",core,"update")
-        headers = {"Content-type" : "application/json"}
-        return requests.post(url, data=jsontext, headers=headers)
-    except requests.exceptions.RequestException as e:
-        logging.error('-- Solr indexing error: {}'.format(e))
+#record the documents of each completed Solr batch in the completion ledger, returns the number accepted
+def logSolrBatches(batches, ledger):
+    accepted = 0
+    for batch in batches:
+        if batch.status == 0:
+            ledger.mark_all(batch.keys)
+            accepted += len(batch.keys)
+            logging.info('-- Solr update for {} files complete: '.format(len(batch.keys))+'; '.join(batch.keys))
+        else:
+            logging.error('-- Solr error for batch of {} docs: '.format(len(batch.keys))+\
+            ', '.join("{!s}={!r}".format(k,v) for (k,v) in batch.response.items()))
+            logging.error('-- Files not indexed: '+'; '.join(batch.keys))
+    return accepted
 
 if __name__ == '__main__':
     scriptpath = os.path.dirname(os.path.abspath(__file__))
     pubidfname = 'pair_app_ids.txt'
     oafilespath = '\\\\s-mdw-isl-b02-smb.uspto.gov\\BigData\\PE2E-ELP\\PATENT'
     palmfilespath = '\\\\nsx-orgshares\\CIO-OCIO\\BDR_Access\\PALM'
+    palmcachepath = os.path.join(scriptpath, 'files', 'PALM')
     cmsURL = 'http://p-elp-services.uspto.gov/cmsservice/pto/PATENT/documentMetadataByAccess'
     solrURL = 'http://52.90.109.169:8983'
+    ledgerpath = os.path.join('logs', 'solrcomplete.db')
+    cmscachepath = os.path.join('logs', 'cmsdates.db')
     appids = []
     completeappids = []
     notfoundappids = []
@@ -353,15 +269,15 @@ if __name__ == '__main__':
     currentapp = ''
     numoffileswritten = 0
 
-    doccontent = collections.OrderedDict()
 
-    #logging configuration
-    logging.basicConfig(
+    #logging configuration, also used by the parse workers
+    logconfig = dict(
                         filename='logs/extract-files-log-'+time.strftime('%Y%m%d')+'.txt',
                         level=logging.INFO,
                         format='%(asctime)s - %(name)s - %(levelname)s -%(message)s',
                         datefmt='%Y%m%d %H:%M:%S'
                        )
+    logging.basicConfig(**logconfig)
     parser = argparse.ArgumentParser()
     parser.add_argument(
                         '-s',
@@ -403,6 +319,45 @@ if __name__ == '__main__':
                         action="store_true",
                         default=False
                        )
+    parser.add_argument(
+                        '-b',
+                        '--batchsize',
+                        required=False,
+                        help='Specify number of documents sent to Solr per update request',
+                        type=int,
+                        default=500
+                       )
+    parser.add_argument(
+                        '--commitwithin',
+                        required=False,
+                        help='Specify number of milliseconds within which Solr commits the documents sent',
+                        type=int,
+                        default=10000
+                       )
+    parser.add_argument(
+                        '-c',
+                        '--cmsworkers',
+                        required=False,
+                        help='Specify number of concurrent requests to the CMS service',
+                        type=int,
+                        default=8
+                       )
+    parser.add_argument(
+                        '-m',
+                        '--cmsmissdays',
+                        required=False,
+                        help='Specify number of days before documents not found by the CMS service are requested again',
+                        type=float,
+                        default=7
+                       )
+    parser.add_argument(
+                        '-w',
+                        '--workers',
+                        required=False,
+                        help='Specify number of processes used to parse XML files',
+                        type=int,
+                        default=1
+                       )
     args = parser.parse_args()
     logging.info("-- SCRIPT ARGUMENTS ------------")
     if args.series:
@@ -410,8 +365,19 @@ if __name__ == '__main__':
     logging.info("-- Skip Extraction flag set to: "+str(args.skipextraction))
     logging.info("-- Skip Parsing flag set to: "+str(args.skipparsing))
     logging.info("-- Skip Solr flag set to: "+str(args.skipsolr))
+    logging.info("-- Solr batch size set to: "+str(args.batchsize))
+    logging.info("-- Solr commitWithin set to: "+str(args.commitwithin)+"ms")
+    logging.info("-- CMS workers set to: "+str(args.cmsworkers))
+    logging.info("-- CMS miss expiry days set to: "+str(args.cmsmissdays))
+    logging.info("-- Parse workers set to: "+str(args.workers))
     logging.info("-- [JOB START]  ----------------")
 
+    solr = Solr(solrURL, 'oadata_3_shard1_replica1', batch_size=args.batchsize, commit_within=args.commitwithin)
+    ledger = Ledger(ledgerpath, solr.core, commit_every=args.batchsize)
+    s3ledger = Ledger(ledgerpath, s3_namespace(solr.core), commit_every=args.batchsize)
+    docdatecache = DocDateCache(cmscachepath, miss_ttl=args.cmsmissdays*24*3600)
+    resolver = CmsDateResolver(cmsURL, max_workers=args.cmsworkers, cache=docdatecache)
+
     for series in args.series:
         seriespath = os.path.join(scriptpath,'extractedfiles', series)
         if not args.skipextraction:
@@ -459,39 +425,21 @@ if __name__ == '__main__':
             del notfoundappids[:]
             del nofileappids[:]
         if not args.skipparsing:
-            df = loadPALMdata()
-            for filename in glob.glob(os.path.join(seriespath,'*.xml')):
-                logging.info('-- Start Processing file: '+filename)
-                fname = os.path.join(seriespath, filename)
-                fn = changeExt(fname, 'json')
-                if not os.path.isfile(fn):
-                    fileappid = (os.path.basename(filename)).split('_')[0]
-                    ifwnum = (os.path.basename(filename)).split('_')[1]
-                    #type set to oa for office actions
-                    doccontent['type'] = 'oa'
-                    doccontent['appid'] = fileappid
-                    #IFW number for action
-                    doccontent['ifwnumber'] = ifwnum
-                    if parseXML(fname):
-                        if getPALMData(fileappid):
-                            if getDocDate(fileappid, ifwnum):
-                                if writeToJSON(fn):
-                                    numoffileswritten += 1
-                                    logging.info('-- {} - Complete processing for file: {}'.format(numoffileswritten,fn))
-                                else:
-                                    logging.error('-- write to JSON for file: '+filename+' failed')
-                            else:
-                                logging.error('-- Retrieval of Doc Date for file: '+filename+' failed')
-                        else:
-                            logging.error('-- Extraction of PALM data for file: '+filename+' failed')
-                    else:
-                        logging.error('-- Parsing of file: '+filename+' failed')
-                else:
-                    logging.info('File: '+fn+' already exists')
-                    if not args.skipsolr:
-                        logging.info('-- Reading JSON file: '+fn)
-
-                doccontent.clear()
+            palmfname = os.path.join(palmfilespath, 'app'+series+'.csv')
+            palm = loadPALMdata(palmfname)
+            tasks = docTasks(glob.glob(os.path.join(seriespath,'*.xml')))
+            with DocumentPool(args.workers, initParseWorker, (logconfig,)) as pool:
+                #records come back in file order whichever worker parsed them
+                for record in pool.map_chunks(processDocument, tasks):
+                    if record.written:
+                        numoffileswritten += 1
+                        logging.info('-- {} - Complete processing for file: {}'.format(numoffileswritten,record.jsonfname))
+                    if record.notfoundpalm is not None:
+                        notfoundPALM.append(record.notfoundpalm)
+                    if record.notfounddate is not None:
+                        notfoundCMS.append(record.notfounddate)
+                    if record.badfile is not None:
+                        badfiles.append(record.badfile)
             writeLogs(os.path.join(seriespath,'notfoundPALM.log'),notfoundPALM)
             writeLogs(os.path.join(seriespath,'notfoundCMS.log'),notfoundCMS)
             writeLogs(os.path.join(seriespath,'badfiles.log'),badfiles)
@@ -503,18 +451,22 @@ if __name__ == '__main__':
             for filename in glob.glob(os.path.join(seriespath,'*.json')):
                 logging.info('-- Reading JSON file: '+filename)
                 if filecounter < 10001:
-                    if readJSON(filename):
-                        filecounter += 1
+                    filecounter += readJSON(filename)
                 else:
-                    logging.info('Total number of files processed: '+filecounter)
+                    logging.info('Total number of files processed: '+str(filecounter))
+            filecounter += logSolrBatches(solr.flush(), ledger)
+            logging.info('-- Files indexed by Solr: '+str(filecounter))
         if args.s3tosolr:
             logging.info("From S3 to SOLR : Series [" + series + "]")
 
-            uploader = S3Uploader('uspto-bdr')
-            files = uploader.get_file_list(series + "/" + "130000")
-            for x in files:
-                logging.info( "Uploading " + x.key )
-                postFromS3ToSOLR(x)
+            uploader = S3Uploader('uspto-bdr', max_pool_connections=16)
+            for key in uploader.list_keys(series + "/" + "130000"):
+                logging.info( "Uploading " + key )
+                postFromS3ToSOLR(uploader.get_obj(key))
+            logSolrBatches(solr.flush(), s3ledger)
 
+    ledger.close()
+    s3ledger.close()
+    docdatecache.close()
 
     logging.info("-- [JOB END] -------------------")
@@ -21,14 +21,18 @@
 #with PALM data from flat files, and gets the post date from a Date file.
 #It then transforms the resulting dictionary to JSON and sends it to Solr for indexing.
 
-import sys, os, glob, shutil, logging, time, argparse, glob, json, requests,\
+import sys, os, glob, shutil, logging, time, argparse, glob, json,\
 collections, itertools
 
-from datetime import datetime
 from lxml import etree
-import pandas as pd
 
-from s3_upload.s3_uploader_new import S3Uploader
+from s3_upload.datefile import DateFileIndex
+from s3_upload.ledger import Ledger, s3_namespace
+from s3_upload.oa_records import DocumentPool, DocumentRecord
+from s3_upload.oa_xml import OAXmlExtractor
+from s3_upload.palm import PalmCache, PalmIndex
+from s3_upload.s3_uploader import S3Uploader
+from s3_upload.solr import Solr
 from s3_upload.util import Util
 
 #get public app IDs from app ID file
@@ -108,12 +112,7 @@ def changeExt(fname, ext):
 
 def getIFWNum(fname):
     try:
-        parser = etree.XMLParser(remove_pis=True)
-        tree = etree.parse(fname, parser=parser)
-        root = tree.getroot()
-        namespaces = {'uscom':'urn:us:gov:doc:uspto:common'}
-        for item in root.xpath('//uscom:Document', namespaces=namespaces):
-            return item.find('uscom:DocumentIdentifier', namespaces=namespaces).text
+        return OAXmlExtractor.document_identifier(fname)
     except IOError as e:
         logging.error('XML Parse file: '+fname+' I/O error({0}): {1}'.format(e.errno,e.strerror))
         return ''
@@ -122,145 +121,87 @@ def getIFWNum(fname):
         badfiles.append(fname)
         return False
 
-#get metadata and text from P tags in XML document
-def getText(node):
-    contents = ''
-    if node.tag == '{urn:us:gov:doc:uspto:common}LI' and node.text is not None:
-        contents += (node.get('{http://www.wipo.int/standards/XMLSchema/ST96/Common}liNumber')+' '+node.text +
-                     ''.join(map(getText, node)) +
-                     (node.tail or ''))
-    #ignore data table text
-    elif node.tag == '{urn:us:gov:doc:uspto:common}DataTable':
-        return contents
-    #ignore image paragraphs
-    elif node.tag == '{http://www.wipo.int/standards/XMLSchema/ST96/Common}Image':
-        return contents
-    else:
-        contents += ((node.text or '') +
-                    ''.join(map(getText, node)) +
-                    (node.tail or ''))
-    return contents
-
-#code for parsing XML file
-def parseXML(fname):
-    try:
-        textdata = ''
-        parser = etree.XMLParser(remove_pis=True)
-        tree = etree.parse(fname, parser=parser)
-        root = tree.getroot()
-        namespaces = {'uspat':'urn:us:gov:doc:uspto:patent',
-                      'uscom':'urn:us:gov:doc:uspto:common',
-                      'com':'http://www.wipo.int/standards/XMLSchema/ST96/Common'}
-        for item in root.xpath('//uspat:DocumentMetadata', namespaces=namespaces):
-            doccontent['documentcode'] = item.find('uscom:DocumentCode', namespaces=namespaces).text
-            doccontent['documentsourceidentifier'] = item.find('uscom:DocumentSourceIdentifier', namespaces=namespaces).text
-            partyid = doccontent['partyidentifier'] = item.find('com:PartyIdentifier', namespaces=namespaces)
-            if partyid is not None:
-                doccontent['partyidentifier'] = partyid.text
-            else:
-                doccontent['partyidentifier'] = ''
-            doccontent['groupartunitnumber'] = item.find('uscom:GroupArtUnitNumber', namespaces = namespaces).text
-        for item in root.xpath('//uscom:P', namespaces=namespaces):
-            textdata += getText(item)+'\n'
-        doccontent['textdata'] = textdata
-        return True
-    except IOError as e:
-        logging.error('XML Parse file: '+fname+' I/O error({0}): {1}'.format(e.errno,e.strerror))
-        return False
-    except etree.XMLSyntaxError:
-        logging.error('-- Skipping invalid XML from file: '+fname)
-        badfiles.append(fname)
-        return False
-
-#convert day-month-year to UTC timestamp
-def convertToUTC(date,format):
-    if date != '' and date != None and date != 'nan':
-        dt = datetime.strptime(date, format)
-        dt = time.mktime(dt.timetuple())
-    else:
-        dt = 978325200.0
-    return dt
-
-def loadPALMdata():
+def loadPALMdata(palmfname):
     logging.info('-- Loading PALM data')
-    dataframe =  pd.read_csv(os.path.join(palmfilespath, 'app'+series+'.csv'), encoding = 'latin-1')
-    logging.info('-- PALM data loaded into dataframe')
-    return dataframe
+    cache = PalmCache(palmcachepath)
+    if not cache.is_cached(palmfname):
+        logging.info('-- Building PALM cache for: '+palmfname)
+    palm = PalmIndex(cache.load(palmfname), as_text=True, missing_date=978325200.0)
+    logging.info('-- PALM data indexed for {} app IDs'.format(len(palm)))
+    return palm
 
 def loadDateData():
     logging.info('-- Loading date data')
-    dataframe =  pd.read_csv(datefilepath, encoding = 'latin-1')
-    logging.info('-- Date data loaded into dataframe')
-    return dataframe
-
-#code for extracting PALM data from PALM series file and combine with other elements from XML file
-def getPALMData(fileappid):
-    try:
-        logging.info('-- Starting PALM data match process')
-        values = df.loc[df['APPL_ID'] == float(fileappid)]
-        if len(values.index) == 1:
-            values = values.to_dict('list')
-            doccontent['appl_id'] = str(values['APPL_ID'][0])
-            doccontent['file_dt'] = convertToUTC(str(values['FILE_DT'][0]), '%d-%b-%y')
-            doccontent['effective_filing_dt'] = convertToUTC(str(values['EFFECTIVE_FILING_DT'][0]), '%d-%b-%y')
-            doccontent['inv_subj_matter_ty'] = str(values['INV_SUBJ_MATTER_TY'][0])
-            doccontent['appl_ty'] = str(values['APPL_TY'][0])
-            doccontent['dn_examiner_no'] = str(values['DN_EXAMINER_NO'][0]).strip()
-            doccontent['dn_dw_dn_gau_cd'] = str(values['DN_DW_DN_GAU_CD'][0])
-            doccontent['dn_pto_art_class_no'] = str(values['DN_PTO_ART_CLASS_NO'][0])
-            doccontent['dn_pto_art_subclass_no'] = str(values['DN_PTO_ART_SUBCLASS_NO'][0])
-            doccontent['confirm_no'] = str(values['CONFIRM_NO'][0])
-            doccontent['dn_intppty_cust_no'] = str(values['DN_INTPPTY_CUST_NO'][0])
-            doccontent['atty_dkt_no'] = str(values['ATTY_DKT_NO'][0])
-            doccontent['dn_nsrd_curr_loc_cd'] = str(values['DN_NSRD_CURR_LOC_CD'][0]).strip()
-            doccontent['dn_nsrd_curr_loc_dt'] = convertToUTC(str(values['DN_NSRD_CURR_LOC_DT'][0]), '%d-%b-%y')
-            doccontent['app_status_no'] = str(values['APP_STATUS_NO'][0])
-            doccontent['app_status_dt'] = convertToUTC(str(values['APP_STATUS_DT'][0]), '%d-%b-%y')
-            doccontent['wipo_pub_no'] = str(values['WIPO_PUB_NO'][0])
-            doccontent['patent_no'] = str(values['PATENT_NO'][0])
-            doccontent['patent_issue_dt'] = convertToUTC(str(values['PATENT_ISSUE_DT'][0]), '%d-%b-%y')
-            doccontent['abandon_dt'] = convertToUTC(str(values['ABANDON_DT'][0]), '%d-%b-%y')
-            doccontent['disposal_type'] = str(values['DISPOSAL_TYPE'][0])
-            doccontent['se_in'] = str(values['SE_IN'][0])
-            doccontent['pct_no'] = str(values['PCT_NO'][0]).strip()
-            doccontent['invn_ttl_tx'] = str(values['INVN_TTL_TX'][0])
-            doccontent['aia_in'] = str(values['AIA_IN'][0])
-            doccontent['continuity_type'] = str(values['CONTINUITY_TYPE'][0]).strip()
-            doccontent['frgn_priority_clm'] = str(values['FRGN_PRIORITY_CLM'][0])
-            doccontent['usc_119_met'] = str(values['USC_119_MET'][0])
-            doccontent['fig_qt'] = str(values['FIG_QT'][0])
-            doccontent['indp_claim_qt'] = str(values['INDP_CLAIM_QT'][0])
-            doccontent['efctv_claims_qt'] = str(values['EFCTV_CLAIMS_QT'][0])
-            logging.info('-- PALM data written to doccontent dictionary')
-            return True
-        else:
-            logging.error('-- Application ID: '+fileappid+' not found in PALM data')
-            notfoundPALM.append(fileappid)
-            return False
-    except IOError as e:
-        logging.error('PALM Extract file: '+fileappid+' I/O error({0}): {1}'.format(e.errno,e.strerror))
-        return False
-
-#get official application doc date
-def getDocDate(appid, ifwnum):
+    dates = DateFileIndex.read_csv(datefilepath)
+    logging.info('-- Date data indexed for {} documents'.format(len(dates)))
+    return dates
+
+#set up a parse worker process, the PALM data travels with each task
+def initParseWorker(logconfig):
+    logging.basicConfig(**logconfig)
+
+#pair each file still to be parsed with its doc date from the date file and its PALM record, yields a list of tasks per chunk of files
+def docTasks(filenames, chunksize=5000):
+    for start in range(0, len(filenames), chunksize):
+        chunk = []
+        for filename in filenames[start:start+chunksize]:
+            fpath,fname = os.path.split(filename)
+            if not fname.endswith('OACSConversion.xml'):
+                fn = changeExt(filename, 'json')
+                if os.path.isfile(fn):
+                    logging.info('File: '+fn+' already exists')
+                else:
+                    chunk.append(filename)
+        records = palm.records(os.path.basename(filename).split('_')[0] for filename in chunk)
+        tasks = []
+        for filename in chunk:
+            fileappid = os.path.basename(filename).split('_')[0]
+            ifwnum = os.path.basename(filename).split('_')[1]
+            tasks.append((filename, datefile.lookup(fileappid, ifwnum), records.get(fileappid)))
+        yield tasks
+
+#build the JSON document of one XML file from the XML, PALM data and doc date
+def processDocument(task):
+    filename, docdate, record = task
+    logging.info('-- Start Processing file: '+filename)
+    fn = changeExt(filename, 'json')
+    fileappid = (os.path.basename(filename)).split('_')[0]
+    ifwnum = (os.path.basename(filename)).split('_')[1]
+    doccontent = collections.OrderedDict()
+    #type set to oa for office actions
+    doccontent['type'] = 'oa'
+    doccontent['appid'] = fileappid
+    #IFW number for action
+    doccontent['ifwnumber'] = ifwnum
+    doccontent['staging_src_path'] = filename
     try:
-        logging.info('-- Starting Date match process')
-        values = datefile.loc[(datefile['Application_Id'] == float(fileappid)) & (datefile['Document_Id'] == ifwnum)]
-        if len(values.index) == 1:
-            values = values.to_dict('list')
-            doccontent['doc_date'] = convertToUTC(str(values['Mailroom_Date'][0]), '%Y-%m-%d %H:%M:%S')
-            logging.info('-- Date data written to doccontent dictionary')
-            return True
-        else:
-            logging.error('-- Application ID: '+fileappid+' not found in Date data')
-            notfoundDate.append(fileappid)
-            return False
+        #get metadata and text from P tags in XML document
+        doccontent.update(OAXmlExtractor.extract(filename))
     except IOError as e:
-        logging.error('Date Extract file: '+fileappid+' I/O error({0}): {1}'.format(e.errno,e.strerror))
-        return False
+        logging.error('XML Parse file: '+filename+' I/O error({0}): {1}'.format(e.errno,e.strerror))
+        logging.error('-- Parsing of file: '+filename+' failed')
+        return DocumentRecord(filename, fn)
+    except etree.XMLSyntaxError:
+        logging.error('-- Skipping invalid XML from file: '+filename)
+        logging.error('-- Parsing of file: '+filename+' failed')
+        return DocumentRecord(filename, fn, badfile=filename)
+    if record is None:
+        logging.error('-- Application ID: '+fileappid+' not found in PALM data')
+        logging.error('-- Extraction of PALM data for file: '+filename+' failed')
+        return DocumentRecord(filename, fn, notfoundpalm=fileappid)
+    doccontent.update(record)
+    if docdate is None:
+        logging.error('-- Application ID: '+fileappid+' not found in Date data')
+        logging.error('-- Retrieval of Doc Date for file: '+filename+' failed')
+        return DocumentRecord(filename, fn, notfounddate=fileappid)
+    doccontent['doc_date'] = docdate
+    if not writeToJSON(fn, doccontent):
+        logging.error('-- write to JSON for file: '+filename+' failed')
+        return DocumentRecord(filename, fn)
+    return DocumentRecord(filename, fn, True)
 
 #write dictionary to JSON file
-def writeToJSON(fname):
+def writeToJSON(fname, doccontent):
     try:
         with open(fname,'w') as outfile:
             json.dump(doccontent,outfile)
@@ -270,78 +211,60 @@ def writeToJSON(fname):
         logging.error('Write to JSON: '+fname+' I/O error({0}): {1}'.format(e.errno,e.strerror))
         return False
 
-#read JSON file and set up for sending to Solr
+#read JSON file and queue it for Solr indexing, returns the number of documents Solr accepted
 def readJSON(fname):
     try:
         docid = fname.split('_')[0]+', '+fname.split('_')[1]
+        if docid in ledger:
+            logging.info('-- File: '+docid+' already processed by Solr')
+            return 0
         with open(fname, 'r') as fd:
-            jsontext = json.load(fd)
-            with open(os.path.join(os.path.dirname(fname), 'solrComplete.log'), 'a+') as logfile:
-                logfile.seek(0)
-                if docid+'\n' in logfile:
-                    logging.info('-- File: '+docid+' already processed by Solr')
-                else:
-                    logging.info('-- Sending file: '+docid+' to Solr')
-                    response = sendToSolr('oa', jsontext)
-                    r = response.json()
-                    status = r['responseHeader']['status']
-                    if status == 0:
-                        logfile.write(docid+"\n")
-                        logging.info("-- Solr update for file: "+docid+" complete")
-                    else:
-                        logging.info("-- Solr error for doc: "+docid+" error: "+', '.join("{!s}={!r}".format(k,v) for (k,v) in rdict.items()))
+            jsontext = fd.read()
+        logging.info('-- Sending file: '+docid+' to Solr')
+        return logSolrBatches(solr.add_documents([(docid, jsontext)]), ledger)
     except IOError as e:
         logging.error('Read JSON file: '+fname+' I/O error({0}): {1}'.format(e.errno,e.strerror))
+        return 0
     except:
         logging.error('Unexpected error:', sys.exc_info()[0])
         raise
 
-#read JSON file and set up for sending to Solr
+#read JSON file and queue it for Solr indexing, returns the number of documents Solr accepted
 def postFromS3ToSOLR(obj):
     try:
-        log_dir_path = os.path.join("logs", "solr_upload", Util.log_directory(obj.key))
-        logging.info("Log dir for file " + log_dir_path )
-        os.makedirs(log_dir_path, exist_ok=True)
-
         docid = Util.doc_id(obj.key)
+
+        if docid in s3ledger:
+            logging.info('-- File: '+docid+' already processed by Solr')
+            return 0
+
         objdata = obj.get()
         jsontext = objdata['Body'].read()
 
         jsontext = Util.reprocess_document(jsontext, obj.key)
 
-        with open(os.path.join(log_dir_path  , 'solrComplete.log'), 'a+') as logfile:
-                logfile.seek(0)
-                if docid+'\n' in logfile:
-                    logging.info('-- File: '+docid+' already processed by Solr')
-                else:
-                    logging.info('-- Sending file: '+obj.key+' to Solr')
-                    response = sendToSolr('oadata_3_shard1_replica3', jsontext)
-                    r = response.json()
-                    status = r['responseHeader']['status']
-                    if status == 0:
-                        logfile.write(docid+"\n")
-                        logging.info('-- Solr update for file: '+docid+' complete')
-                        return True
-                    else:
-                        logging.info('-- Solr error for doc: '+docid+' error: '+ \
-                        ', '.join("{!s}={!r}".format(k,v) for (k,v) in r.items()))
-                        return False
+        logging.info('-- Sending file: '+obj.key+' to Solr')
+        return logSolrBatches(s3solr.add_documents([(docid, jsontext)]), s3ledger)
     except IOError as e:
         logging.error('Read JSON file: '+ obj.key +' I/O error({0}): {1}'.format(e.errno,e.strerror))
-        return False
+        return 0
     except:
         logging.error('Unexpected error:', sys.exc_info()[0])
         raise
 
-#send document to Solr for indexin
-def sendToSolr(core, json):
-    try:
-        jsontext = '{"add":{ "doc":'+json+',"boost":1.0,"overwrite":true, "commitWithin": 1000}}'
-        url = os.path.join(solrURL,"solr",core,"update")
-        headers = {"Content-type" : "application/json"}
-        return requests.post(url, data=jsontext, headers=headers)
-    except requests.exceptions.RequestException as e:
-        logging.error('-- Solr indexing error: '+e)
+#record the documents of each completed Solr batch in the completion ledger, returns the number accepted
+def logSolrBatches(batches, ledger):
+    accepted = 0
+    for batch in batches:
+        if batch.status == 0:
+            ledger.mark_all(batch.keys)
+            accepted += len(batch.keys)
+            logging.info('-- Solr update for {} files complete: '.format(len(batch.keys))+'; '.join(batch.keys))
+        else:
+            logging.error('-- Solr error for batch of {} docs: '.format(len(batch.keys))+\
+            ', '.join("{!s}={!r}".format(k,v) for (k,v) in batch.response.items()))
+            logging.error('-- Files not indexed: '+'; '.join(batch.keys))
+    return accepted
 
 if __name__ == '__main__':
     scriptpath = os.path.dirname(os.path.abspath(__file__))
@@ -350,8 +273,10 @@ if __name__ == '__main__':
     notfoundpalmfname = 'notfoundPALM.log'
     oafilespath = '\\\\s-mdw-isl-b02-smb.uspto.gov\\BigData\\BackFile'
     palmfilespath = '\\\\nsx-orgshares\\CIO-OCIO\\BDR_Access\\PALM'
+    palmcachepath = os.path.join(scriptpath, 'files', 'PALM')
     datefilepath = '\\\\nsx-orgshares\\CIO-OCIO\\BDR_Access\\doc_date\staging_doc_date_sorted.csv'
     solrURL = ''
+    ledgerpath = os.path.join('logs', 'solrcomplete.db')
     appids = []
     completeappids = []
     notfoundappids = []
@@ -361,16 +286,16 @@ if __name__ == '__main__':
     badfiles = []
     currentapp = ''
     numoffileswritten = 0
-    doccontent = collections.OrderedDict()
     ifwnum = ''
 
-    #logging configuration
-    logging.basicConfig(
+    #logging configuration, also used by the parse workers
+    logconfig = dict(
                         filename='logs/extract-staging-files-log-'+time.strftime('%Y%m%d')+'.txt',
                         level=logging.INFO,
                         format='%(asctime)s - %(name)s - %(levelname)s -%(message)s',
                         datefmt='%Y%m%d %H:%M:%S'
                        )
+    logging.basicConfig(**logconfig)
     parser = argparse.ArgumentParser()
     parser.add_argument(
                         '-s',
@@ -425,6 +350,29 @@ if __name__ == '__main__':
                         action="store_true",
                         default=False
                        )
+    parser.add_argument(
+                        '-b',
+                        '--batchsize',
+                        required=False,
+                        help='Specify number of documents sent to Solr per update request',
+                        type=int,
+                        default=500
+                       )
+    parser.add_argument(
+                        '--commitwithin',
+                        required=False,
+                        help='Specify number of milliseconds within which Solr commits the documents sent',
+                        type=int,
+                        default=10000
+                       )
+    parser.add_argument(
+                        '-w',
+                        '--workers',
+                        required=False,
+                        help='Specify number of processes used to parse XML files',
+                        type=int,
+                        default=1
+                       )
     args = parser.parse_args()
     logging.info("-- SCRIPT ARGUMENTS ------------")
     if args.series:
@@ -435,8 +383,16 @@ if __name__ == '__main__':
     logging.info("-- Start range of files to extract set to: "+str(args.startappid))
     logging.info("-- End range of files to extract set to: "+str(args.endappid))
     logging.info("-- Skip s3 to Solr flag set to: "+str(args.s3tosolr))
+    logging.info("-- Solr batch size set to: "+str(args.batchsize))
+    logging.info("-- Solr commitWithin set to: "+str(args.commitwithin)+"ms")
+    logging.info("-- Parse workers set to: "+str(args.workers))
     logging.info("-- [JOB START]  ----------------")
 
+    solr = Solr(solrURL, 'oa', batch_size=args.batchsize, commit_within=args.commitwithin)
+    s3solr = Solr(solrURL, 'oadata_3_shard1_replica3', batch_size=args.batchsize, commit_within=args.commitwithin)
+    ledger = Ledger(ledgerpath, solr.core, commit_every=args.batchsize)
+    s3ledger = Ledger(ledgerpath, s3_namespace(s3solr.core), commit_every=args.batchsize)
+
     for series in args.series:
         seriespath = os.path.join(scriptpath,'extractedfiles', series, 'staging')
         if not args.skipextraction:
@@ -495,43 +451,22 @@ if __name__ == '__main__':
             del notfoundappids[:]
             del nofileappids[:]
         if not args.skipparsing:
-            df = loadPALMdata()
+            palmfname = os.path.join(palmfilespath, 'app'+series+'.csv')
+            palm = loadPALMdata(palmfname)
             datefile = loadDateData()
-            for filename in glob.glob(os.path.join(seriespath,'*.xml')):
-                fpath,fname = os.path.split(filename)
-                if not fname.endswith('OACSConversion.xml'):
-                    logging.info('-- Start Processing file: '+fname)
-                    fname = os.path.join(seriespath, filename)
-                    fn = changeExt(fname, 'json')
-                    if not os.path.isfile(fn):
-                        fileappid = (os.path.basename(filename)).split('_')[0]
-                        ifwnum = (os.path.basename(filename)).split('_')[1]
-                        #type set to oa for office actions
-                        doccontent['type'] = 'oa'
-                        doccontent['appid'] = fileappid
-                        #IFW number for action
-                        doccontent['ifwnumber'] = ifwnum
-                        doccontent['staging_src_path'] = filename
-                        if parseXML(fname):
-                            if getPALMData(fileappid):
-                                if getDocDate(fileappid, ifwnum):
-                                    if writeToJSON(fn):
-                                        numoffileswritten += 1
-                                        logging.info('-- {} - Complete processing for file: {}'.format(numoffileswritten,fn))
-                                    else:
-                                        logging.error('-- write to JSON for file: '+fname+' failed')
-                                else:
-                                    logging.error('-- Retrieval of Doc Date for file: '+fname+' failed')
-                            else:
-                                logging.error('-- Extraction of PALM data for file: '+fname+' failed')
-                        else:
-                            logging.error('-- Parsing of file: '+fname+' failed')
-                    else:
-                        logging.info('File: '+fn+' already exists')
-                        if not args.skipsolr:
-                            logging.info('-- Reading JSON file: '+fn)
-
-                    doccontent.clear()
+            tasks = docTasks(glob.glob(os.path.join(seriespath,'*.xml')))
+            with DocumentPool(args.workers, initParseWorker, (logconfig,)) as pool:
+                #records come back in file order whichever worker parsed them
+                for record in pool.map_chunks(processDocument, tasks):
+                    if record.written:
+                        numoffileswritten += 1
+                        logging.info('-- {} - Complete processing for file: {}'.format(numoffileswritten,record.jsonfname))
+                    if record.notfoundpalm is not None:
+                        notfoundPALM.append(record.notfoundpalm)
+                    if record.notfounddate is not None:
+                        notfoundDate.append(record.notfounddate)
+                    if record.badfile is not None:
+                        badfiles.append(record.badfile)
             writeLogs(os.path.join(seriespath,'notfoundPALM.log'),notfoundPALM)
             writeLogs(os.path.join(seriespath,'notfoundDate.log'),notfoundDate)
             writeLogs(os.path.join(seriespath,'badfiles.log'),badfiles)
@@ -543,18 +478,21 @@ if __name__ == '__main__':
             for filename in glob.glob(os.path.join(seriespath,'*.json')):
                 logging.info('-- Reading JSON file: '+filename)
                 if filecounter < 10001:
-                    if readJSON(filename):
-                        filecounter += 1
+                    filecounter += readJSON(filename)
                 else:
-                    logging.info('Total number of files processed: '+filecounter)
+                    logging.info('Total number of files processed: '+str(filecounter))
+            filecounter += logSolrBatches(solr.flush(), ledger)
+            logging.info('-- Files indexed by Solr: '+str(filecounter))
         if not args.s3tosolr:
             logging.info("From S3 to SOLR : Series [" + series + "]")
 
-            uploader = S3Uploader('uspto-bdr')
-            files = uploader.get_file_list(series + "/" + "130000")
-            for x in files:
-                logging.info( "Uploading " + x.key )
-                postFromS3ToSOLR(x)
+            uploader = S3Uploader('uspto-bdr', max_pool_connections=16)
+            for key in uploader.list_keys(series + "/" + "130000"):
+                logging.info( "Uploading " + key )
+                postFromS3ToSOLR(uploader.get_obj(key))
+            logSolrBatches(s3solr.flush(), s3ledger)
 
+    ledger.close()
+    s3ledger.close()
 
     logging.info("-- [JOB END] -------------------")
@@ -3,12 +3,12 @@
 
 ###################################################################################################################
 #
-#Script to download,extract, and parse PTAB pdf files from USPTO bulk data site. 
+#Script to download and parse PTAB pdf files from USPTO bulk data site. 
 #
 #argument options:
 #           (1) pass -d OR --date AND YYYYMMDD to download files from a specific date on
 #           (2) pass -a OR --all to download all files
-#           (3) pass -n OR --none to skip downloading of files and execute unzipping process
+#           (3) pass -n OR --none to skip downloading of files and only parse the downloaded files
 #
 ###################################################################################################################
 
@@ -66,6 +66,8 @@ scriptName=$0
 statusDirectory=logs
 baseURL="https://bulkdata.uspto.gov/data2/patent/trial/appeal/board/"
 dropLocation="files/PTAB"
+#extracted text keyed on pdf content, shared by all runs
+textStore="files/textstore"
 startDate=19970702
 endDate=$(date +%Y%m%d) 
 retrieveAll=false
@@ -134,75 +136,50 @@ begDate=$startDate
 if ! $retrieveNone
 then
   log "INFO" "Starting file download process"
-  while [ $begDate -le $endDate ]
-  do
-    year=$(date -d $begDate +%Y) 
-    week=$(date -d $begDate +%V)
-    if [ $year -eq  2015 ]
-    then
-      week="$(printf "%02d" $((10#$week-1)))"
-    fi
-    zipFilePath=${baseURL}PTAB_${begDate}_WK${week}.zip
-    wget -q --spider $zipFilePath
-    if [ $? -eq 0 ]
-    then
-      log "INFO" "Downloading file: $zipFilePath"
-      wget -nc -P $dropLocation $zipFilePath >> $statusDirectory/retrieve-log-$processingTime 2>&1
-    else 
-      log "ERR" "file does not exist: $zipFilePath"
-    fi
-    begDate=$(date '+%C%y%m%d' -d "$begDate+7 days")
-  done
+  #download_ptab_files.py builds the weekly file names from the dates the same
+  #way this loop used to, downloads them in parallel and resumes partial files
+  python download_ptab_files.py -s $startDate -e $endDate -d $dropLocation >> $statusDirectory/retrieve-log-$processingTime 2>&1
+  if [ $? -ne 0 ]
+  then
+    log "ERR" "some files could not be downloaded, see $statusDirectory/retrieve-log-$processingTime"
+  fi
   log "INFO" "File download process complete"
 #if --none flag is set then skip download process
 else
   log "INFO" "skipping file download process"
 fi
 
-#unzip all zip files unless they have already been unzipped
-log "INFO" "Starting file unzipping process"
-
-find $dropLocation -type f -name "*.zip" -exec unzip -n {} -d $dropLocation \;
-
-log "INFO" "File unzip process complete"
-
 log "INFO" "Starting file parsing process"
 
-#parse all pdf files that have not already been parsed
+#parse all pdf files that have not already been parsed, reading them straight
+#from the zip files (parse_pdf.py keeps a manifest of the members it has done).
+#All archives go to one parse_pdf.py run so the extraction workers start once.
 
+archives=()
 begDate=$startDate
 echo $begDate
 while [ $begDate -le $endDate ]
 do
-  for f in $dropLocation/PTAB_*$begDate
+  for f in $dropLocation/PTAB_${begDate}_WK*.zip
   do
-    if [[ $f == *.zip ]]
+    if [ -f "$f" ]
     then
-      continue;
-    else
-      echo $f
-      if [ -d "$f/PDF_image" ]
-      then
-        for i in $f/PDF_image/*.pdf
-        do
-          fname=$(basename "$i")
-          fname="${fname%.*}"
-          if [ ! -f "$f/PDF_image/$fname.txt" ]
-          then
-            log "INFO" "Parsing document: $i to ${i%.*}.txt"
-            python parse_pdf.py "$i" >> $statusDirectory/retrieve-log-$processingTime 2>&1
-            # leaving this cURL command in so we can use it for reference or debugging
-            # curl -X PUT --data-binary @$i http://192.168.99.100:9998/tika --header "Content-type: application/pdf" > ${i%.*}.txt
-           fi
-        done
-      else
-        log "INFO" "No files to parse"
-      fi
+      archives+=("$f")
     fi
-  done       
+  done
   begDate=$(date '+%C%y%m%d' -d "$begDate+7 days")
 done
 
+if [ ${#archives[@]} -gt 0 ]
+then
+  log "INFO" "Parsing documents of ${#archives[@]} archives"
+  python parse_pdf.py --store $textStore "${archives[@]}" >> $statusDirectory/retrieve-log-$processingTime 2>&1
+  # leaving this cURL command in so we can use it for reference or debugging
+  # curl -X PUT --data-binary @$i http://192.168.99.100:9998/tika --header "Content-type: application/pdf" > ${i%.*}.txt
+else
+  log "INFO" "No files to parse"
+fi
+
 log "INFO" "File parsing process complete"
 
 log "INFO" "-[JOB END]-- $(date): ------------"
@@ -0,0 +1,74 @@
+import glob
+import os
+import time
+
+
+class Checkpoint(object):
+    # Keys the workers of a stage have finished, in one append only file per
+    # worker under root. Keys are written and synced in batches, so a crash
+    # loses at most the last batch, which is then just done again. Every
+    # worker reads the files of all workers under root, so when root is on
+    # a filesystem the workers share, what was done before still counts when
+    # the keys are split between a different number of workers. On a local
+    # root a worker only sees what it did itself.
+    def __init__(self, root, worker, batch_size=500, interval=30):
+        os.makedirs(root, exist_ok=True)
+
+        self.root = root
+        self.path = os.path.join(root, '{}.done'.format(worker))
+        self.batch_size = batch_size
+        self.interval = interval
+        self.pending = []
+        self.flushed = time.time()
+
+        self.truncate_partial(self.path)
+        self.done = self.load(root)
+        self.fd = open(self.path, 'a')
+
+    @classmethod
+    def load(cls, root):
+        done = set()
+        for fname in glob.glob(os.path.join(root, '*.done')):
+            with open(fname, 'r') as fd:
+                for line in fd:
+                    # A line without its newline was cut off by a crash
+                    if line.endswith('\n'):
+                        done.add(line[:-1])
+        return done
+
+    @classmethod
+    def truncate_partial(cls, path):
+        # Drops a line cut off by a crash, so the next batch starts on a
+        # line of its own
+        if not os.path.isfile(path):
+            return
+
+        with open(path, 'rb+') as fd:
+            data = fd.read()
+            if data and not data.endswith(b'\n'):
+                fd.truncate(data.rfind(b'\n') + 1)
+
+    def __contains__(self, key):
+        return key in self.done
+
+    def __len__(self):
+        return len(self.done)
+
+    def mark(self, key):
+        self.done.add(key)
+        self.pending.append(key)
+
+        if len(self.pending) >= self.batch_size or time.time() - self.flushed >= self.interval:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.fd.write(''.join(key + '\n' for key in self.pending))
+            self.fd.flush()
+            os.fsync(self.fd.fileno())
+            self.pending = []
+        self.flushed = time.time()
+
+    def close(self):
+        self.flush()
+        self.fd.close()
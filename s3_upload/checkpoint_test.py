@@ -0,0 +1,65 @@
+from checkpoint import Checkpoint
+from partitioner import Partitioner
+
+
+def test_keys_are_written_in_batches(tmpdir):
+    c = Checkpoint(str(tmpdir), 'worker1', batch_size=3, interval=3600)
+
+    c.mark('a')
+    c.mark('b')
+    assert 'a' in c
+    assert tmpdir.join('worker1.done').read() == ''
+
+    c.mark('c')
+    assert tmpdir.join('worker1.done').read() == 'a\nb\nc\n'
+
+    c.mark('d')
+    c.close()
+    assert tmpdir.join('worker1.done').read() == 'a\nb\nc\nd\n'
+
+
+def test_restart_skips_keys_done_before(tmpdir):
+    c = Checkpoint(str(tmpdir), 'worker1', batch_size=2)
+    for key in ['a', 'b', 'c']:
+        c.mark(key)
+    # crash before the last batch was written
+    c.fd.close()
+
+    c = Checkpoint(str(tmpdir), 'worker1')
+
+    assert 'a' in c and 'b' in c
+    assert 'c' not in c
+    assert len(c) == 2
+
+
+def test_line_cut_off_by_a_crash_is_dropped(tmpdir):
+    tmpdir.join('worker1.done').write('a\nb\npart')
+
+    c = Checkpoint(str(tmpdir), 'worker1', batch_size=1)
+    c.mark('c')
+    c.close()
+
+    assert 'part' not in c
+    assert tmpdir.join('worker1.done').read() == 'a\nb\nc\n'
+
+
+def test_resume_survives_a_change_of_worker_count(tmpdir):
+    keys = ['13/%d_X_Non-Final_Rejection.json' % i for i in range(300)]
+
+    # two workers got part of the way through
+    for k in (1, 2):
+        c = Checkpoint(str(tmpdir), 'worker%d' % k, batch_size=10)
+        for i, key in enumerate(Partitioner(keys, k, 2).get_my_stream()):
+            if i < 100:
+                c.mark(key)
+        c.close()
+
+    # the stage is rerun with three
+    left = []
+    for k in (1, 2, 3):
+        c = Checkpoint(str(tmpdir), 'worker%d' % k)
+        left += [key for key in Partitioner(keys, k, 3).get_my_stream() if key not in c]
+        c.close()
+
+    assert len(left) == 100
+    assert len(set(left)) == 100
@@ -0,0 +1,177 @@
+import collections
+import concurrent.futures
+import os
+import sqlite3
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from s3_upload.util import Util
+
+FOUND = 'found'
+NOT_FOUND = 'notfound'
+NO_DATE = 'nodate'
+ERROR = 'error'
+
+# Resolved official document date of one (appid, ifwnum) pair. doc_date is a
+# UTC timestamp, or '' when the date could not be resolved.
+DocDate = collections.namedtuple('DocDate', ['doc_date', 'status'])
+
+
+class DocDateCache(object):
+    # Dates resolved in earlier runs. Found dates (and documents without a
+    # date) are kept for good, documents CMS did not know are retried once
+    # they are older than miss_ttl seconds. Request errors are never cached.
+    def __init__(self, path, miss_ttl=7 * 24 * 3600, timeout=60):
+
+        dirname = os.path.dirname(path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+
+        self.path = path
+        self.miss_ttl = miss_ttl
+
+        self.conn = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS doc_dates ('
+                          'appid TEXT NOT NULL, '
+                          'ifwnum TEXT NOT NULL, '
+                          'doc_date REAL, '
+                          'status TEXT NOT NULL, '
+                          'resolved_at REAL NOT NULL, '
+                          'PRIMARY KEY (appid, ifwnum)) WITHOUT ROWID')
+
+    def get(self, appid, ifwnum, now=None):
+        if now is None:
+            now = time.time()
+
+        row = self.conn.execute('SELECT doc_date, status, resolved_at FROM doc_dates '
+                                'WHERE appid = ? AND ifwnum = ?', (appid, ifwnum)).fetchone()
+        if row is None:
+            return None
+
+        doc_date, status, resolved_at = row
+        if status == NOT_FOUND and resolved_at + self.miss_ttl < now:
+            return None
+
+        return DocDate('' if doc_date is None else doc_date, status)
+
+    def get_many(self, pairs):
+        now = time.time()
+        cached = {}
+        for appid, ifwnum in pairs:
+            rv = self.get(appid, ifwnum, now)
+            if rv is not None:
+                cached[(appid, ifwnum)] = rv
+
+        return cached
+
+    def put_many(self, results):
+        now = time.time()
+        rows = [(appid, ifwnum, None if rv.doc_date == '' else rv.doc_date, rv.status, now)
+                for (appid, ifwnum), rv in results.items() if rv.status != ERROR]
+        if not rows:
+            return
+
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            self.conn.executemany('INSERT OR REPLACE INTO doc_dates '
+                                  '(appid, ifwnum, doc_date, status, resolved_at) VALUES (?, ?, ?, ?, ?)', rows)
+        except:
+            self.conn.execute('ROLLBACK')
+            raise
+        self.conn.execute('COMMIT')
+
+    def close(self):
+        self.conn.close()
+
+
+class CmsDateResolver(object):
+    def __init__(self, url, batch_size=100, max_workers=8, timeout=60, cache=None):
+        self.url = url
+        self.cache = cache
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def resolve(self, pairs):
+        # Resolves many (appid, ifwnum) pairs, batch_size pairs per request
+        # and up to max_workers requests in flight. Pairs held by the cache
+        # are not requested again. Returns a dict of DocDate keyed on the
+        # pairs.
+        pairs = list(collections.OrderedDict.fromkeys(pairs))
+
+        cached = {}
+        if self.cache is not None:
+            cached = self.cache.get_many(pairs)
+            pairs = [key for key in pairs if key not in cached]
+
+        batches = [pairs[i:i + self.batch_size] for i in range(0, len(pairs), self.batch_size)]
+
+        results = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for rv in executor.map(self.resolve_batch, batches):
+                results.update(rv)
+
+        if self.cache is not None:
+            self.cache.put_many(results)
+
+        results.update(cached)
+        return results
+
+    def resolve_one(self, appid, ifwnum):
+        return self.resolve([(appid, ifwnum)])[(appid, ifwnum)]
+
+    def resolve_batch(self, batch):
+        params = [{"businessUnitId": appid, "documentId": ifwnum} for appid, ifwnum in batch]
+        headers = {'Content-type': 'application/json'}
+
+        try:
+            response = self.session.post(self.url, json=params, headers=headers, timeout=self.timeout)
+            r = response.json()
+        except (requests.exceptions.RequestException, ValueError):
+            return {key: DocDate('', ERROR) for key in batch}
+
+        if 'httpStatus' in r:
+            # The service fails the whole request when any document of it is
+            # unknown, so split the batch until the missing documents are
+            # isolated.
+            if len(batch) == 1:
+                return {batch[0]: DocDate('', NOT_FOUND)}
+
+            half = len(batch) // 2
+            results = self.resolve_batch(batch[:half])
+            results.update(self.resolve_batch(batch[half:]))
+            return results
+
+        return self.map_response(batch, r)
+
+    @classmethod
+    def map_response(cls, batch, r):
+        # Entries are matched on the ids they carry, falling back to the
+        # order of the request
+        by_id = {}
+        for entry in r:
+            if 'businessUnitId' in entry and 'documentId' in entry:
+                by_id[(str(entry['businessUnitId']), str(entry['documentId']))] = entry
+
+        results = {}
+        for i, key in enumerate(batch):
+            entry = by_id.get(key)
+            if entry is None and not by_id and i < len(r):
+                entry = r[i]
+
+            if entry is None:
+                results[key] = DocDate('', NOT_FOUND)
+            elif 'officialDocumentDate' in entry:
+                results[key] = DocDate(Util.convertToUTC(entry['officialDocumentDate'], '%Y-%m-%d'), FOUND)
+            else:
+                results[key] = DocDate('', NO_DATE)
+
+        return results
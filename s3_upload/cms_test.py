@@ -0,0 +1,133 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+import pytest
+from cms import CmsDateResolver, DocDateCache, FOUND, NOT_FOUND, NO_DATE, ERROR
+
+DOCUMENTS = {
+    ('13000099', 'HM26I7FZPXXIFW4'): '2013-12-17',
+    ('13000100', 'I0XTDP9BPXXIFW4'): '2014-01-02',
+    ('13000101', 'HP5IYPUSPXXIFW4'): None,
+}
+
+
+class StubCmsHandler(BaseHTTPRequestHandler):
+    requests = []
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])).decode('utf-8'))
+        StubCmsHandler.requests.append(body)
+
+        keys = [(p['businessUnitId'], p['documentId']) for p in body]
+        if any(k not in DOCUMENTS for k in keys):
+            rv = {'httpStatus': 'NOT_FOUND', 'message': 'Document not found'}
+        else:
+            rv = []
+            for k in keys:
+                entry = {'businessUnitId': k[0], 'documentId': k[1]}
+                if DOCUMENTS[k] is not None:
+                    entry['officialDocumentDate'] = DOCUMENTS[k]
+                rv.append(entry)
+
+        data = json.dumps(rv).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubCmsServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+@pytest.fixture
+def cms_url():
+    StubCmsHandler.requests = []
+    server = StubCmsServer(('127.0.0.1', 0), StubCmsHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    yield 'http://127.0.0.1:%d/cmsservice/pto/PATENT/documentMetadataByAccess' % server.server_address[1]
+
+    server.shutdown()
+    server.server_close()
+
+
+def test_resolves_many_documents_in_one_request(cms_url):
+    resolver = CmsDateResolver(cms_url, batch_size=10)
+
+    rv = resolver.resolve([('13000099', 'HM26I7FZPXXIFW4'), ('13000100', 'I0XTDP9BPXXIFW4')])
+
+    assert len(StubCmsHandler.requests) == 1
+    assert rv[('13000099', 'HM26I7FZPXXIFW4')] == (1387256400, FOUND)
+    assert rv[('13000100', 'I0XTDP9BPXXIFW4')].status == FOUND
+
+
+def test_unknown_documents_are_isolated_from_their_batch(cms_url):
+    resolver = CmsDateResolver(cms_url, batch_size=10)
+
+    rv = resolver.resolve([('13000099', 'HM26I7FZPXXIFW4'), ('13999999', 'XXXX'),
+                           ('13000100', 'I0XTDP9BPXXIFW4'), ('13000101', 'HP5IYPUSPXXIFW4')])
+
+    assert rv[('13000099', 'HM26I7FZPXXIFW4')].status == FOUND
+    assert rv[('13000100', 'I0XTDP9BPXXIFW4')].status == FOUND
+    assert rv[('13999999', 'XXXX')] == ('', NOT_FOUND)
+    assert rv[('13000101', 'HP5IYPUSPXXIFW4')] == ('', NO_DATE)
+
+
+def test_batches_are_sent_concurrently(cms_url):
+    resolver = CmsDateResolver(cms_url, batch_size=1, max_workers=3)
+
+    rv = resolver.resolve(list(DOCUMENTS.keys()))
+
+    assert len(StubCmsHandler.requests) == 3
+    assert len(rv) == 3
+
+
+def test_request_errors_are_reported():
+    resolver = CmsDateResolver('http://127.0.0.1:1/documentMetadataByAccess', timeout=1)
+
+    assert resolver.resolve_one('13000099', 'HM26I7FZPXXIFW4') == ('', ERROR)
+
+
+def test_warm_cache_makes_no_requests(cms_url, tmpdir):
+    pairs = [('13000099', 'HM26I7FZPXXIFW4'), ('13999999', 'XXXX'), ('13000101', 'HP5IYPUSPXXIFW4')]
+
+    resolver = CmsDateResolver(cms_url, cache=DocDateCache(str(tmpdir.join('cms.db'))))
+    first = resolver.resolve(pairs)
+    sent = len(StubCmsHandler.requests)
+
+    resolver = CmsDateResolver(cms_url, cache=DocDateCache(str(tmpdir.join('cms.db'))))
+    second = resolver.resolve(pairs)
+
+    assert len(StubCmsHandler.requests) == sent
+    assert second == first
+    assert second[('13999999', 'XXXX')] == ('', NOT_FOUND)
+
+
+def test_expired_misses_are_requested_again(cms_url, tmpdir):
+    cache = DocDateCache(str(tmpdir.join('cms.db')), miss_ttl=0)
+    resolver = CmsDateResolver(cms_url, cache=cache)
+
+    resolver.resolve([('13000099', 'HM26I7FZPXXIFW4'), ('13999999', 'XXXX')])
+    StubCmsHandler.requests = []
+
+    resolver.resolve([('13000099', 'HM26I7FZPXXIFW4'), ('13999999', 'XXXX')])
+
+    assert StubCmsHandler.requests == [[{'businessUnitId': '13999999', 'documentId': 'XXXX'}]]
+
+
+def test_errors_are_not_cached(tmpdir):
+    cache = DocDateCache(str(tmpdir.join('cms.db')))
+    resolver = CmsDateResolver('http://127.0.0.1:1/documentMetadataByAccess', timeout=1, cache=cache)
+
+    resolver.resolve_one('13000099', 'HM26I7FZPXXIFW4')
+
+    assert cache.get('13000099', 'HM26I7FZPXXIFW4') is None
@@ -0,0 +1,51 @@
+import pandas as pd
+
+from s3_upload.util import Util
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+MISSING_DATE = 978325200.0
+
+
+class DateFileIndex(object):
+    # Mailroom dates of the staging documents keyed on (Application_Id,
+    # Document_Id). Keys listed more than once are dropped, they never matched
+    # a single row of the date file.
+    def __init__(self, dates):
+        self.dates = dates
+
+    def __len__(self):
+        return len(self.dates)
+
+    @classmethod
+    def read_csv(cls, fname, chunksize=500000, missing_date=MISSING_DATE):
+        dates = {}
+        dupes = set()
+
+        chunks = pd.read_csv(fname, encoding='latin-1', chunksize=chunksize,
+                             usecols=['Application_Id', 'Document_Id', 'Mailroom_Date'])
+        for chunk in chunks:
+            appids = pd.to_numeric(chunk['Application_Id'], errors='coerce')
+            valid = appids.notnull()
+            chunk = chunk[valid]
+
+            converted = Util.convertColumnToUTC(chunk['Mailroom_Date'], DATE_FORMAT, missing_date)
+            keys = zip(appids[valid].astype('int64').tolist(), chunk['Document_Id'].astype(str).tolist())
+
+            for key, date in zip(keys, converted.tolist()):
+                if key in dates:
+                    dupes.add(key)
+                else:
+                    dates[key] = date
+
+        for key in dupes:
+            del dates[key]
+
+        return cls(dates)
+
+    def lookup(self, appid, docid):
+        try:
+            key = (int(float(appid)), docid)
+        except (TypeError, ValueError):
+            return None
+
+        return self.dates.get(key)
@@ -0,0 +1,23 @@
+import pytest
+from datefile import DateFileIndex
+
+
+@pytest.fixture(params=[1, 2, 100])
+def dates(request):
+    return DateFileIndex.read_csv("test_fixtures/staging_doc_date_sample.csv", chunksize=request.param)
+
+
+def test_lookup_by_app_id_and_document_id(dates):
+    assert dates.lookup('13000099', 'HM26I7FZPXXIFW4') == 1387256400
+    assert dates.lookup('13000100', 'HP5IYPUSPXXIFW4') == 1388638800
+
+
+def test_missing_mailroom_date_gets_default(dates):
+    assert dates.lookup('13000099', 'I0XTDP9BPXXIFW4') == 978325200.0
+
+
+def test_unknown_and_duplicated_documents_are_not_found(dates):
+    assert dates.lookup('13000099', 'HP5IYPUSPXXIFW4') is None
+    assert dates.lookup('13000101', 'I88ZIA17PXXIFW4') is None
+    assert dates.lookup('x', 'I88ZIA17PXXIFW4') is None
+    assert len(dates) == 3
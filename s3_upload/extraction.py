@@ -0,0 +1,267 @@
+import collections
+import multiprocessing
+import multiprocessing.connection
+import os
+import re
+import shutil
+import signal
+import time
+
+from s3_upload.ptab import PtabArchive
+
+OK = 'ok'
+FAILED = 'failed'
+TIMEOUT = 'timeout'
+ERROR = 'error'
+
+# One PDF to extract. source is a PDF file extracted in place, or the zip
+# archive holding member.
+ExtractionTask = collections.namedtuple('ExtractionTask', ['source', 'member', 'txtpath'])
+# cached is set when the text came from the TextStore instead of an extraction
+ExtractionResult = collections.namedtuple('ExtractionResult', ['task', 'status', 'seconds', 'pages', 'error', 'cached'])
+ExtractionResult.__new__.__defaults__ = (False,)
+
+# Page objects of a PDF, good enough for throughput figures without a PDF library
+PAGE_PATTERN = re.compile(rb'/Type\s*/Page(?![A-Za-z])')
+
+
+def count_pages(pdfpath):
+    with open(pdfpath, 'rb') as fd:
+        return len(PAGE_PATTERN.findall(fd.read()))
+
+
+def text_extractor(pdfpath):
+    # Default extractor, imported in the worker so it is loaded once per process
+    from textextraction.extractors import text_extractor
+    text_extractor(doc_path=pdfpath, force_convert=False)
+
+
+def directory_tasks(root):
+    # PDF files under root without a text file next to them
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.lower().endswith('.pdf'):
+                pdfpath = os.path.join(dirpath, name)
+                txtpath = os.path.splitext(pdfpath)[0] + '.txt'
+                if not os.path.isfile(txtpath):
+                    yield ExtractionTask(pdfpath, None, txtpath)
+
+
+def archive_tasks(path, manifest):
+    # PDF members of a weekly archive not recorded in the manifest. Members
+    # whose text file already exists are only recorded.
+    with PtabArchive(path) as archive:
+        for member in archive.members('.pdf'):
+            if member in manifest:
+                continue
+
+            txtpath = archive.output_path(member, 'txt')
+            if os.path.isfile(txtpath):
+                manifest.mark(member)
+            else:
+                yield ExtractionTask(path, member, txtpath)
+
+
+def run_worker(conn, extract, store=None):
+    if hasattr(os, 'setpgrp'):
+        # Own process group so a timed out extraction can be killed along
+        # with the OCR tools it started
+        os.setpgrp()
+
+    archive = None
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+
+        pages = []
+        cached = []
+
+        def counted(pdfpath):
+            pages.append(count_pages(pdfpath))
+            if store is None:
+                extract(pdfpath)
+                return
+
+            txtpath = os.path.splitext(pdfpath)[0] + '.txt'
+            digest = store.digest_file(pdfpath)
+            if store.get(digest, txtpath):
+                cached.append(digest)
+                return
+            extract(pdfpath)
+            if os.path.isfile(txtpath):
+                store.put(digest, txtpath)
+
+        start = time.time()
+        try:
+            if task.member is None:
+                counted(task.source)
+            else:
+                if archive is None or archive.path != task.source:
+                    if archive is not None:
+                        archive.close()
+                    archive = PtabArchive(task.source)
+                archive.extract_member(task.member, task.txtpath, counted)
+
+            status = OK if os.path.isfile(task.txtpath) else FAILED
+            error = None
+        except Exception as e:
+            status = ERROR
+            error = repr(e)
+
+        conn.send(ExtractionResult(task, status, time.time() - start, sum(pages), error, bool(cached)))
+
+    if archive is not None:
+        archive.close()
+
+
+class ExtractionStats(object):
+    # Throughput and per file latency of an extraction run
+    def __init__(self):
+        self.started = time.time()
+        self.counts = collections.Counter()
+        self.pages = 0
+        self.cached = 0
+        self.latencies = []
+
+    def add(self, result):
+        self.counts[result.status] += 1
+        self.latencies.append(result.seconds)
+        if result.status == OK:
+            self.pages += result.pages
+            self.cached += result.cached
+
+    def percentile(self, q):
+        if not self.latencies:
+            return 0.0
+        latencies = sorted(self.latencies)
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+    def summary(self):
+        elapsed = max(time.time() - self.started, 1e-9)
+        return {
+            'files': len(self.latencies),
+            'ok': self.counts[OK],
+            'failed': self.counts[FAILED],
+            'timeouts': self.counts[TIMEOUT],
+            'errors': self.counts[ERROR],
+            'cached': self.cached,
+            'pages': self.pages,
+            'seconds': elapsed,
+            'pages_per_second': self.pages / elapsed,
+            'files_per_second': len(self.latencies) / elapsed,
+            'latency_mean': sum(self.latencies) / len(self.latencies) if self.latencies else 0.0,
+            'latency_p50': self.percentile(0.5),
+            'latency_p95': self.percentile(0.95),
+            'latency_max': max(self.latencies) if self.latencies else 0.0,
+        }
+
+
+class ExtractionPool(object):
+    # Long running extraction processes fed one PDF at a time. A PDF that
+    # takes longer than timeout seconds has its worker killed and replaced,
+    # so one bad file can not hold up the rest. With a TextStore, PDFs whose
+    # text is already in the store are not extracted again.
+    def __init__(self, extract=text_extractor, workers=4, timeout=300, store=None):
+        self.extract = extract
+        self.timeout = timeout
+        self.store = store
+        self.workers = {}
+
+        for i in range(workers):
+            self.start_worker()
+
+    def start_worker(self):
+        conn, child = multiprocessing.Pipe()
+        process = multiprocessing.Process(target=run_worker, args=(child, self.extract, self.store))
+        process.daemon = True
+        process.start()
+        child.close()
+        self.workers[conn] = process
+        return conn
+
+    def stop_worker(self, conn):
+        process = self.workers.pop(conn)
+        if hasattr(os, 'killpg'):
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except OSError:
+                pass
+        process.terminate()
+        process.join()
+        conn.close()
+
+    def run(self, tasks):
+        # Yields an ExtractionResult per task, in completion order
+        tasks = iter(tasks)
+        idle = list(self.workers)
+        busy = {}
+        exhausted = False
+
+        while True:
+            while idle and not exhausted:
+                task = next(tasks, None)
+                if task is None:
+                    exhausted = True
+                    break
+                conn = idle.pop()
+                conn.send(task)
+                busy[conn] = (task, time.time())
+
+            if not busy:
+                break
+
+            deadline = min(started for task, started in busy.values()) + self.timeout
+            ready = multiprocessing.connection.wait(list(busy), max(0, deadline - time.time()))
+
+            for conn in ready:
+                task, started = busy.pop(conn)
+                try:
+                    result = conn.recv()
+                    idle.append(conn)
+                except EOFError:
+                    result = ExtractionResult(task, ERROR, time.time() - started, 0, 'worker exited')
+                    idle.append(self.replace_worker(conn, task))
+                yield result
+
+            now = time.time()
+            for conn, (task, started) in list(busy.items()):
+                if now - started >= self.timeout:
+                    del busy[conn]
+                    idle.append(self.replace_worker(conn, task))
+                    yield ExtractionResult(task, TIMEOUT, now - started, 0, None)
+
+    def replace_worker(self, conn, task):
+        self.stop_worker(conn)
+
+        # Whatever the killed worker left behind is not a finished extraction
+        if task.member is not None:
+            shutil.rmtree(PtabArchive.scratch_path(task.txtpath), ignore_errors=True)
+        elif os.path.isfile(task.txtpath):
+            os.remove(task.txtpath)
+
+        return self.start_worker()
+
+    def close(self):
+        for conn, process in list(self.workers.items()):
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+        for conn, process in list(self.workers.items()):
+            process.join(5)
+            if process.is_alive():
+                self.stop_worker(conn)
+            else:
+                conn.close()
+        self.workers = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,113 @@
+import os
+import time
+import zipfile
+
+import pytest
+from extraction import (ExtractionPool, ExtractionStats, ExtractionTask, archive_tasks, count_pages,
+                        directory_tasks, OK, FAILED, TIMEOUT, ERROR)
+from ledger import Ledger
+from textstore import TextStore
+
+PDF = b'%PDF-1.4 /Type /Pages /Type /Page /Type/Page '
+
+
+def fake_extract(pdfpath):
+    with open(pdfpath, 'rb') as fd:
+        data = fd.read()
+
+    if b'hang' in data:
+        time.sleep(60)
+    if b'boom' in data:
+        raise ValueError('cannot parse')
+    if b'die' in data:
+        os._exit(1)
+    if b'empty' not in data:
+        with open(os.path.splitext(pdfpath)[0] + '.txt', 'w') as out:
+            out.write('text of ' + os.path.basename(pdfpath))
+
+
+@pytest.fixture
+def pdfdir(tmpdir):
+    leaf = tmpdir.mkdir('PTAB_20160108').mkdir('PDF_image')
+    for name, data in [('a', PDF), ('b', PDF + b'hang'), ('c', PDF + b'boom'),
+                       ('d', PDF + b'empty'), ('e', PDF + b'die'), ('f', PDF)]:
+        leaf.join(name + '.pdf').write_binary(data)
+    leaf.join('f.txt').write('done before')
+    return leaf
+
+
+def test_count_pages(pdfdir):
+    assert count_pages(str(pdfdir.join('a.pdf'))) == 2
+
+
+def test_directory_tasks_skip_extracted_files(pdfdir, tmpdir):
+    tasks = list(directory_tasks(str(tmpdir)))
+
+    assert [os.path.basename(t.source) for t in tasks] == ['a.pdf', 'b.pdf', 'c.pdf', 'd.pdf', 'e.pdf']
+    assert tasks[0].txtpath == str(pdfdir.join('a.txt'))
+
+
+def test_pool_survives_bad_files(pdfdir, tmpdir):
+    stats = ExtractionStats()
+
+    with ExtractionPool(fake_extract, workers=2, timeout=2) as pool:
+        results = {os.path.basename(r.task.source): r for r in pool.run(directory_tasks(str(tmpdir)))}
+        for r in results.values():
+            stats.add(r)
+
+        # Workers that were killed have been replaced
+        assert len(pool.workers) == 2
+        again = list(pool.run([ExtractionTask(str(pdfdir.join('a.pdf')), None, str(pdfdir.join('a.txt')))]))
+
+    assert results['a.pdf'].status == OK
+    assert results['a.pdf'].pages == 2
+    assert results['b.pdf'].status == TIMEOUT
+    assert results['c.pdf'].status == ERROR
+    assert 'cannot parse' in results['c.pdf'].error
+    assert results['d.pdf'].status == FAILED
+    assert results['e.pdf'].status == ERROR
+    assert again[0].status == OK
+
+    summary = stats.summary()
+    assert summary['files'] == 5
+    assert summary['ok'] == 1
+    assert summary['timeouts'] == 1
+    assert summary['pages'] == 2
+    assert summary['latency_max'] >= 2
+
+
+def test_archive_members_are_extracted(tmpdir):
+    path = str(tmpdir.join('PTAB_20160108_WK01.zip'))
+    with zipfile.ZipFile(path, 'w') as zf:
+        zf.writestr('PTAB_20160108/PDF_image/a.pdf', PDF)
+        zf.writestr('PTAB_20160108/PDF_image/b.pdf', PDF)
+        zf.writestr('PTAB_20160108/PDF_image/c.pdf', PDF + b'empty')
+    tmpdir.mkdir('PTAB_20160108').mkdir('PDF_image').join('b.txt').write('done before')
+    manifest = Ledger(str(tmpdir.join('manifest.db')), 'PTAB_20160108_WK01.zip')
+
+    with ExtractionPool(fake_extract, workers=2, timeout=10) as pool:
+        results = list(pool.run(archive_tasks(path, manifest)))
+
+    assert sorted((r.task.member, r.status) for r in results) == [
+        ('PTAB_20160108/PDF_image/a.pdf', OK), ('PTAB_20160108/PDF_image/c.pdf', FAILED)]
+    assert tmpdir.join('PTAB_20160108', 'PDF_image', 'a.txt').read() == 'text of a.pdf'
+    assert sorted(os.listdir(str(tmpdir.join('PTAB_20160108', 'PDF_image')))) == ['a.txt', 'b.txt']
+    assert 'PTAB_20160108/PDF_image/b.pdf' in manifest
+
+
+def test_stored_text_is_not_extracted_again(tmpdir):
+    store = TextStore(str(tmpdir.join('store')))
+    week1 = tmpdir.mkdir('week1')
+    week2 = tmpdir.mkdir('week2')
+    week1.join('a.pdf').write_binary(PDF)
+    week2.join('a.pdf').write_binary(PDF)
+    week2.join('b.pdf').write_binary(PDF + b'empty')
+
+    with ExtractionPool(fake_extract, workers=1, timeout=10, store=store) as pool:
+        first = list(pool.run(directory_tasks(str(week1))))
+        second = {os.path.basename(r.task.source): r for r in pool.run(directory_tasks(str(week2)))}
+
+    assert first[0].status == OK and not first[0].cached
+    assert second['a.pdf'].status == OK and second['a.pdf'].cached
+    assert week2.join('a.txt').read() == 'text of a.pdf'
+    assert second['b.pdf'].status == FAILED
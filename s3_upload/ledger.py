@@ -0,0 +1,95 @@
+import os
+import sqlite3
+
+LOG_NAMES = ('solrComplete.log', 'solrcomplete.txt')
+
+# Directory under logs of the completion logs of documents sent to Solr from
+# S3. Those are tracked apart from the documents loaded from local JSON files.
+S3_LOG_DIR = 'solr_upload'
+
+
+def s3_namespace(core):
+    return core + '/' + S3_LOG_DIR
+
+
+class Ledger(object):
+    def __init__(self, path, namespace, commit_every=500, timeout=60):
+
+        dirname = os.path.dirname(path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+
+        self.path = path
+        self.namespace = namespace
+        self.commit_every = commit_every
+        self.pending = []
+        self.pending_ids = set()
+
+        # Autocommit mode, transactions are opened explicitly in commit().
+        # WAL lets readers run while another worker holds the write lock and
+        # the timeout makes concurrent writers wait instead of failing.
+        self.conn = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS completed ('
+                          'namespace TEXT NOT NULL, '
+                          'docid TEXT NOT NULL, '
+                          'PRIMARY KEY (namespace, docid)) WITHOUT ROWID')
+
+    def __contains__(self, docid):
+        if docid in self.pending_ids:
+            return True
+
+        row = self.conn.execute('SELECT 1 FROM completed WHERE namespace = ? AND docid = ?',
+                                (self.namespace, docid)).fetchone()
+        return row is not None
+
+    def __len__(self):
+        self.commit()
+        row = self.conn.execute('SELECT COUNT(*) FROM completed WHERE namespace = ?',
+                                (self.namespace,)).fetchone()
+        return row[0]
+
+    def mark(self, docid):
+        self.mark_all((docid,))
+
+    def mark_all(self, docids):
+        for docid in docids:
+            if docid not in self.pending_ids:
+                self.pending_ids.add(docid)
+                self.pending.append((self.namespace, docid))
+
+            if len(self.pending) >= self.commit_every:
+                self.commit()
+
+    def commit(self):
+        if not self.pending:
+            return
+
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            self.conn.executemany('INSERT OR IGNORE INTO completed (namespace, docid) VALUES (?, ?)',
+                                  self.pending)
+        except:
+            self.conn.execute('ROLLBACK')
+            raise
+        self.conn.execute('COMMIT')
+
+        self.pending = []
+        self.pending_ids = set()
+
+    def close(self):
+        self.commit()
+        self.conn.close()
+
+    def import_log(self, path):
+        n = 0
+        with open(path, 'r') as logfile:
+            for l in logfile:
+                l = l.strip()
+                if l:
+                    self.mark(l)
+                    n += 1
+
+        self.commit()
+        return n
@@ -0,0 +1,80 @@
+import multiprocessing
+
+import pytest
+from ledger import Ledger, s3_namespace
+
+
+@pytest.fixture
+def ledger(tmpdir):
+    return Ledger(str(tmpdir.join('ledger.db')), 'oa', commit_every=3)
+
+
+def mark_range(path, start, end):
+    l = Ledger(path, 'oa', commit_every=50)
+    for i in range(start, end):
+        l.mark('doc%d' % i)
+    l.close()
+
+
+def test_marked_docs_are_members(ledger):
+    assert '13000099, HM26I7FZPXXIFW4' not in ledger
+
+    ledger.mark('13000099, HM26I7FZPXXIFW4')
+
+    assert '13000099, HM26I7FZPXXIFW4' in ledger
+    assert 'other' not in ledger
+
+
+def test_marks_are_committed_in_batches(ledger):
+    other = Ledger(ledger.path, 'oa')
+
+    ledger.mark_all(['a', 'b'])
+    assert 'a' not in other
+
+    ledger.mark('c')
+    assert 'a' in other
+    assert 'c' in other
+
+
+def test_namespaces_are_kept_apart(ledger):
+    ledger.mark('a')
+    ledger.commit()
+
+    other = Ledger(ledger.path, 'ptab')
+
+    assert 'a' not in other
+    assert len(ledger) == 1
+
+
+def test_s3_loads_are_kept_apart_from_json_loads(ledger):
+    ledger.mark('13000099, HM26I7FZPXXIFW4')
+    ledger.commit()
+
+    s3ledger = Ledger(ledger.path, s3_namespace('oa'))
+
+    assert '13000099, HM26I7FZPXXIFW4' not in s3ledger
+
+
+def test_can_import_existing_log(ledger, tmpdir):
+    tmpdir.join('solrComplete.log').write('13000099, A\n13000099, B\n\nC\n')
+
+    n = ledger.import_log(str(tmpdir.join('solrComplete.log')))
+
+    assert n == 3
+    assert '13000099, A' in ledger
+    assert '13000099, B' in ledger
+    assert 'C' in ledger
+    assert len(ledger) == 3
+
+
+def test_concurrent_workers_can_write(ledger):
+    workers = [multiprocessing.Process(target=mark_range, args=(ledger.path, i * 200, (i + 1) * 200))
+               for i in range(4)]
+
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+
+    assert all(w.exitcode == 0 for w in workers)
+    assert len(ledger) == 800
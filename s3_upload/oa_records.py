@@ -0,0 +1,55 @@
+import collections
+import multiprocessing
+
+# Outcome of building the JSON document of one Office Action XML file. The log
+# entries travel back with it so the series logs can be written in file order
+# whichever worker handled the file.
+DocumentRecord = collections.namedtuple('DocumentRecord',
+                                        ['filename', 'jsonfname', 'written', 'notfoundpalm', 'notfounddate', 'badfile'])
+DocumentRecord.__new__.__defaults__ = (False, None, None, None)
+
+
+class DocumentPool(object):
+    # Runs a per document function over many tasks on a process pool and
+    # yields the results in task order. The function must only depend on its
+    # task and on state set up by the initializer. With a single worker it
+    # runs in this process and the initializer is not called.
+    def __init__(self, workers=1, initializer=None, initargs=(), chunksize=16):
+        self.workers = workers
+        self.chunksize = chunksize
+        self.pool = None
+
+        if workers > 1:
+            self.pool = multiprocessing.Pool(workers, initializer, initargs)
+
+    def map(self, func, tasks):
+        if self.pool is None:
+            return map(func, tasks)
+
+        return self.pool.imap(func, tasks, self.chunksize)
+
+    def map_chunks(self, func, chunks):
+        # Like map, for tasks built a list at a time. The chunks are built on
+        # the calling thread, not on the pool's task thread, and the next one
+        # is only built once the results of the one before are all back, so
+        # at most one chunk of tasks is queued.
+        for chunk in chunks:
+            for rv in self.map(func, chunk):
+                yield rv
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        elif self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
@@ -0,0 +1,74 @@
+import os
+
+from cms import CmsDateResolver, DocDateCache, FOUND
+from cms_test import cms_url, DOCUMENTS
+from oa_records import DocumentPool, DocumentRecord
+
+offset = 0
+
+
+def set_offset(n):
+    global offset
+    offset = n
+
+
+def process(task):
+    return (task + offset, os.getpid())
+
+
+def test_record_defaults():
+    record = DocumentRecord('a.xml', 'a.json')
+
+    assert record.written is False
+    assert record.notfoundpalm is None
+    assert record.notfounddate is None
+    assert record.badfile is None
+
+
+def test_single_worker_runs_in_process():
+    with DocumentPool(1, set_offset, (100,)) as pool:
+        rv = list(pool.map(process, range(5)))
+
+    assert [x for x, pid in rv] == [0, 1, 2, 3, 4]
+    assert all(pid == os.getpid() for x, pid in rv)
+
+
+def test_results_keep_task_order_across_workers():
+    with DocumentPool(3, set_offset, (100,), chunksize=2) as pool:
+        rv = list(pool.map(process, iter(range(50))))
+
+    assert [x for x, pid in rv] == list(range(100, 150))
+    assert all(pid != os.getpid() for x, pid in rv)
+
+
+def date_of(task):
+    pair, docdate = task
+    return pair, docdate.status, os.getpid()
+
+
+def test_chunks_resolved_through_the_cache_across_workers(cms_url, tmpdir):
+    # The date cache is a sqlite connection of this thread, so the chunks
+    # must be built here and not on the pool's task thread
+    cache = DocDateCache(str(tmpdir.join('cmsdates.db')))
+    resolver = CmsDateResolver(cms_url, batch_size=2, cache=cache)
+    pairs = sorted(DOCUMENTS) * 4
+    results = []
+    built = []
+
+    def chunks():
+        for start in range(0, len(pairs), 3):
+            built.append(len(results))
+            chunk = pairs[start:start+3]
+            docdates = resolver.resolve(chunk)
+            yield [(pair, docdates[pair]) for pair in chunk]
+
+    with DocumentPool(2, chunksize=1) as pool:
+        for rv in pool.map_chunks(date_of, chunks()):
+            results.append(rv)
+
+    assert [pair for pair, status, pid in results] == pairs
+    assert all(pid != os.getpid() for pair, status, pid in results)
+    assert results[0][1] == FOUND
+    # each chunk was built once the one before was done
+    assert built == list(range(0, len(pairs), 3))
+    assert cache.get('13000099', 'HM26I7FZPXXIFW4').status == FOUND
@@ -0,0 +1,126 @@
+from lxml import etree
+
+USPAT = '{urn:us:gov:doc:uspto:patent}'
+USCOM = '{urn:us:gov:doc:uspto:common}'
+COM = '{http://www.wipo.int/standards/XMLSchema/ST96/Common}'
+
+P_TAG = USCOM + 'P'
+LI_TAG = USCOM + 'LI'
+METADATA_TAG = USPAT + 'DocumentMetadata'
+DOCUMENT_TAG = USCOM + 'Document'
+LI_NUMBER = COM + 'liNumber'
+
+# Paragraph content that is left out of the text, tail included
+SKIP_TAGS = (USCOM + 'DataTable', COM + 'Image')
+
+
+class OAXmlExtractor(object):
+    # Metadata and paragraph text of Office Action XML files, read in a single
+    # iterparse pass. Processed elements are cleared so memory use does not
+    # grow with the size of the file.
+
+    @classmethod
+    def extract(cls, fname):
+        fields = {}
+        paragraphs = []
+        # Paragraphs waiting for their tail, which the parser has only read
+        # once the next event comes in
+        pending = []
+        slots = []
+        keep = 0
+
+        for event, elem in etree.iterparse(fname, events=('start', 'end'), remove_pis=True):
+            for p, parts in pending:
+                parts.append(p.tail or '')
+                if keep == 0:
+                    cls.release(p)
+            pending = []
+
+            if elem.tag != P_TAG and elem.tag != METADATA_TAG:
+                if event == 'end' and keep == 0:
+                    cls.release(elem)
+                continue
+
+            if event == 'start':
+                keep += 1
+                if elem.tag == P_TAG:
+                    # Slot taken at the start tag so nested paragraphs keep
+                    # document order
+                    slots.append(len(paragraphs))
+                    paragraphs.append(None)
+                continue
+
+            keep -= 1
+            if elem.tag == METADATA_TAG:
+                fields.update(cls.metadata(elem))
+                if keep == 0:
+                    cls.release(elem)
+            else:
+                parts = cls.text_parts(elem)
+                paragraphs[slots.pop()] = parts
+                pending.append((elem, parts))
+
+        for p, parts in pending:
+            parts.append(p.tail or '')
+
+        fields['textdata'] = ''.join(''.join(parts) + '\n' for parts in paragraphs)
+        return fields
+
+    @classmethod
+    def metadata(cls, item):
+        fields = {}
+        fields['documentcode'] = item.find(USCOM + 'DocumentCode').text
+        fields['documentsourceidentifier'] = item.find(USCOM + 'DocumentSourceIdentifier').text
+        partyid = item.find(COM + 'PartyIdentifier')
+        if partyid is not None:
+            fields['partyidentifier'] = partyid.text
+        else:
+            fields['partyidentifier'] = ''
+        fields['groupartunitnumber'] = item.find(USCOM + 'GroupArtUnitNumber').text
+        return fields
+
+    @classmethod
+    def text_parts(cls, node):
+        # Text of a paragraph without its own tail. List items are prefixed
+        # with their number, data tables and images are skipped.
+        parts = [node.text or '']
+        stack = [(child, False) for child in reversed(node)]
+        while stack:
+            elem, tail = stack.pop()
+            if tail:
+                parts.append(elem.tail or '')
+                continue
+
+            if elem.tag in SKIP_TAGS:
+                continue
+            if elem.tag == LI_TAG and elem.text is not None:
+                parts.append(elem.get(LI_NUMBER) + ' ' + elem.text)
+            else:
+                parts.append(elem.text or '')
+
+            stack.append((elem, True))
+            for child in reversed(elem):
+                stack.append((child, False))
+
+        return parts
+
+    @classmethod
+    def paragraph_text(cls, node):
+        return ''.join(cls.text_parts(node)) + (node.tail or '')
+
+    @classmethod
+    def release(cls, elem):
+        elem.clear()
+        parent = elem.getparent()
+        if parent is not None:
+            while elem.getprevious() is not None:
+                del parent[0]
+
+    @classmethod
+    def document_identifier(cls, fname):
+        # IFW number of the first Document of an OACSConversion file. Parsing
+        # stops as soon as it is found.
+        for event, elem in etree.iterparse(fname, tag=DOCUMENT_TAG, remove_pis=True):
+            return elem.find(USCOM + 'DocumentIdentifier').text
+
+        return None
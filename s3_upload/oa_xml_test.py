@@ -0,0 +1,47 @@
+import pytest
+from lxml import etree
+from oa_xml import OAXmlExtractor
+
+
+@pytest.fixture
+def extracted():
+    return OAXmlExtractor.extract("test_fixtures/oa_sample.xml")
+
+
+def test_metadata_fields(extracted):
+    assert extracted['documentcode'] == 'CTNF'
+    assert extracted['documentsourceidentifier'] == 'OACS'
+    assert extracted['partyidentifier'] == '72345'
+    assert extracted['groupartunitnumber'] == '1645'
+
+
+def test_list_items_tables_and_images(extracted):
+    lines = extracted['textdata'].split('\n')
+
+    assert lines[0] == 'Claims 1-20 are pending.'
+    assert lines[2] == 'Rejected claims:1. firstitem doneno text end'
+    assert lines[4] == 'Table follows'
+    assert lines[6] == ''
+
+
+def test_nested_paragraphs_keep_document_order(extracted):
+    assert 'Outer inner rest\n    \ninner rest\n' in extracted['textdata']
+
+
+def test_paragraph_text_includes_tail():
+    p = etree.fromstring('<r xmlns:uscom="urn:us:gov:doc:uspto:common">'
+                         '<uscom:P>a<b>b</b>c</uscom:P>d</r>')[0]
+
+    assert OAXmlExtractor.paragraph_text(p) == 'abcd'
+
+
+def test_invalid_xml_raises(tmpdir):
+    bad = tmpdir.join('bad.xml')
+    bad.write('<a><b></a>')
+
+    with pytest.raises(etree.XMLSyntaxError):
+        OAXmlExtractor.extract(str(bad))
+
+
+def test_document_identifier():
+    assert OAXmlExtractor.document_identifier("test_fixtures/oacs_conversion_sample.xml") == 'HM26I7FZPXXIFW4'
@@ -0,0 +1,377 @@
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from s3_upload.util import Util
+
+# PALM columns copied into each Office Action document, in document order.
+# The document field name is the lower cased column name.
+PALM_COLUMNS = (
+    'APPL_ID',
+    'FILE_DT',
+    'EFFECTIVE_FILING_DT',
+    'INV_SUBJ_MATTER_TY',
+    'APPL_TY',
+    'DN_EXAMINER_NO',
+    'DN_DW_DN_GAU_CD',
+    'DN_PTO_ART_CLASS_NO',
+    'DN_PTO_ART_SUBCLASS_NO',
+    'CONFIRM_NO',
+    'DN_INTPPTY_CUST_NO',
+    'ATTY_DKT_NO',
+    'DN_NSRD_CURR_LOC_CD',
+    'DN_NSRD_CURR_LOC_DT',
+    'APP_STATUS_NO',
+    'APP_STATUS_DT',
+    'WIPO_PUB_NO',
+    'PATENT_NO',
+    'PATENT_ISSUE_DT',
+    'ABANDON_DT',
+    'DISPOSAL_TYPE',
+    'SE_IN',
+    'PCT_NO',
+    'INVN_TTL_TX',
+    'AIA_IN',
+    'CONTINUITY_TYPE',
+    'FRGN_PRIORITY_CLM',
+    'USC_119_MET',
+    'FIG_QT',
+    'INDP_CLAIM_QT',
+    'EFCTV_CLAIMS_QT',
+)
+
+DATE_COLUMNS = (
+    'FILE_DT',
+    'EFFECTIVE_FILING_DT',
+    'DN_NSRD_CURR_LOC_DT',
+    'APP_STATUS_DT',
+    'PATENT_ISSUE_DT',
+    'ABANDON_DT',
+)
+
+# Columns the staging documents store with surrounding blanks removed
+STRIP_COLUMNS = (
+    'DN_EXAMINER_NO',
+    'DN_NSRD_CURR_LOC_CD',
+    'PCT_NO',
+    'CONTINUITY_TYPE',
+)
+
+DATE_FORMAT = '%d-%b-%y'
+
+
+class ArrayColumn(object):
+    # Numeric column kept as a (possibly memory mapped) numpy array
+    kind = 'array'
+
+    def __init__(self, values):
+        self.values = values
+
+    def __len__(self):
+        return len(self.values)
+
+    def get(self, pos):
+        return self.values[pos].item()
+
+    def take(self, positions):
+        return self.values[positions]
+
+    def save(self, path, name):
+        np.save(os.path.join(path, name + '.npy'), np.ascontiguousarray(self.values))
+
+    @classmethod
+    def load(cls, path, name):
+        return cls(np.load(os.path.join(path, name + '.npy'), mmap_mode='r'))
+
+
+class BlobStrings(object):
+    # Read only list of strings stored as one UTF-8 blob plus an offset array
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]]).decode('utf-8')
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    @classmethod
+    def save(cls, path, name, strings):
+        encoded = [x.encode('utf-8') for x in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype='int64')
+        np.cumsum([len(x) for x in encoded], out=offsets[1:])
+
+        with open(os.path.join(path, name + '.blob'), 'wb') as blob:
+            for x in encoded:
+                blob.write(x)
+        np.save(os.path.join(path, name + '.offsets.npy'), offsets)
+
+    @classmethod
+    def load(cls, path, name):
+        offsets = np.load(os.path.join(path, name + '.offsets.npy'), mmap_mode='r')
+        if offsets[-1] == 0:
+            blob = b''
+        else:
+            blob = np.memmap(os.path.join(path, name + '.blob'), dtype='uint8', mode='r')
+        return cls(blob, offsets)
+
+
+class CategoryColumn(object):
+    # Text column stored as integer codes into its distinct values, -1 is missing
+    kind = 'category'
+
+    def __init__(self, codes, categories):
+        self.codes = codes
+        self.categories = categories
+
+    def __len__(self):
+        return len(self.codes)
+
+    def get(self, pos):
+        code = self.codes[pos]
+        if code < 0:
+            return float('nan')
+        return self.categories[code]
+
+    def take(self, positions):
+        return np.array([float('nan') if c < 0 else self.categories[c] for c in self.codes[positions]],
+                        dtype=object)
+
+    def save(self, path, name):
+        np.save(os.path.join(path, name + '.codes.npy'), np.ascontiguousarray(self.codes))
+        BlobStrings.save(path, name + '.categories', self.categories)
+
+    @classmethod
+    def load(cls, path, name):
+        return cls(np.load(os.path.join(path, name + '.codes.npy'), mmap_mode='r'),
+                   BlobStrings.load(path, name + '.categories'))
+
+    @classmethod
+    def from_series(cls, values):
+        codes, categories = pd.factorize(values, use_na_sentinel=True)
+        codes = codes.astype('int32')
+        return cls(codes, [x if isinstance(x, str) else str(x) for x in categories])
+
+
+COLUMN_KINDS = {
+    'array': ArrayColumn,
+    'category': CategoryColumn,
+}
+
+
+class PalmTable(object):
+    # The PALM columns of one series file, either freshly read or memory mapped
+    # from the cache
+    def __init__(self, columns):
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.columns['APPL_ID'])
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    @classmethod
+    def read_csv(cls, fname):
+        return cls.from_frame(pd.read_csv(fname, encoding='latin-1', usecols=list(PALM_COLUMNS),
+                                          low_memory=False))
+
+    @classmethod
+    def from_frame(cls, dataframe):
+        columns = {}
+        for col in PALM_COLUMNS:
+            values = dataframe[col]
+            if values.dtype.kind in 'biuf':
+                columns[col] = ArrayColumn(values.to_numpy())
+            else:
+                columns[col] = CategoryColumn.from_series(values)
+
+        return cls(columns)
+
+    def save(self, path):
+        meta = {'rows': len(self), 'columns': {}}
+        for col in PALM_COLUMNS:
+            column = self.columns[col]
+            column.save(path, col)
+            meta['columns'][col] = column.kind
+
+        with open(os.path.join(path, 'meta.json'), 'w') as fd:
+            json.dump(meta, fd)
+
+    @classmethod
+    def load(cls, path):
+        with open(os.path.join(path, 'meta.json')) as fd:
+            meta = json.load(fd)
+
+        return cls({col: COLUMN_KINDS[kind].load(path, col) for col, kind in meta['columns'].items()})
+
+
+class PalmCache(object):
+    # Local columnar copies of the PALM series CSV files. An entry is keyed on
+    # the source file name, size and modification time and is rebuilt when the
+    # source changes.
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    def entry_path(self, fname):
+        st = os.stat(fname)
+        base = os.path.splitext(os.path.basename(fname))[0]
+        return os.path.join(self.cache_dir, '{}-{}-{}'.format(base, st.st_size, st.st_mtime_ns))
+
+    def is_cached(self, fname):
+        return os.path.isfile(os.path.join(self.entry_path(fname), 'meta.json'))
+
+    def load(self, fname):
+        path = self.entry_path(fname)
+
+        if not self.is_cached(fname):
+            self.build(fname, path)
+
+        return PalmTable.load(path)
+
+    def build(self, fname, path):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        table = PalmTable.read_csv(fname)
+
+        # Written to a scratch directory and renamed into place so a
+        # concurrent reader never sees a partial entry
+        tmp = tempfile.mkdtemp(dir=self.cache_dir, prefix='.build-')
+        try:
+            table.save(tmp)
+            os.rename(tmp, path)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)
+            if not os.path.isdir(path):
+                raise
+
+        base = os.path.splitext(os.path.basename(fname))[0] + '-'
+        for name in os.listdir(self.cache_dir):
+            old = os.path.join(self.cache_dir, name)
+            if name.startswith(base) and old != path:
+                shutil.rmtree(old, ignore_errors=True)
+
+
+class PalmIndex(object):
+    # PALM series data indexed by APPL_ID.
+    #
+    # Date columns are converted to arrays of UTC timestamps once when the
+    # index is built (missing dates become missing_date). With as_text the remaining
+    # fields are returned as strings the way the staging documents expect
+    # them. Applications listed more than once are dropped, they never matched
+    # a single PALM row.
+    def __init__(self, table, as_text=False, missing_date=''):
+
+        if isinstance(table, pd.DataFrame):
+            table = PalmTable.from_frame(table)
+
+        self.table = table
+        self.as_text = as_text
+
+        ids = pd.Series(table['APPL_ID'].take(slice(None)))
+        valid = (ids.notnull() & ~ids.duplicated(keep=False)).to_numpy()
+
+        self.rows = np.flatnonzero(valid)
+        self.index = pd.Index(ids[valid].astype('int64').to_numpy())
+
+        self.dates = {}
+        for col in DATE_COLUMNS:
+            self.dates[col] = self.convert_dates(table[col], missing_date)
+
+    def __len__(self):
+        return len(self.index)
+
+    @classmethod
+    def convert_dates(cls, column, missing_date):
+        if isinstance(column, CategoryColumn):
+            codes = column.codes
+            categories = list(column.categories)
+        else:
+            codes, categories = pd.factorize(pd.Series(column.take(slice(None))).astype(str))
+            categories = list(categories)
+
+        # Only the distinct dates are parsed. The extra empty slot at the end
+        # is picked up by the -1 code of missing values.
+        converted = Util.convertColumnToUTC(categories + [''], DATE_FORMAT, missing_date)
+        return converted[codes]
+
+    @classmethod
+    def to_key(cls, appid):
+        try:
+            return int(float(appid))
+        except (TypeError, ValueError):
+            return None
+
+    def position(self, appid):
+        key = self.to_key(appid)
+
+        if key is None:
+            return None
+
+        try:
+            return self.rows[self.index.get_loc(key)]
+        except KeyError:
+            return None
+
+    def to_text(self, col, value):
+        value = str(value)
+        if col in STRIP_COLUMNS:
+            value = value.strip()
+        return value
+
+    def lookup(self, appid):
+        pos = self.position(appid)
+
+        if pos is None:
+            return None
+
+        record = {}
+        for col in PALM_COLUMNS:
+            if col in DATE_COLUMNS:
+                value = self.dates[col][pos]
+                if isinstance(value, np.generic):
+                    value = value.item()
+            else:
+                value = self.table[col].get(pos)
+                if self.as_text:
+                    value = self.to_text(col, value)
+            record[col.lower()] = value
+
+        return record
+
+    def join(self, appids):
+        # Bulk lookup of many application ids with a single indexer pass.
+        # Returns a frame of PALM fields indexed by the application ids found.
+        appids = pd.Series(list(appids), dtype=object)
+        keys = pd.to_numeric(appids, errors='coerce')
+        valid = keys.notnull().to_numpy()
+
+        positions = np.full(len(appids), -1, dtype='int64')
+        positions[valid] = self.index.get_indexer(keys[valid].astype('int64'))
+        found = positions >= 0
+        positions = self.rows[positions[found]]
+
+        data = {}
+        for col in PALM_COLUMNS:
+            if col in DATE_COLUMNS:
+                values = self.dates[col][positions]
+            else:
+                values = self.table[col].take(positions)
+                if self.as_text:
+                    values = [self.to_text(col, v) for v in values]
+            data[col.lower()] = values
+
+        return pd.DataFrame(data, index=pd.Index(appids[found], name='appid'),
+                            columns=[c.lower() for c in PALM_COLUMNS])
+
+    def records(self, appids):
+        # The lookup() record of each application id found, from one join()
+        return self.join(set(appids)).to_dict('index')
@@ -0,0 +1,138 @@
+import math
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+from palm import PalmCache, PalmIndex, PALM_COLUMNS
+
+
+@pytest.fixture
+def palm_frame():
+    return pd.read_csv("test_fixtures/palm_sample.csv", encoding='latin-1')
+
+
+@pytest.fixture
+def palm(palm_frame):
+    return PalmIndex(palm_frame)
+
+
+@pytest.fixture
+def staging_palm(palm_frame):
+    return PalmIndex(palm_frame, as_text=True, missing_date=978325200.0)
+
+
+def test_lookup_returns_all_palm_fields_in_order(palm):
+    record = palm.lookup('13000099')
+
+    assert list(record.keys()) == [c.lower() for c in PALM_COLUMNS]
+    assert record['appl_id'] == 13000099
+    assert record['invn_ttl_tx'] == 'Widget assembly'
+    assert record['dn_nsrd_curr_loc_cd'] == 'ELEC  '
+
+
+def test_lookup_converts_dates(palm):
+    record = palm.lookup('13000099')
+
+    assert record['file_dt'] == 1376884800
+    assert record['abandon_dt'] == ''
+
+
+def test_missing_values_are_kept_as_nan(palm):
+    record = palm.lookup('13000099')
+
+    assert math.isnan(record['wipo_pub_no'])
+
+
+def test_unknown_and_duplicated_applications_are_not_found(palm):
+    assert palm.lookup('13999999') is None
+    assert palm.lookup('13000101') is None
+    assert palm.lookup('not an id') is None
+    assert len(palm) == 2
+
+
+def test_staging_records_are_text(staging_palm):
+    record = staging_palm.lookup('13000100')
+
+    assert record['appl_id'] == '13000100'
+    assert record['wipo_pub_no'] == '122334.0'
+    assert record['dn_intppty_cust_no'] == 'nan'
+    assert record['pct_no'] == 'PCT/US13/1'
+    assert record['file_dt'] == 1388552400
+    assert record['dn_nsrd_curr_loc_dt'] == 978325200.0
+
+
+def test_join_merges_many_applications(staging_palm):
+    joined = staging_palm.join(['13000100', '13999999', 'x', '13000099'])
+
+    assert list(joined.index) == ['13000100', '13000099']
+    assert list(joined['invn_ttl_tx']) == ['Something else', 'Widget assembly']
+    assert joined.loc['13000099', 'file_dt'] == 1376884800
+
+
+@pytest.mark.parametrize('index', ['palm', 'staging_palm'])
+def test_records_match_lookup(index, request):
+    index = request.getfixturevalue(index)
+    appids = ['13000099', '13000100', '13000101', '13999999', 'x', '13000099']
+
+    records = index.records(appids)
+
+    assert sorted(records) == ['13000099', '13000100']
+    for appid, record in records.items():
+        expected = index.lookup(appid)
+        assert list(record) == list(expected)
+        for col in expected:
+            assert type(record[col]) == type(expected[col]), col
+            assert record[col] == expected[col] or (record[col] != record[col] and expected[col] != expected[col])
+
+
+@pytest.fixture
+def palm_csv(tmpdir):
+    fname = str(tmpdir.join('app13.csv'))
+    shutil.copyfile("test_fixtures/palm_sample.csv", fname)
+    return fname
+
+
+def test_cache_builds_memory_mapped_columns(tmpdir, palm_csv):
+    cache = PalmCache(str(tmpdir.join('cache')))
+
+    assert not cache.is_cached(palm_csv)
+    table = cache.load(palm_csv)
+    assert cache.is_cached(palm_csv)
+
+    table = cache.load(palm_csv)
+
+    assert isinstance(table['APPL_ID'].values, np.memmap)
+    assert isinstance(table['FILE_DT'].codes, np.memmap)
+    assert 'EXTRA_COL' not in table.columns
+    assert len(table) == 4
+
+
+def test_cached_index_matches_dataframe_index(tmpdir, palm_csv, palm_frame):
+    table = PalmCache(str(tmpdir.join('cache'))).load(palm_csv)
+
+    for as_text in (False, True):
+        cached = PalmIndex(table, as_text=as_text)
+        direct = PalmIndex(palm_frame, as_text=as_text)
+
+        for appid in ('13000099', '13000100', '13000101'):
+            a = cached.lookup(appid)
+            b = direct.lookup(appid)
+            assert (a is None) == (b is None)
+            if a is not None:
+                assert repr(a) == repr(b)
+
+
+def test_cache_is_rebuilt_when_source_changes(tmpdir, palm_csv):
+    cache = PalmCache(str(tmpdir.join('cache')))
+    cache.load(palm_csv)
+
+    with open(palm_csv, 'a') as fd:
+        fd.write(open("test_fixtures/palm_sample.csv").read().splitlines()[1].replace('13000099', '13000102') + '\n')
+
+    assert not cache.is_cached(palm_csv)
+    palm = PalmIndex(cache.load(palm_csv))
+
+    assert palm.lookup('13000102') is not None
+    assert len(os.listdir(cache.cache_dir)) == 1
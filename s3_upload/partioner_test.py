@@ -74,11 +74,11 @@ def test_can_handle_7_workers():
 def test_can_get_obj_ids_from_string():
     p = Partitioner(range(1, 10), 3, 7)
 
-    assert p.get_obj_id('Hello') == 139
-    assert p.get_obj_id('112') == 127
-    assert p.get_obj_id('344') == 179
-    assert p.get_obj_id('http://www.google.com') == 237
-    assert p.get_obj_id('He' + 'llo') == 139
+    assert p.get_obj_id('Hello') == 184900800977808474752697256094572479703
+    assert p.get_obj_id('112') == 169393384228144871625990433807197966773
+    assert p.get_obj_id('344') == 238713131383111760286865043674894351706
+    assert p.get_obj_id('http://www.google.com') == 315548418679270891023154790482472018240
+    assert p.get_obj_id('He' + 'llo') == 184900800977808474752697256094572479703
 
 
 def test_correctly_partitions_stream():
@@ -89,26 +89,24 @@ def test_correctly_partitions_stream():
     p = Partitioner(stream(), 1, 3)
     ids = [o for o in p.get_my_stream()]
 
-    assert ids == ['0', '4', '5', '8', '9']
-    assert len(ids) == 5
+    assert ids == ['2', '5', '6', '7']
+    assert len(ids) == 4
 
     p = Partitioner(stream(), 2, 3)
     ids = [o for o in p.get_my_stream()]
-    assert ids == ['1', '6']
-    assert len(ids) == 2
+    assert ids == ['0', '1', '3']
+    assert len(ids) == 3
 
     p = Partitioner(stream(), 3, 3)
     ids = [o for o in p.get_my_stream()]
-    assert ids == ['2', '3', '7']
+    assert ids == ['4', '8', '9']
     assert len(ids) == 3
 
 
-def test_can_initialize_from_go_env_variables():
-
-    import os
+def test_can_initialize_from_go_env_variables(monkeypatch):
 
-    os.environ['GO_JOB_RUN_INDEX'] = '1'
-    os.environ['GO_JOB_RUN_COUNT'] = '2'
+    monkeypatch.setenv('GO_JOB_RUN_INDEX', '1')
+    monkeypatch.setenv('GO_JOB_RUN_COUNT', '2')
     p = Partitioner(range(0, 10))
 
     assert p.is_mine(0) == True
@@ -119,3 +117,61 @@ def test_can_initialize_from_go_env_variables():
     assert p.is_mine(934) == True
 
 
+def run_list_keys():
+    with open('test_fixtures/run_list.txt') as fd:
+        return [l.strip() for l in fd if l.strip()]
+
+
+def test_workers_of_every_count_get_the_same_share():
+    keys = ['%s/%d_I%07dPXXIFW4_Non-Final_Rejection.json' % (series, appid, appid % 9999991)
+            for series in ('13', '14m', '14s') for appid in range(13000000, 13060000, 3)]
+
+    for n in (7, 10, 12):
+        counts = Partitioner.shares(keys, n)
+        assert sum(counts) == len(keys)
+        assert max(counts) / (len(keys) / n) < 1.03
+
+
+def test_every_key_has_exactly_one_worker():
+    keys = run_list_keys()
+
+    mine = []
+    for k in range(1, 8):
+        mine += list(Partitioner(keys, k, 7).get_my_stream())
+
+    assert sorted(mine) == sorted(keys)
+
+
+def test_weights_set_the_share_of_each_worker():
+    keys = [str(i) for i in range(60000)]
+
+    counts = Partitioner.shares(keys, 3, [1, 1, 0.5])
+
+    assert sum(counts) == 60000
+    assert abs(counts[0] - 24000) < 600
+    assert abs(counts[1] - 24000) < 600
+    assert abs(counts[2] - 12000) < 600
+
+    mine = list(Partitioner(keys, 3, 3, [1, 1, 0.5]).get_my_stream())
+    assert len(mine) == counts[2]
+
+
+def test_weights_can_come_from_the_environment(monkeypatch):
+    monkeypatch.setenv('GO_JOB_RUN_INDEX', '2')
+    monkeypatch.setenv('GO_JOB_RUN_COUNT', '2')
+    monkeypatch.setenv('PARTITION_WEIGHTS', '3,1')
+
+    p = Partitioner(range(0, 10))
+
+    assert p.is_mine(2 ** 127) == False
+    assert p.is_mine(2 ** 128 - 1) == True
+
+
+def test_weights_must_match_the_workers():
+    with pytest.raises(RuntimeError) as excinfo:
+        Partitioner(range(1, 10), 1, 2, [1, 1, 1])
+
+    assert 'Number of weights must match number of workers' == str(excinfo.value)
+
+    with pytest.raises(RuntimeError):
+        Partitioner(range(1, 10), 1, 2, [1, 0])
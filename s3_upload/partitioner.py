@@ -1,12 +1,18 @@
+import bisect
 import hashlib
 import os
 
 WORKER_ID_VAR = 'GO_JOB_RUN_INDEX'
 WORKER_COUNT_VAR = 'GO_JOB_RUN_COUNT'
+# Comma separated relative speed of each worker, e.g. 1,1,0.5
+WORKER_WEIGHTS_VAR = 'PARTITION_WEIGHTS'
+
+# Object ids are whole md5 digests
+ID_SPACE = 2 ** 128
 
 
 class Partitioner(object):
-    def __init__(self, source, worker_id=None, n_workers=None):
+    def __init__(self, source, worker_id=None, n_workers=None, weights=None):
 
         if worker_id is None and WORKER_ID_VAR in os.environ:
             worker_id = int(os.environ.get(WORKER_ID_VAR))
@@ -14,6 +20,9 @@ class Partitioner(object):
         if n_workers is None and WORKER_COUNT_VAR in os.environ:
             n_workers = int(os.environ.get(WORKER_COUNT_VAR))
 
+        if weights is None and os.environ.get(WORKER_WEIGHTS_VAR):
+            weights = [float(w) for w in os.environ.get(WORKER_WEIGHTS_VAR).split(',')]
+
 
         if worker_id == 0:
             raise RuntimeError("Worker id cannot be 0")
@@ -24,16 +33,37 @@ class Partitioner(object):
         self.n = n_workers
         self.k = worker_id
         self.source = source
+        self.bounds = None
+
+        if weights is not None:
+            if len(weights) != n_workers:
+                raise RuntimeError("Number of weights must match number of workers")
+            if min(weights) <= 0:
+                raise RuntimeError("Weights must be positive")
+
+            # Worker i owns the ids below bounds[i] and from bounds[i - 1] on,
+            # a slice of the id space the size of its weight
+            total = float(sum(weights))
+            cumulative = 0.0
+            self.bounds = []
+            for w in weights[:-1]:
+                cumulative += w
+                self.bounds.append(int(ID_SPACE * (cumulative / total)))
+
+    def part(self, obj_id):
+        # 0 based worker an object id belongs to
+        if self.bounds is None:
+            return obj_id % self.n
+        return bisect.bisect_right(self.bounds, obj_id % ID_SPACE)
 
     def is_mine(self, obj_id):
 
-        part = (obj_id % self.n)
-        return part == (self.k - 1)
+        return self.part(obj_id) == (self.k - 1)
 
     def get_obj_id(self, obj):
 
         d = hashlib.md5(obj.encode('utf-8')).digest()
-        return d[0]
+        return int.from_bytes(d, 'big')
 
     def get_my_stream(self):
 
@@ -41,3 +71,12 @@ class Partitioner(object):
             id = self.get_obj_id(x)
             if self.is_mine(id):
                 yield x
+
+    @classmethod
+    def shares(cls, keys, n_workers, weights=None):
+        # Number of keys each worker gets
+        p = cls(None, 1, n_workers, weights)
+        counts = [0] * n_workers
+        for key in keys:
+            counts[p.part(p.get_obj_id(key))] += 1
+        return counts
@@ -0,0 +1,180 @@
+import collections
+import queue
+import threading
+import time
+
+FETCH = 'fetch'
+TRANSFORM = 'transform'
+STORE = 'store'
+STAGES = (FETCH, TRANSFORM, STORE)
+
+# Outcome of one item. value is what the store stage returned, or None when
+# the stage named in stage raised error.
+PipelineResult = collections.namedtuple('PipelineResult', ['item', 'value', 'stage', 'error'])
+
+_STOP = object()
+
+
+class StageMetrics(object):
+    # Work done by the threads of one stage and how deep its input queue
+    # was. A stage whose input queue stays full holds up the pipeline, one
+    # whose input queue stays empty is waiting on the stage before it.
+    def __init__(self, name, threads, queue_size):
+        self.name = name
+        self.threads = threads
+        self.queue_size = queue_size
+        self.items = 0
+        self.errors = 0
+        self.busy = 0.0
+        self.depth_total = 0
+        self.depth_max = 0
+        self.samples = 0
+        self.lock = threading.Lock()
+
+    def record(self, seconds, failed):
+        with self.lock:
+            self.items += 1
+            self.errors += failed
+            self.busy += seconds
+
+    def sample(self, depth):
+        self.depth_total += depth
+        self.depth_max = max(self.depth_max, depth)
+        self.samples += 1
+
+    def summary(self, elapsed):
+        return {
+            'threads': self.threads,
+            'items': self.items,
+            'errors': self.errors,
+            'utilization': self.busy / (max(elapsed, 1e-9) * self.threads),
+            'queue_mean': self.depth_total / self.samples if self.samples else 0.0,
+            'queue_max': self.depth_max,
+            'queue_size': self.queue_size,
+        }
+
+
+class Pipeline(object):
+    # Runs items through fetch, transform and store, each on its own threads,
+    # so the network legs and the CPU work overlap. The stages are joined by
+    # queues of queue_size items, so a slow stage holds the others back
+    # instead of letting items pile up in memory.
+    def __init__(self, fetch, transform, store, fetchers=8, transformers=1, storers=8, queue_size=32,
+                 sample_interval=0.1):
+        self.funcs = {FETCH: fetch, TRANSFORM: transform, STORE: store}
+        self.threads = {FETCH: fetchers, TRANSFORM: transformers, STORE: storers}
+        self.queue_size = queue_size
+        self.sample_interval = sample_interval
+        self.metrics = {}
+        self.workers = []
+        self.started = None
+        self.finished = None
+
+    def run(self, items):
+        # Yields a PipelineResult per item, in completion order
+        self.started = time.time()
+        self.stopping = threading.Event()
+        self.queues = dict((stage, queue.Queue(self.queue_size)) for stage in STAGES)
+        self.results = queue.Queue()
+        self.metrics = dict((stage, StageMetrics(stage, self.threads[stage], self.queue_size)) for stage in STAGES)
+        self.running = dict(self.threads)
+        self.lock = threading.Lock()
+
+        self.workers = [threading.Thread(target=self.feed, args=(items,))]
+        for stage in STAGES:
+            for i in range(self.threads[stage]):
+                self.workers.append(threading.Thread(target=self.work, args=(stage,)))
+        self.workers.append(threading.Thread(target=self.sample))
+        for t in self.workers:
+            t.daemon = True
+            t.start()
+
+        try:
+            while True:
+                result = self.results.get()
+                if result is _STOP:
+                    break
+                yield result
+        finally:
+            self.stopping.set()
+            self.finished = time.time()
+
+    def put(self, q, item):
+        while not self.stopping.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def feed(self, items):
+        try:
+            for item in items:
+                if not self.put(self.queues[FETCH], (item, item)):
+                    return
+        except Exception as e:
+            self.results.put(PipelineResult(None, None, FETCH, e))
+        for i in range(self.threads[FETCH]):
+            self.put(self.queues[FETCH], _STOP)
+
+    def work(self, stage):
+        func = self.funcs[stage]
+        inbox = self.queues[stage]
+        following = STAGES.index(stage) + 1
+        outbox = self.queues[STAGES[following]] if following < len(STAGES) else None
+
+        while not self.stopping.is_set():
+            try:
+                task = inbox.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if task is _STOP:
+                break
+
+            item, value = task
+            start = time.time()
+            try:
+                value = func(value)
+            except Exception as e:
+                self.metrics[stage].record(time.time() - start, True)
+                self.results.put(PipelineResult(item, None, stage, e))
+                continue
+            self.metrics[stage].record(time.time() - start, False)
+
+            if outbox is None:
+                self.results.put(PipelineResult(item, value, stage, None))
+            else:
+                self.put(outbox, (item, value))
+
+        # The last thread of a stage stops the next one
+        with self.lock:
+            self.running[stage] -= 1
+            last = self.running[stage] == 0
+        if last:
+            if outbox is None:
+                self.results.put(_STOP)
+            else:
+                for i in range(self.threads[STAGES[following]]):
+                    self.put(outbox, _STOP)
+
+    def sample(self):
+        while not self.stopping.wait(self.sample_interval):
+            for stage in STAGES:
+                self.metrics[stage].sample(self.queues[stage].qsize())
+
+    def join(self, timeout=None):
+        # Waits for the threads of the last run to end, returns whether they
+        # all did
+        deadline = None if timeout is None else time.time() + timeout
+        for t in self.workers:
+            t.join(None if deadline is None else max(0.0, deadline - time.time()))
+        return not any(t.is_alive() for t in self.workers)
+
+    def depths(self):
+        return dict((stage, self.queues[stage].qsize()) for stage in STAGES)
+
+    def summary(self):
+        end = self.finished or time.time()
+        elapsed = end - self.started if self.started else 0.0
+        return dict((stage, self.metrics[stage].summary(elapsed)) for stage in STAGES)
@@ -0,0 +1,113 @@
+import threading
+import time
+
+from pipeline import Pipeline, TRANSFORM, STORE
+
+
+def test_every_item_goes_through_all_stages():
+    stored = []
+    pipeline = Pipeline(lambda k: k + ':body', lambda b: b.upper(), lambda d: stored.append(d) or len(d),
+                        fetchers=3, transformers=2, storers=3, queue_size=4)
+
+    results = list(pipeline.run('k%d' % i for i in range(50)))
+
+    assert sorted(r.item for r in results) == sorted('k%d' % i for i in range(50))
+    assert all(r.error is None and r.stage == STORE for r in results)
+    assert sorted(stored) == sorted('K%d:BODY' % i for i in range(50))
+    assert pipeline.summary()[TRANSFORM]['items'] == 50
+
+
+def test_failures_are_reported_with_their_stage():
+    def transform(body):
+        if body == 'bad':
+            raise ValueError('cannot parse')
+        return body
+
+    pipeline = Pipeline(lambda k: k, transform, lambda d: d, fetchers=2, storers=2)
+
+    results = dict((r.item, r) for r in pipeline.run(['a', 'bad', 'b']))
+
+    assert results['bad'].stage == TRANSFORM
+    assert isinstance(results['bad'].error, ValueError)
+    assert results['a'].value == 'a' and results['b'].value == 'b'
+    assert pipeline.summary()[TRANSFORM]['errors'] == 1
+
+
+class InFlight(object):
+    # Counts the calls of a stage function running at the same time
+    def __init__(self, func):
+        self.func = func
+        self.lock = threading.Lock()
+        self.running = 0
+        self.peak = 0
+
+    def __call__(self, value):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        try:
+            return self.func(value)
+        finally:
+            with self.lock:
+                self.running -= 1
+
+
+def test_network_stages_overlap():
+    # Every fetch waits for three more to start, which only happens when the
+    # fetchers run side by side. Every store waits until later items have
+    # been fetched, which only happens when fetches go on during stores.
+    fetch_barrier = threading.Barrier(4, timeout=5)
+    fetched = threading.Semaphore(0)
+
+    def fetch(k):
+        fetch_barrier.wait()
+        fetched.release()
+        return k
+
+    def store(d):
+        assert fetched.acquire(timeout=5)
+        return d
+
+    fetch = InFlight(fetch)
+    store = InFlight(store)
+    pipeline = Pipeline(fetch, lambda b: b, store, fetchers=8, storers=8, queue_size=4)
+    results = list(pipeline.run(range(40)))
+
+    assert [r.error for r in results] == [None] * 40
+    assert fetch.peak >= 4
+    assert store.peak >= 1
+
+
+def test_queue_depths_show_the_slow_stage():
+    # The transform stage holds its first item until the sampler has seen its
+    # input queue full, while the store stage after it has nothing queued
+    pipeline = None
+    held = {}
+
+    def transform(b):
+        if b == 0:
+            deadline = time.time() + 5
+            while pipeline.summary()[TRANSFORM]['queue_max'] < 8 and time.time() < deadline:
+                time.sleep(0.01)
+            held.update(pipeline.depths())
+        return b
+
+    pipeline = Pipeline(lambda k: k, transform, lambda d: d, fetchers=4, storers=4, queue_size=8,
+                        sample_interval=0.01)
+    list(pipeline.run(range(100)))
+
+    assert held[TRANSFORM] == 8
+    assert held[STORE] == 0
+    assert pipeline.summary()[TRANSFORM]['queue_max'] == 8
+    assert pipeline.summary()[TRANSFORM]['items'] == 100
+
+
+def test_abandoned_run_stops_its_threads():
+    pipeline = Pipeline(lambda k: k, lambda b: b, lambda d: d, fetchers=4, storers=4, queue_size=2)
+
+    results = pipeline.run(range(10000))
+    next(results)
+    results.close()
+
+    assert pipeline.join(timeout=5)
+    assert len(pipeline.workers) == 1 + 4 + 1 + 4 + 1
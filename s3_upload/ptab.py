@@ -0,0 +1,159 @@
+import glob
+import json
+import os
+import shutil
+import zipfile
+
+import xmltodict
+from lxml import etree
+
+# Extracted PDF text lives at <root>/PTAB_<date>/<dir>/<subdir>/<docid>.txt
+TEXT_PATTERN = os.path.join('PTAB*', '*', '*', '*.txt')
+
+
+class PtabTextIndex(object):
+    # Document id -> extracted text path for the whole PTAB tree, built with a
+    # single directory scan. When a document id shows up in several archives
+    # the one that sorts last (the latest week) wins.
+    def __init__(self, paths=None):
+        self.paths = {}
+        for path in paths or ():
+            self.add(path)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __contains__(self, docid):
+        return docid in self.paths
+
+    @classmethod
+    def build(cls, root):
+        return cls(sorted(glob.iglob(os.path.join(root, TEXT_PATTERN))))
+
+    def add(self, path):
+        self.paths[os.path.splitext(os.path.basename(path))[0]] = path
+
+    def get(self, docid):
+        return self.paths.get(docid)
+
+
+class PtabMetadata(object):
+    # DATA_RECORDs of the weekly PTAB metadata XML files, read one record at a
+    # time. Each record is converted with xmltodict so it has the same shape
+    # as in a parse of the whole file.
+
+    @classmethod
+    def records(cls, source):
+        for event, elem in etree.iterparse(source, tag='DATA_RECORD'):
+            yield xmltodict.parse(etree.tostring(elem, with_tail=False))['DATA_RECORD']
+
+            elem.clear()
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+
+    @classmethod
+    def read_json(cls, fname):
+        # Records of a processed archive. Newline delimited files are streamed,
+        # single documents written by earlier versions are loaded whole.
+        if fname.endswith('.ndjson'):
+            with open(fname) as fd:
+                for line in fd:
+                    if line.strip():
+                        yield json.loads(line)
+        else:
+            with open(fname) as fd:
+                records = json.load(fd)['main']['DATA_RECORD']
+            if isinstance(records, dict):
+                records = [records]
+            for x in records:
+                yield x
+
+
+class NdjsonWriter(object):
+    # Writes records one JSON document per line to a scratch file that only
+    # replaces fname on commit, so an aborted archive leaves no output behind.
+    def __init__(self, fname):
+        dirname = os.path.dirname(fname)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+
+        self.fname = fname
+        self.tmpname = fname + '.tmp'
+        self.fd = open(self.tmpname, 'w')
+        self.count = 0
+
+    def write(self, record):
+        self.fd.write(json.dumps(record))
+        self.fd.write('\n')
+        self.count += 1
+
+    def commit(self):
+        self.fd.close()
+        os.replace(self.tmpname, self.fname)
+
+    def abort(self):
+        self.fd.close()
+        if os.path.isfile(self.tmpname):
+            os.remove(self.tmpname)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if not self.fd.closed:
+            self.abort()
+
+
+class PtabArchive(object):
+    # A weekly PTAB_<date>_WK<nn>.zip read in place. Outputs derived from a
+    # member go where unzip -d root would have put the member, so they sit
+    # next to the files of archives that were unzipped by earlier runs.
+    def __init__(self, path, root=None):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.root = root if root is not None else os.path.dirname(path)
+        self.zip = zipfile.ZipFile(path)
+
+    def members(self, ext):
+        return sorted(info.filename for info in self.zip.infolist()
+                      if not info.filename.endswith('/') and info.filename.lower().endswith(ext))
+
+    def open(self, member):
+        return self.zip.open(member)
+
+    def output_path(self, member, ext):
+        return os.path.join(self.root, os.path.splitext(member)[0] + '.' + ext)
+
+    @classmethod
+    def scratch_path(cls, txtpath):
+        return os.path.join(os.path.dirname(txtpath), '.extract-' + os.path.basename(txtpath))
+
+    def extract_member(self, member, txtpath, extract):
+        # extract(pdfpath) writes <pdfpath without extension>.txt. The PDF is
+        # spooled to a scratch directory next to the output and removed with it.
+        os.makedirs(os.path.dirname(txtpath), exist_ok=True)
+
+        tmp = self.scratch_path(txtpath)
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.mkdir(tmp)
+        try:
+            pdfpath = os.path.join(tmp, os.path.basename(member))
+            with self.open(member) as src, open(pdfpath, 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+
+            extract(pdfpath)
+
+            tmptxt = os.path.splitext(pdfpath)[0] + '.txt'
+            if os.path.isfile(tmptxt):
+                os.replace(tmptxt, txtpath)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def close(self):
+        self.zip.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,233 @@
+import collections
+import concurrent.futures
+import datetime
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DOWNLOADED = 'downloaded'
+PRESENT = 'present'
+MISSING = 'missing'
+ERROR = 'error'
+
+# Archive recorded in the manifest. sha256 is None while the download is
+# partial, validator is the ETag (or Last-Modified) the bytes came with and
+# mtime that of the local copy when its sha256 was taken.
+ArchiveEntry = collections.namedtuple('ArchiveEntry', ['name', 'url', 'size', 'sha256', 'validator', 'mtime'])
+ArchiveEntry.__new__.__defaults__ = (None,)
+DownloadResult = collections.namedtuple('DownloadResult', ['name', 'status', 'size', 'seconds', 'error'])
+
+
+def week_names(start, end):
+    # PTAB_<date>_WK<nn>.zip names of the weekly archives from start to end
+    # (YYYYMMDD strings), the way retrieve_ptab_files.sh builds them: the
+    # Friday of start's week, then every 7 days, numbered with the ISO week.
+    # The 2015 archives are numbered one week lower.
+    day = datetime.datetime.strptime(start, '%Y%m%d').date()
+    last = datetime.datetime.strptime(end, '%Y%m%d').date()
+    day = day - datetime.timedelta(days=day.isoweekday()) + datetime.timedelta(days=5)
+
+    while day <= last:
+        week = day.isocalendar()[1]
+        if day.year == 2015:
+            week -= 1
+        yield 'PTAB_{}_WK{:02d}.zip'.format(day.strftime('%Y%m%d'), week)
+        day += datetime.timedelta(days=7)
+
+
+class DownloadManifest(object):
+    # Archives downloaded so far, with the size and SHA-256 a local copy must
+    # have to count as complete, and its mtime so an unchanged copy is not
+    # hashed again. Shared by the download threads.
+    def __init__(self, path, timeout=60):
+
+        dirname = os.path.dirname(path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+
+        self.path = path
+        self.lock = threading.Lock()
+
+        self.conn = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS archives ('
+                          'name TEXT PRIMARY KEY, '
+                          'url TEXT NOT NULL, '
+                          'size INTEGER, '
+                          'sha256 TEXT, '
+                          'validator TEXT, '
+                          'updated_at REAL NOT NULL)')
+        columns = [row[1] for row in self.conn.execute('PRAGMA table_info(archives)')]
+        if 'mtime' not in columns:
+            self.conn.execute('ALTER TABLE archives ADD COLUMN mtime REAL')
+
+    def get(self, name):
+        with self.lock:
+            row = self.conn.execute('SELECT name, url, size, sha256, validator, mtime FROM archives '
+                                    'WHERE name = ?', (name,)).fetchone()
+        if row is None:
+            return None
+        return ArchiveEntry(*row)
+
+    def put(self, entry):
+        with self.lock:
+            self.conn.execute('INSERT OR REPLACE INTO archives (name, url, size, sha256, validator, mtime, updated_at) '
+                              'VALUES (?, ?, ?, ?, ?, ?, ?)', tuple(entry) + (time.time(),))
+
+    def close(self):
+        self.conn.close()
+
+
+class PtabDownloader(object):
+    # Probes and downloads weekly archives on a thread pool sharing kept-alive
+    # connections. Bytes go to <name>.part, which a later attempt or run
+    # resumes with a Range request, and the archive is only renamed into
+    # place once its size matches and its SHA-256 is in the manifest.
+    def __init__(self, base_url, dest, manifest, workers=4, retries=3, backoff=1, timeout=60,
+                 chunksize=1 << 16):
+        self.base_url = base_url.rstrip('/') + '/'
+        self.dest = dest
+        self.manifest = manifest
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.chunksize = chunksize
+
+        os.makedirs(dest, exist_ok=True)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def run(self, names):
+        # Yields a DownloadResult per archive name, in completion order
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(self.fetch, name) for name in names]
+            for future in concurrent.futures.as_completed(futures):
+                yield future.result()
+
+    def fetch(self, name):
+        start = time.time()
+        error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+            try:
+                status, size = self.download(name)
+                return DownloadResult(name, status, size, time.time() - start, None)
+            except (requests.exceptions.RequestException, IOError) as e:
+                error = repr(e)
+
+        return DownloadResult(name, ERROR, None, time.time() - start, error)
+
+    @classmethod
+    def file_digest(cls, path, sha=None):
+        sha = sha or hashlib.sha256()
+        with open(path, 'rb') as fd:
+            for chunk in iter(lambda: fd.read(1 << 20), b''):
+                sha.update(chunk)
+        return sha
+
+    def verify(self, name):
+        # True when the local copy is the one recorded in the manifest. The
+        # copy is only hashed again when its mtime is not the recorded one.
+        path = os.path.join(self.dest, name)
+        entry = self.manifest.get(name)
+        if entry is None or entry.sha256 is None or not os.path.isfile(path):
+            return False
+        stat = os.stat(path)
+        if stat.st_size != entry.size:
+            return False
+        if stat.st_mtime == entry.mtime:
+            return True
+        if self.file_digest(path).hexdigest() != entry.sha256:
+            return False
+        self.manifest.put(entry._replace(mtime=stat.st_mtime))
+        return True
+
+    def download(self, name):
+        if self.verify(name):
+            return PRESENT, os.path.getsize(os.path.join(self.dest, name))
+
+        url = self.base_url + name
+        path = os.path.join(self.dest, name)
+        part = path + '.part'
+
+        probe = self.session.head(url, timeout=self.timeout, allow_redirects=True)
+        if probe.status_code == 404:
+            return MISSING, None
+        probe.raise_for_status()
+
+        size = int(probe.headers['Content-Length']) if 'Content-Length' in probe.headers else None
+        validator = probe.headers.get('ETag') or probe.headers.get('Last-Modified')
+
+        entry = self.manifest.get(name)
+        if os.path.isfile(path):
+            if entry is not None:
+                # Local copy that failed verification
+                os.remove(path)
+            elif size is not None and os.path.getsize(path) == size:
+                # Fetched before there was a manifest (wget -nc) and as long
+                # as the archive on the server
+                mtime = os.path.getmtime(path)
+                sha = self.file_digest(path)
+                self.manifest.put(ArchiveEntry(name, url, size, sha.hexdigest(), validator, mtime))
+                return PRESENT, size
+            else:
+                os.replace(path, part)
+
+        offset = os.path.getsize(part) if os.path.isfile(part) else 0
+        if offset and (entry is None or entry.validator is None or entry.validator != validator):
+            # Bytes of another version of the archive, or of unknown origin
+            offset = 0
+        self.manifest.put(ArchiveEntry(name, url, size, None, validator))
+
+        headers = {}
+        if offset:
+            headers['Range'] = 'bytes={}-'.format(offset)
+            headers['If-Range'] = validator
+
+        sha = hashlib.sha256()
+        with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+            if response.status_code == 416 and offset == size:
+                pass
+            elif response.status_code == 206 and offset:
+                self.file_digest(part, sha)
+                with open(part, 'ab') as fd:
+                    self.copy(response, fd, sha)
+            else:
+                response.raise_for_status()
+                with open(part, 'wb') as fd:
+                    self.copy(response, fd, sha)
+
+        if response.status_code == 416:
+            self.file_digest(part, sha)
+
+        received = os.path.getsize(part)
+        if size is not None and received != size:
+            raise IOError('{} is {} bytes, expected {}'.format(part, received, size))
+
+        self.manifest.put(ArchiveEntry(name, url, received, sha.hexdigest(), validator, os.path.getmtime(part)))
+        os.replace(part, path)
+        return DOWNLOADED, received
+
+    def copy(self, response, fd, sha):
+        for chunk in response.iter_content(self.chunksize):
+            fd.write(chunk)
+            sha.update(chunk)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,203 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+import pytest
+from ptab_download import (DownloadManifest, PtabDownloader, week_names, DOWNLOADED, PRESENT, MISSING, ERROR)
+
+ARCHIVES = {
+    'PTAB_20160108_WK01.zip': b'week one ' * 1000,
+    'PTAB_20160115_WK02.zip': b'week two ' * 1000,
+}
+
+
+class StubBulkDataHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_HEAD(self):
+        self.respond(body=False)
+
+    def do_GET(self):
+        self.respond(body=True)
+
+    def respond(self, body):
+        server = self.server
+        name = self.path.rsplit('/', 1)[-1]
+        data = server.archives.get(name)
+        server.requests.append((self.command, name, self.headers.get('Range')))
+
+        if data is None:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        etag = '"%s"' % hashlib.md5(data).hexdigest()
+        offset = 0
+        rng = self.headers.get('Range')
+        if rng and self.headers.get('If-Range', etag) == etag:
+            offset = int(rng.split('=')[1].rstrip('-'))
+
+        self.send_response(206 if offset else 200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(data) - offset))
+        if offset:
+            self.send_header('Content-Range', 'bytes %d-%d/%d' % (offset, len(data) - 1, len(data)))
+        self.end_headers()
+        if not body:
+            return
+
+        if name in server.cut:
+            # Drop the connection part way, once
+            server.cut.discard(name)
+            self.wfile.write(data[offset:offset + 2000])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(data[offset:])
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubBulkDataServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+@pytest.fixture
+def bulkdata():
+    server = StubBulkDataServer(('127.0.0.1', 0), StubBulkDataHandler)
+    server.archives = dict(ARCHIVES)
+    server.requests = []
+    server.cut = set()
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    server.url = 'http://127.0.0.1:%d/data2/patent/trial/appeal/board/' % server.server_address[1]
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+
+def downloader(bulkdata, tmpdir, **kwargs):
+    manifest = DownloadManifest(str(tmpdir.join('logs', 'ptabdownloads.db')))
+    return PtabDownloader(bulkdata.url, str(tmpdir.join('files')), manifest, backoff=0.01, chunksize=1000,
+                          **kwargs)
+
+
+def test_week_names_follow_the_retrieval_script():
+    assert list(week_names('20160105', '20160122')) == ['PTAB_20160108_WK01.zip', 'PTAB_20160115_WK02.zip',
+                                                        'PTAB_20160122_WK03.zip']
+    # a Sunday start belongs to the week before
+    assert list(week_names('20160110', '20160110')) == ['PTAB_20160108_WK01.zip']
+    # the 2015 archives are numbered one week lower
+    assert list(week_names('20150101', '20150109')) == ['PTAB_20150102_WK00.zip', 'PTAB_20150109_WK01.zip']
+    assert list(week_names('20141229', '20150101')) == []
+
+
+def test_archives_are_downloaded_concurrently(bulkdata, tmpdir):
+    names = list(week_names('20160105', '20160122'))
+
+    with downloader(bulkdata, tmpdir, workers=3) as d:
+        results = {r.name: r for r in d.run(names)}
+
+    assert results['PTAB_20160108_WK01.zip'].status == DOWNLOADED
+    assert results['PTAB_20160115_WK02.zip'].status == DOWNLOADED
+    assert results['PTAB_20160122_WK03.zip'].status == MISSING
+    assert tmpdir.join('files', 'PTAB_20160108_WK01.zip').read_binary() == ARCHIVES['PTAB_20160108_WK01.zip']
+    entry = d.manifest.get('PTAB_20160108_WK01.zip')
+    assert entry.sha256 == hashlib.sha256(ARCHIVES['PTAB_20160108_WK01.zip']).hexdigest()
+
+
+def test_interrupted_download_is_resumed(bulkdata, tmpdir):
+    bulkdata.cut.add('PTAB_20160108_WK01.zip')
+
+    with downloader(bulkdata, tmpdir) as d:
+        result = d.fetch('PTAB_20160108_WK01.zip')
+
+    assert result.status == DOWNLOADED
+    assert ('GET', 'PTAB_20160108_WK01.zip', 'bytes=2000-') in bulkdata.requests
+    assert tmpdir.join('files', 'PTAB_20160108_WK01.zip').read_binary() == ARCHIVES['PTAB_20160108_WK01.zip']
+    assert not tmpdir.join('files', 'PTAB_20160108_WK01.zip.part').check()
+
+
+def test_changed_archive_is_not_resumed(bulkdata, tmpdir):
+    bulkdata.cut.add('PTAB_20160108_WK01.zip')
+    with downloader(bulkdata, tmpdir, retries=0) as d:
+        assert d.fetch('PTAB_20160108_WK01.zip').status == ERROR
+
+    bulkdata.archives['PTAB_20160108_WK01.zip'] = b'republished ' * 1000
+    with downloader(bulkdata, tmpdir) as d:
+        assert d.fetch('PTAB_20160108_WK01.zip').status == DOWNLOADED
+
+    assert tmpdir.join('files', 'PTAB_20160108_WK01.zip').read_binary() == b'republished ' * 1000
+
+
+def test_verified_archives_are_not_fetched_again(bulkdata, tmpdir):
+    with downloader(bulkdata, tmpdir) as d:
+        d.fetch('PTAB_20160108_WK01.zip')
+    bulkdata.requests = []
+
+    with downloader(bulkdata, tmpdir) as d:
+        assert d.fetch('PTAB_20160108_WK01.zip').status == PRESENT
+    assert bulkdata.requests == []
+
+    # a local copy that no longer matches the manifest is replaced
+    corrupt = bytearray(ARCHIVES['PTAB_20160108_WK01.zip'])
+    corrupt[100] = 0
+    tmpdir.join('files', 'PTAB_20160108_WK01.zip').write_binary(bytes(corrupt))
+    with downloader(bulkdata, tmpdir) as d:
+        assert d.fetch('PTAB_20160108_WK01.zip').status == DOWNLOADED
+    assert tmpdir.join('files', 'PTAB_20160108_WK01.zip').read_binary() == ARCHIVES['PTAB_20160108_WK01.zip']
+
+
+def test_archives_fetched_before_the_manifest_are_adopted(bulkdata, tmpdir):
+    tmpdir.mkdir('files').join('PTAB_20160108_WK01.zip').write_binary(ARCHIVES['PTAB_20160108_WK01.zip'])
+
+    with downloader(bulkdata, tmpdir) as d:
+        assert d.fetch('PTAB_20160108_WK01.zip').status == PRESENT
+
+    assert [r[0] for r in bulkdata.requests] == ['HEAD']
+    assert d.manifest.get('PTAB_20160108_WK01.zip').sha256 is not None
+
+
+def test_unchanged_archives_are_not_hashed_again(bulkdata, tmpdir):
+    with downloader(bulkdata, tmpdir) as d:
+        d.fetch('PTAB_20160108_WK01.zip')
+
+    hashed = []
+
+    def file_digest(path, sha=None):
+        hashed.append(path)
+        return PtabDownloader.file_digest(path, sha)
+
+    with downloader(bulkdata, tmpdir) as d:
+        d.file_digest = file_digest
+        assert d.fetch('PTAB_20160108_WK01.zip').status == PRESENT
+        assert hashed == []
+
+        # a copy touched since it was hashed is hashed once more
+        path = str(tmpdir.join('files', 'PTAB_20160108_WK01.zip'))
+        os.utime(path, (1000000000, 1000000000))
+        assert d.fetch('PTAB_20160108_WK01.zip').status == PRESENT
+        assert d.fetch('PTAB_20160108_WK01.zip').status == PRESENT
+        assert hashed == [path]
+
+
+def test_manifest_without_mtime_is_upgraded(tmpdir):
+    path = str(tmpdir.join('ptabdownloads.db'))
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE archives (name TEXT PRIMARY KEY, url TEXT NOT NULL, size INTEGER, '
+                 'sha256 TEXT, validator TEXT, updated_at REAL NOT NULL)')
+    conn.execute("INSERT INTO archives VALUES ('PTAB_20160108_WK01.zip', 'http://x/', 9000, 'ab', NULL, 0)")
+    conn.commit()
+    conn.close()
+
+    manifest = DownloadManifest(path)
+    assert manifest.get('PTAB_20160108_WK01.zip').mtime is None
+    manifest.close()
@@ -0,0 +1,108 @@
+import json
+import os
+import zipfile
+
+import xmltodict
+from ptab import NdjsonWriter, PtabArchive, PtabMetadata, PtabTextIndex
+
+
+def test_text_files_are_indexed_by_document_id(tmpdir):
+    leaf = tmpdir.mkdir('PTAB_20160108').mkdir('PTAB_20160108').mkdir('PDF_image')
+    leaf.join('fd2015001234.txt').write('text')
+    leaf.join('fd2015001234.pdf').write('pdf')
+    tmpdir.join('PTAB_20160108').join('stray.txt').write('too shallow')
+
+    index = PtabTextIndex.build(str(tmpdir))
+
+    assert len(index) == 1
+    assert index.get('fd2015001234') == str(leaf.join('fd2015001234.txt'))
+    assert index.get('stray') is None
+
+
+def test_latest_archive_wins(tmpdir):
+    for week in ('PTAB_20160101', 'PTAB_20160108'):
+        tmpdir.mkdir(week).mkdir('a').mkdir('PDF_image').join('doc1.txt').write(week)
+
+    index = PtabTextIndex.build(str(tmpdir))
+
+    assert 'PTAB_20160108' in index.get('doc1')
+
+
+def test_paths_can_be_added():
+    index = PtabTextIndex()
+    index.add('/x/PTAB_1/a/b/doc2.txt')
+
+    assert 'doc2' in index
+    assert index.get('doc2') == '/x/PTAB_1/a/b/doc2.txt'
+
+
+def test_records_match_a_whole_document_parse():
+    with open('test_fixtures/ptab_sample.xml') as fd:
+        whole = xmltodict.parse(fd.read())['main']['DATA_RECORD']
+
+    records = list(PtabMetadata.records('test_fixtures/ptab_sample.xml'))
+
+    assert records == whole
+    assert records[0]['INVENTOR_NM'] == 'Doe & Roe'
+
+
+def test_ndjson_round_trip(tmpdir):
+    fn = str(tmpdir.join('PTAB_20160108.ndjson'))
+
+    with NdjsonWriter(fn) as out:
+        for x in PtabMetadata.records('test_fixtures/ptab_sample.xml'):
+            out.write(x)
+        out.commit()
+
+    assert out.count == 2
+    assert not os.path.exists(fn + '.tmp')
+    assert list(PtabMetadata.read_json(fn)) == list(PtabMetadata.records('test_fixtures/ptab_sample.xml'))
+
+
+def test_aborted_writer_leaves_no_file(tmpdir):
+    fn = str(tmpdir.join('PTAB_20160108.ndjson'))
+
+    with NdjsonWriter(fn) as out:
+        out.write({'DOCUMENT_NM': 'a'})
+
+    assert os.listdir(str(tmpdir)) == []
+
+
+def test_legacy_json_documents_can_be_read(tmpdir):
+    legacy = tmpdir.join('PTAB_20160101.json')
+    legacy.write(json.dumps({'main': {'DATA_RECORD': {'DOCUMENT_NM': 'a'}}}))
+
+    assert list(PtabMetadata.read_json(str(legacy))) == [{'DOCUMENT_NM': 'a'}]
+
+
+def make_archive(tmpdir):
+    path = str(tmpdir.join('PTAB_20160108_WK01.zip'))
+    with zipfile.ZipFile(path, 'w') as zf:
+        zf.write('test_fixtures/ptab_sample.xml', 'PTAB_20160108/PTAB_20160108.xml')
+        zf.writestr('PTAB_20160108/PDF_image/fd2015001234.pdf', b'pdf 1')
+        zf.writestr('PTAB_20160108/PDF_image/fd2015005678.pdf', b'pdf 2')
+    return path
+
+
+def test_archive_members_are_read_in_place(tmpdir):
+    with PtabArchive(make_archive(tmpdir)) as archive:
+        assert archive.members('.xml') == ['PTAB_20160108/PTAB_20160108.xml']
+        assert len(archive.members('.pdf')) == 2
+        assert archive.output_path('PTAB_20160108/PTAB_20160108.xml', 'ndjson') == \
+            str(tmpdir.join('PTAB_20160108', 'PTAB_20160108.ndjson'))
+
+        with archive.open('PTAB_20160108/PTAB_20160108.xml') as source:
+            assert len(list(PtabMetadata.records(source))) == 2
+
+
+def test_archive_member_is_spooled_for_extraction(tmpdir):
+    def extract(pdfpath):
+        with open(pdfpath, 'rb') as src, open(os.path.splitext(pdfpath)[0] + '.txt', 'wb') as out:
+            out.write(src.read() + b' text')
+
+    with PtabArchive(make_archive(tmpdir)) as archive:
+        txt = tmpdir.join('PTAB_20160108', 'PDF_image', 'fd2015001234.txt')
+        archive.extract_member('PTAB_20160108/PDF_image/fd2015001234.pdf', str(txt), extract)
+
+    assert txt.read() == 'pdf 1 text'
+    assert os.listdir(str(tmpdir.join('PTAB_20160108', 'PDF_image'))) == ['fd2015001234.txt']
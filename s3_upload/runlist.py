@@ -0,0 +1,100 @@
+import collections
+import heapq
+import itertools
+import os
+import tempfile
+
+# Lines of the source listing that matched a destination key, that did not
+# (and so go on the run list), and destination lines without a source
+MergeCounts = collections.namedtuple('MergeCounts', ['matched', 'missing', 'orphaned'])
+
+
+class SortedListing(object):
+    # (key, line) pairs of a bucket listing in key order, key being the two
+    # fields pattern captures, appid and ifwnumber, and the '_' after them.
+    # Neither field holds a '_', so with it a listing in S3 key order is
+    # already in key order and is streamed as it is. Anything else is sorted
+    # in runs of chunk_lines lines under tmpdir and the runs merged.
+    def __init__(self, fname, pattern, tmpdir=None, chunk_lines=1000000):
+        self.fname = fname
+        self.pattern = pattern
+        self.tmpdir = tmpdir
+        self.chunk_lines = chunk_lines
+        self.external = None
+
+    def parse(self, fname):
+        with open(fname, 'r') as listing:
+            for l in listing:
+                l = l.strip()
+                if not l:
+                    continue
+
+                m = self.pattern.match(l)
+
+                if m is None:
+                    raise RuntimeError("Cannot parse [{}]".format(l))
+
+                yield m.group(1) + '_' + m.group(2) + '_', l
+
+    def is_sorted(self):
+        last = None
+        for key, l in self.parse(self.fname):
+            if last is not None and key < last:
+                return False
+            last = key
+        return True
+
+    def __iter__(self):
+        self.external = not self.is_sorted()
+        if not self.external:
+            for pair in self.parse(self.fname):
+                yield pair
+            return
+
+        with tempfile.TemporaryDirectory(dir=self.tmpdir) as rundir:
+            runs = []
+            lines = self.parse(self.fname)
+            while True:
+                chunk = sorted(itertools.islice(lines, self.chunk_lines))
+                if not chunk:
+                    break
+
+                run = os.path.join(rundir, 'run{}.txt'.format(len(runs)))
+                with open(run, 'w') as fd:
+                    fd.writelines(l + '\n' for key, l in chunk)
+                runs.append(run)
+
+            for pair in heapq.merge(*[self.parse(run) for run in runs]):
+                yield pair
+
+
+def merge_join(src, dst, run_list):
+    # Writes the lines of src whose key is not in dst to run_list, reading
+    # both listings once, side by side
+    matched = missing = orphaned = 0
+    last = None
+
+    dst_iter = iter(dst)
+    dst_key = next(dst_iter, (None, None))[0]
+
+    for key, l in src:
+        # Destination lines before this key have no source line, but for
+        # those of the key the last source lines matched
+        while dst_key is not None and dst_key < key:
+            if dst_key != last:
+                orphaned += 1
+            dst_key = next(dst_iter, (None, None))[0]
+
+        if dst_key == key:
+            matched += 1
+            last = key
+        else:
+            missing += 1
+            run_list.write(l + '\n')
+
+    while dst_key is not None:
+        if dst_key != last:
+            orphaned += 1
+        dst_key = next(dst_iter, (None, None))[0]
+
+    return MergeCounts(matched, missing, orphaned)
@@ -0,0 +1,80 @@
+import io
+import random
+import re
+
+import pytest
+from runlist import SortedListing, merge_join, MergeCounts
+
+p_src = re.compile("OA/([^_]+)_([^_]+)_.+")
+p_dst = re.compile("test/Solr/([^_]+)_([^_]+)_.+")
+
+
+def write_listing(tmpdir, name, lines):
+    path = tmpdir.join(name)
+    path.write(''.join(l + '\n' for l in lines))
+    return str(path)
+
+
+def dict_run_list(src, dst):
+    # What the run list was before the merge, one dict of destination keys
+    keys = set(p_dst.match(l).group(1) + '_' + p_dst.match(l).group(2) for l in dst)
+    return [l for l in src if p_src.match(l).group(1) + '_' + p_src.match(l).group(2) not in keys]
+
+
+def test_s3_key_order_is_key_order(tmpdir):
+    # '_' sorts after the letters and digits, so in S3 key order 14000001_AB1
+    # comes before 14000001_AB
+    src = sorted(['OA/14/14000001_AB_CTNF.json', 'OA/14/14000001_AB1_CTNF.json', 'OA/14/14000002_X_CTFR.json'])
+    listing = SortedListing(write_listing(tmpdir, 'src.txt', src), p_src)
+
+    assert [l for key, l in listing] == src
+    assert listing.external is False
+
+
+def test_unsorted_listing_is_sorted_externally(tmpdir):
+    src = ['OA/14/1400%04d_I%d_CTNF.json' % (i % 97, i) for i in range(500)]
+    random.Random(4).shuffle(src)
+    listing = SortedListing(write_listing(tmpdir, 'src.txt', src), p_src, str(tmpdir), chunk_lines=64)
+
+    pairs = list(listing)
+
+    assert listing.external is True
+    assert [key for key, l in pairs] == sorted(key for key, l in pairs)
+    assert sorted(l for key, l in pairs) == sorted(src)
+    assert tmpdir.listdir(lambda p: p.isdir()) == []
+
+
+def test_unparsable_line_is_an_error(tmpdir):
+    listing = SortedListing(write_listing(tmpdir, 'src.txt', ['OA/nounderscore.json']), p_src)
+
+    with pytest.raises(RuntimeError):
+        list(listing)
+
+
+def test_merge_matches_the_dict_run_list(tmpdir):
+    rand = random.Random(7)
+    keys = ['14/1400%04d_%s' % (rand.randrange(300), rand.choice(['AB', 'AB1', 'X9', 'I0XTDP9'])) for i in range(400)]
+    src = ['OA/%s_CTNF.json' % k for k in keys]
+    dst = ['test/Solr/%s_%s.json' % (k, rand.choice(['CTNF', 'CTFR'])) for k in keys if rand.random() < 0.6]
+    dst += ['test/Solr/14/15000000_ORPHAN_CTNF.json', 'test/Solr/14/13000000_ORPHAN_CTNF.json']
+
+    for order in (sorted, lambda lines: rand.sample(lines, len(lines))):
+        run_list = io.StringIO()
+        counts = merge_join(SortedListing(write_listing(tmpdir, 'src.txt', order(src)), p_src, chunk_lines=50),
+                            SortedListing(write_listing(tmpdir, 'dst.txt', order(dst)), p_dst, chunk_lines=50),
+                            run_list)
+
+        expected = dict_run_list(src, dst)
+        assert sorted(run_list.getvalue().split()) == sorted(expected)
+        assert counts.missing == len(expected)
+        assert counts.matched == len(src) - len(expected)
+        assert counts.orphaned == 2
+
+
+def test_counts():
+    src = [('a_', 'OA/a_1'), ('b_', 'OA/b_1'), ('b_', 'OA/b_2'), ('d_', 'OA/d_1')]
+    dst = [('b_', 'Solr/b_1'), ('b_', 'Solr/b_2'), ('c_', 'Solr/c_1'), ('e_', 'Solr/e_1')]
+    run_list = io.StringIO()
+
+    assert merge_join(src, dst, run_list) == MergeCounts(matched=2, missing=2, orphaned=2)
+    assert run_list.getvalue() == 'OA/a_1\nOA/d_1\n'
@@ -1,14 +1,31 @@
 import boto3
+import collections
+import concurrent.futures
+import itertools
 import os
 import datetime
+import re
+import threading
+
+import botocore.config
+import botocore.exceptions
+from boto3.s3.transfer import TransferConfig
+
+# Outcome of uploading one file with S3Uploader.upload_files, error is None
+# when the upload succeeded
+UploadResult = collections.namedtuple('UploadResult', ['path', 'key', 'error'])
+
+# Managed transfer settings: files over 8 MB are sent as multipart uploads
+# with a few parts of each in flight
+TRANSFER_CONFIG = TransferConfig(multipart_threshold=8 * 1024 * 1024,
+                                 multipart_chunksize=8 * 1024 * 1024,
+                                 max_concurrency=4)
 
 
 def ensure_fresh_credentials(func):
     def wrapped_func(*args, **kwargs):
         uploader = args[0]
-        if uploader.time_to_refresh():
-            uploader.refresh_credentials()
-            uploader.refresh_s3()
+        uploader.ensure_fresh()
 
         return func(*args, **kwargs)
 
@@ -16,7 +33,12 @@ def ensure_fresh_credentials(func):
 
 
 class S3Uploader(object):
-    def __init__(self, bucket_name):
+    # Safe to share between threads. Credentials are refreshed by one thread
+    # under a lock while the others carry on with the client they hold, and
+    # the new client is swapped in whole, so transfers in flight on the old
+    # one are not dropped. max_pool_connections should cover the requests
+    # the threads have in flight at once.
+    def __init__(self, bucket_name, max_pool_connections=10):
 
         if 'AWS_ROLE_ARN' in os.environ:
             self.role = os.environ['AWS_ROLE_ARN']
@@ -30,6 +52,9 @@ class S3Uploader(object):
         self.bucket = None
         self.credentials = None
         self.s3 = None
+        self.client = None
+        self.max_pool_connections = max_pool_connections
+        self.lock = threading.Lock()
 
         self.test_pfx = ''
 
@@ -38,18 +63,32 @@ class S3Uploader(object):
                 self.test_pfx = "test/"
 
 
-    def refresh_s3(self):
+    def ensure_fresh(self):
+        if self.bucket is not None and not self.time_to_refresh():
+            return
 
+        with self.lock:
+            # Another thread may have refreshed while this one waited
+            if self.bucket is None or self.time_to_refresh():
+                self.refresh_credentials()
+                self.refresh_s3()
+
+    def refresh_s3(self):
+        # A session of its own, the default boto3 session is not safe to
+        # create clients from in several threads
         if self.credentials is None:
-            self.s3 = boto3.resource('s3')
+            session = boto3.session.Session()
         else:
-            self.s3 = boto3.resource('s3',
-                                     aws_access_key_id=self.credentials['AccessKeyId'],
-                                     aws_secret_access_key=self.credentials['SecretAccessKey'],
-                                     aws_session_token=self.credentials['SessionToken'],
-                                     )
+            session = boto3.session.Session(aws_access_key_id=self.credentials['AccessKeyId'],
+                                            aws_secret_access_key=self.credentials['SecretAccessKey'],
+                                            aws_session_token=self.credentials['SessionToken'],
+                                            )
+
+        config = botocore.config.Config(max_pool_connections=self.max_pool_connections)
+        s3 = session.resource('s3', config=config)
+        bucket = s3.Bucket(self.bucket_name)
 
-        self.bucket = self.s3.Bucket(self.bucket_name)
+        self.s3, self.client, self.bucket = s3, s3.meta.client, bucket
 
     def time_to_refresh(self):
 
@@ -74,23 +113,125 @@ class S3Uploader(object):
             self.expiration = self.credentials['Expiration']
 
         self.refresh_count += 1
-        self.bucket = None
 
         print("Refreshed Credentials. New expire time ", self.expiration)
 
+    @ensure_fresh_credentials
+    def get_client(self):
+        # Low level client, thread safe
+        return self.client
+
     @ensure_fresh_credentials
     def post_file(self, filename, fname, series):
-        data = open(filename, 'rb')
-        self.bucket.put_object(Key=series + '/' + fname, Body=data)
+        self.bucket.upload_file(filename, series + '/' + fname, Config=TRANSFER_CONFIG)
+
+    def upload_files(self, files, workers=8):
+        # Uploads (path, key) pairs on a pool of threads sharing one client
+        # and yields an UploadResult per pair, in completion order. Only
+        # workers files are read ahead of the uploads.
+        files = iter(files)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = {}
+            for path, key in files:
+                future = executor.submit(self.get_client().upload_file, path, self.bucket_name, key,
+                                         Config=TRANSFER_CONFIG)
+                pending[future] = (path, key)
+                if len(pending) < workers:
+                    continue
+
+                done, not_done = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    yield self.upload_result(pending.pop(future), future)
+
+            for future in concurrent.futures.as_completed(list(pending)):
+                yield self.upload_result(pending.pop(future), future)
+
+    @classmethod
+    def upload_result(cls, pair, future):
+        try:
+            future.result()
+        except (botocore.exceptions.BotoCoreError, botocore.exceptions.ClientError,
+                boto3.exceptions.S3UploadFailedError, IOError) as e:
+            return UploadResult(pair[0], pair[1], e)
+        return UploadResult(pair[0], pair[1], None)
 
     @ensure_fresh_credentials
     def get_file_list(self, prefix):
         return self.bucket.objects.filter(Prefix=prefix)
 
+    @classmethod
+    def shard_bounds(cls, prefix, depth=2):
+        # Keys splitting the listing of prefix into 10 ** depth shards. Keys
+        # in a series directory (13/, 14s/) start with the appid, which
+        # starts with the series number, so the shards split on the appid
+        # digits that follow it.
+        head, _, rest = prefix.rpartition('/')
+        stem = ''
+        if head and not rest:
+            stem = re.match(r'\d*', head.split('/')[-1]).group(0)
+
+        bounds = [prefix + stem + ''.join(digits) for digits in itertools.product('0123456789', repeat=depth)]
+        return bounds[1:]
+
+    def list_shard(self, prefix, start_after, last):
+        # Keys under prefix after start_after, up to and including last
+        kwargs = {'Bucket': self.bucket_name, 'Prefix': prefix}
+        if start_after is not None:
+            kwargs['StartAfter'] = start_after
+
+        keys = []
+        for page in self.get_client().get_paginator('list_objects_v2').paginate(**kwargs):
+            for obj in page.get('Contents', ()):
+                if last is not None and obj['Key'] > last:
+                    return keys
+                keys.append(obj['Key'])
+        return keys
+
+    def list_keys(self, prefix, workers=16, depth=2, in_flight=None):
+        # Keys under prefix in sorted order, like get_file_list, with the
+        # shards of shard_bounds listed concurrently. The shards are
+        # consecutive key ranges, so they cover every key whatever its
+        # layout and simply follow each other in the output. Only in_flight
+        # shards (twice workers by default) are listed ahead of the one being
+        # yielded, so a slow reader does not hold every shard's keys.
+        bounds = self.shard_bounds(prefix, depth)
+        ranges = iter(zip([None] + bounds, bounds + [None]))
+        in_flight = in_flight or 2 * workers
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            window = collections.deque()
+            for r in itertools.islice(ranges, in_flight):
+                window.append(executor.submit(self.list_shard, prefix, *r))
+
+            while window:
+                keys = window.popleft().result()
+                for r in itertools.islice(ranges, 1):
+                    window.append(executor.submit(self.list_shard, prefix, *r))
+                for key in keys:
+                    yield key
+
+    def write_listing(self, prefix, fname, workers=16):
+        # Writes the keys under prefix to fname, one per line, and returns
+        # how many there were. The file only appears once it is complete.
+        n = 0
+        tmpname = fname + '.tmp'
+        with open(tmpname, 'w') as outfile:
+            for key in self.list_keys(prefix, workers):
+                outfile.write(key + '\n')
+                n += 1
+        os.replace(tmpname, fname)
+        return n
+
     @ensure_fresh_credentials
     def get_obj(self, key):
         return self.bucket.Object(key)
 
+    @ensure_fresh_credentials
+    def get_document(self, key):
+        # Body of an object, through the thread safe client
+        return self.client.get_object(Bucket=self.bucket_name, Key=key)['Body'].read()
+
+    @ensure_fresh_credentials
     def post_document(self, text, url):
 
-        self.bucket.put_object(Key=self.test_pfx + url, Body=text)
+        self.client.put_object(Bucket=self.bucket_name, Key=self.test_pfx + url, Body=text)
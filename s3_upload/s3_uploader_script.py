@@ -1,19 +1,35 @@
-import os, glob, time, botocore, boto3, logging, argparse
-from s3_uploader_new import S3Uploader
+import os, glob, time, logging, argparse
+from s3_uploader import S3Uploader, TRANSFER_CONFIG
 
 def uploader():
     logging.info('-- Connecting to s3')
-    return S3Uploader('uspto-bdr')
+    # room for every thread to have all parts of a multipart upload in flight
+    return S3Uploader('uspto-bdr', max_pool_connections=args.workers * TRANSFER_CONFIG.max_request_concurrency)
     logging.info('-- Connected to s3')
 
-def post(filename, fname, series):
-    try:
-        s3session.post_file(filename, fname, series)
-        return True
-    except botocore.exceptions.ClientError as e:
-        logging.error('Unexpected error %s' % e)
-        raise
-        return False
+#JSON files of a series directory to upload, with their keys
+def filesToPost(seriespath, seriesfolder, startappid, numoffiles):
+    filecounter = 0
+    for filename in sorted(glob.glob(os.path.join(seriespath,'*.json'))):
+        fpath, fname = os.path.split(filename)
+        appid = int(fname.split('_')[0])
+        if appid >= startappid and filecounter < numoffiles:
+            filecounter += 1
+            yield filename, seriesfolder + '/' + fname
+
+#upload the files of a series concurrently, recording the ones that made it
+def post(files):
+    filecounter = 0
+    for result in s3session.upload_files(files, workers=args.workers):
+        fname = os.path.basename(result.path)
+        if result.error is None:
+            filecounter += 1
+            logging.info('-- {} - posted file: {}'.format(filecounter,fname))
+            appid, ifwnumber = fname.split('_')[:2]
+            filesaddedtos3.append(appid+','+ifwnumber)
+        else:
+            logging.error('-- File upload failed for: {} {}'.format(fname, result.error))
+    return filecounter
 
 #write list of app ID's to specified log file
 def writeLogs(logfname,idlist):
@@ -26,8 +42,6 @@ def writeLogs(logfname,idlist):
         logging.error('-- Write Log: '+logfname+' I/O error({0}): {1}'.format(e.errno,e.strerror))
 
 if __name__ == '__main__':
-    filesaddedtos3 = []
-
     #logging configuration
     logging.basicConfig(
                         filename='logs/uploadtos3-'+time.strftime('%Y%m%d')+'.txt',
@@ -60,6 +74,14 @@ if __name__ == '__main__':
                         type=int,
                         default=100000000
                        )
+    parser.add_argument(
+                        '-t',
+                        '--workers',
+                        required=False,
+                        help='Specify number of files to upload at a time',
+                        type=int,
+                        default=16
+                       )
     parser.add_argument(
                         '-w',
                         '--stagingfiles',
@@ -75,6 +97,7 @@ if __name__ == '__main__':
     logging.info("-- Starting app ID set to: "+str(args.startappid))
     logging.info("-- Number of files to process set to: "+str(args.numoffiles))
     logging.info("-- Staging files flag set to: "+str(args.stagingfiles))
+    logging.info("-- Number of upload threads set to: "+str(args.workers))
     logging.info("-- [JOB START]  ----------------")
 
     mainpath = os.path.join('c:'+os.sep, 'scripts', 'uspto_ptab', 'extractedfiles')
@@ -86,18 +109,9 @@ if __name__ == '__main__':
             seriesfolder = series
         startappid = args.startappid
         logging.info('Processing seriespath: '+seriespath)
-        filecounter = 0
+        filesaddedtos3 = []
         s3session = uploader()
         logging.info('Collecting filenames ' + seriespath)
-        for filename in glob.glob(os.path.join(seriespath,'*')):
-            fpath, fname = os.path.split(filename)
-            appid = int(fname.split('_')[0])
-            ifwnumber = int(fname.split('_')[1])
-            if fname.endswith('.json') and appid >= startappid and filecounter <= args.numoffiles:
-                if post(filename, fname, seriesfolder):
-                    filecounter += 1
-                    logging.info('-- {} - posted file: {}'.format(filecounter,fname))
-                    filesaddedtos3.append(appid+','+ifwnumber)
-                else:
-                    logging.error('-- File upload failed for: {}'.format(fname))
+        filecounter = post(filesToPost(seriespath, seriesfolder, startappid, args.numoffiles))
+        logging.info('-- Number of files posted for series {}: {}'.format(series, filecounter))
         writeLogs(os.path.join(seriespath,'filesaddedtos3.log'),filesaddedtos3)
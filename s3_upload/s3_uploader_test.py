@@ -1,7 +1,154 @@
 import datetime
+import hashlib
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import urlsplit, parse_qs, unquote
+from xml.sax.saxutils import escape
+
 import pytest
 
 
+class FakeS3Handler(BaseHTTPRequestHandler):
+    # Just enough of the S3 REST API for the uploader: path style GetObject,
+    # PutObject, the multipart upload calls and ListObjectsV2
+    protocol_version = 'HTTP/1.1'
+
+    def parse(self):
+        url = urlsplit(self.path)
+        bucket, _, key = url.path.lstrip('/').partition('/')
+        return bucket, unquote(key), parse_qs(url.query, keep_blank_values=True)
+
+    def body(self):
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def reply(self, status=200, data=b'', headers=()):
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_PUT(self):
+        server = self.server
+        bucket, key, query = self.parse()
+        data = self.body()
+        etag = '"%s"' % hashlib.md5(data).hexdigest()
+
+        with server.lock:
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            if server.delay:
+                threading.Event().wait(server.delay)
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+        if key in server.fail:
+            return self.reply(403, b'<Error><Code>AccessDenied</Code><Message>denied</Message></Error>')
+
+        with server.lock:
+            if 'uploadId' in query:
+                server.uploads[query['uploadId'][0]][int(query['partNumber'][0])] = data
+                server.parts += 1
+            else:
+                server.objects[(bucket, key)] = data
+        self.reply(headers=[('ETag', etag)])
+
+    def do_GET(self):
+        server = self.server
+        bucket, key, query = self.parse()
+        if key:
+            data = server.objects.get((bucket, key))
+            if data is None:
+                return self.reply(404, b'<Error><Code>NoSuchKey</Code><Message>missing</Message></Error>')
+            return self.reply(data=data)
+
+        prefix = query.get('prefix', [''])[0]
+        after = query.get('continuation-token', query.get('start-after', ['']))[0]
+        page_size = server.page_size
+
+        with server.lock:
+            server.list_requests += 1
+            keys = sorted(k for b, k in server.objects if b == bucket and k.startswith(prefix) and k > after)
+
+        page = keys[:page_size]
+        data = '<ListBucketResult><Name>%s</Name><Prefix>%s</Prefix><KeyCount>%d</KeyCount>' % (
+            bucket, escape(prefix), len(page))
+        for k in page:
+            data += '<Contents><Key>%s</Key><Size>1</Size></Contents>' % escape(k)
+        if len(keys) > page_size:
+            data += '<IsTruncated>true</IsTruncated><NextContinuationToken>%s</NextContinuationToken>' % escape(page[-1])
+        else:
+            data += '<IsTruncated>false</IsTruncated>'
+        data += '</ListBucketResult>'
+        self.reply(data=data.encode())
+
+    def do_POST(self):
+        server = self.server
+        bucket, key, query = self.parse()
+        self.body()
+
+        if 'uploads' in query:
+            upload_id = uuid.uuid4().hex
+            with server.lock:
+                server.uploads[upload_id] = {}
+            data = ('<InitiateMultipartUploadResult><Bucket>%s</Bucket><Key>%s</Key>'
+                    '<UploadId>%s</UploadId></InitiateMultipartUploadResult>' % (bucket, key, upload_id))
+            return self.reply(data=data.encode())
+
+        with server.lock:
+            parts = server.uploads.pop(query['uploadId'][0])
+            server.objects[(bucket, key)] = b''.join(parts[n] for n in sorted(parts))
+        data = ('<CompleteMultipartUploadResult><Bucket>%s</Bucket><Key>%s</Key>'
+                '<ETag>"x"</ETag></CompleteMultipartUploadResult>' % (bucket, key))
+        self.reply(data=data.encode())
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeS3Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), FakeS3Handler)
+        self.lock = threading.Lock()
+        self.objects = {}
+        self.uploads = {}
+        self.parts = 0
+        self.fail = set()
+        self.delay = 0
+        self.page_size = 1000
+        self.list_requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+
+@pytest.fixture
+def fake_s3(monkeypatch):
+    server = FakeS3Server()
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    monkeypatch.delenv('AWS_ROLE_ARN', raising=False)
+    monkeypatch.setenv('AWS_ENDPOINT_URL_S3', 'http://127.0.0.1:%d' % server.server_address[1])
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    monkeypatch.setenv('AWS_REQUEST_CHECKSUM_CALCULATION', 'when_required')
+    monkeypatch.setenv('AWS_RESPONSE_CHECKSUM_VALIDATION', 'when_required')
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+
 @pytest.fixture
 def uploader():
     from s3_uploader import S3Uploader
@@ -12,6 +159,49 @@ def xtest_that_we_can_post_file_to_s3(uploader):
     uploader.post_file("test_fixtures/test_file.txt", '9900011_Test99', 'T99')
 
 
+def test_post_file_uploads_to_series(fake_s3):
+    from s3_uploader import S3Uploader
+    uploader = S3Uploader('uspto-bdr')
+
+    uploader.post_file("test_fixtures/test_file.txt", '9900011_Test99', 'T99')
+
+    with open("test_fixtures/test_file.txt", 'rb') as fd:
+        assert fake_s3.objects[('uspto-bdr', 'T99/9900011_Test99')] == fd.read()
+
+
+def test_upload_files_reports_each_key(fake_s3, tmpdir):
+    from s3_uploader import S3Uploader
+    uploader = S3Uploader('uspto-bdr')
+    pairs = []
+    for i in range(20):
+        tmpdir.join('%d.json' % i).write('{"n": %d}' % i)
+        pairs.append((str(tmpdir.join('%d.json' % i)), 'T99/%d.json' % i))
+    fake_s3.fail.add('T99/7.json')
+    fake_s3.delay = 0.05
+
+    results = {r.key: r for r in uploader.upload_files(pairs, workers=4)}
+
+    assert len(results) == 20
+    assert results['T99/7.json'].error is not None
+    assert len([r for r in results.values() if r.error is None]) == 19
+    assert fake_s3.objects[('uspto-bdr', 'T99/3.json')] == b'{"n": 3}'
+    assert ('uspto-bdr', 'T99/7.json') not in fake_s3.objects
+    assert 1 < fake_s3.max_in_flight <= 4
+
+
+def test_large_files_are_sent_in_parts(fake_s3, tmpdir):
+    from s3_uploader import S3Uploader
+    uploader = S3Uploader('uspto-bdr')
+    data = b'0123456789abcdef' * (1024 * 1024 + 10)
+    tmpdir.join('big.json').write_binary(data)
+
+    results = list(uploader.upload_files([(str(tmpdir.join('big.json')), 'T99/big.json')]))
+
+    assert results[0].error is None
+    assert fake_s3.parts == 3
+    assert fake_s3.objects[('uspto-bdr', 'T99/big.json')] == data
+
+
 def test_when_upload_just_created_it_is_time_to_refresh_credentials(uploader):
     assert uploader.time_to_refresh()
 
@@ -104,3 +294,110 @@ def xtest_that_we_can_get_subset_of_data(uploader):
 
     assert file['Body'].read().startswith(b'{"type": "oa", "appid": "13000002", '
                                           b'"ifwnumber": "HC0HIXUBPXXIFW4", "documentcode": "CTNF",')
+
+
+def test_refresh_happens_once_under_concurrent_use(fake_s3, tmpdir):
+    from s3_uploader import S3Uploader
+    uploader = S3Uploader('uspto-bdr', max_pool_connections=32)
+    tmpdir.join('doc.json').write('{}')
+    fake_s3.delay = 0.02
+    barrier = threading.Barrier(32)
+    errors = []
+
+    def work(n):
+        try:
+            barrier.wait()
+            for i in range(10):
+                if n == 0 and i == 5:
+                    # credentials nearly expired while the others are uploading
+                    uploader.expiration = datetime.datetime.now(datetime.timezone.utc)
+                uploader.post_file(str(tmpdir.join('doc.json')), '%d_%d.json' % (n, i), 'T99')
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=work, args=(n,)) for n in range(32)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    assert uploader.refresh_count == 2
+    assert len(fake_s3.objects) == 320
+
+
+def test_client_pool_is_sized_for_the_threads(fake_s3, tmpdir, caplog):
+    from s3_uploader import S3Uploader
+    uploader = S3Uploader('uspto-bdr', max_pool_connections=24)
+    fake_s3.delay = 0.3
+    pairs = []
+    for i in range(48):
+        tmpdir.join('%d.json' % i).write('{}')
+        pairs.append((str(tmpdir.join('%d.json' % i)), 'T99/%d.json' % i))
+
+    results = list(uploader.upload_files(pairs, workers=24))
+
+    assert uploader.get_client().meta.config.max_pool_connections == 24
+    assert all(r.error is None for r in results)
+    assert 10 < fake_s3.max_in_flight <= 24
+    assert 'Connection pool is full' not in caplog.text
+
+
+def test_shard_bounds_follow_the_appid_digits():
+    from s3_uploader import S3Uploader
+
+    bounds = S3Uploader.shard_bounds('13/')
+    assert len(bounds) == 99
+    assert bounds[0] == '13/1301' and bounds[-1] == '13/1399'
+    assert S3Uploader.shard_bounds('test/14s/', depth=1)[:2] == ['test/14s/141', 'test/14s/142']
+    assert S3Uploader.shard_bounds('13/130000', depth=1)[0] == '13/1300001'
+
+
+def test_sharded_listing_matches_a_plain_listing(fake_s3, tmpdir):
+    from s3_uploader import S3Uploader
+    uploader = S3Uploader('uspto-bdr')
+    expected = []
+    for appid in range(13000000, 13990000, 7919):
+        expected.append('13/%d_IFW%d_Non-Final_Rejection.json' % (appid, appid % 97))
+    # keys outside the appid layout are listed too
+    expected += ['13/13', '13/1301', '13/readme.txt', '13/~tmp']
+    for key in expected:
+        fake_s3.objects[('uspto-bdr', key)] = b'{}'
+    fake_s3.objects[('uspto-bdr', '14/14000000_X_y.json')] = b'{}'
+    fake_s3.page_size = 7
+
+    keys = list(uploader.list_keys('13/', workers=8))
+
+    assert keys == sorted(expected)
+    assert fake_s3.list_requests >= 100
+
+    n = uploader.write_listing('13/', str(tmpdir.join('src-list.txt')), workers=8)
+    assert n == len(expected)
+    assert tmpdir.join('src-list.txt').read().splitlines() == sorted(expected)
+
+
+def test_sharded_listing_only_lists_a_window_ahead(fake_s3):
+    from s3_uploader import S3Uploader
+    uploader = S3Uploader('uspto-bdr')
+    for appid in range(13000000, 13990000, 7919):
+        fake_s3.objects[('uspto-bdr', '13/%d_IFW_x.json' % appid)] = b'{}'
+
+    keys = uploader.list_keys('13/', workers=2, in_flight=4)
+    first = next(keys)
+    time.sleep(0.2)
+
+    # the first shard and the four after it, one request each
+    assert first == '13/13000000_IFW_x.json'
+    assert fake_s3.list_requests == 5
+    keys.close()
+
+
+def test_documents_round_trip_through_the_client(fake_s3):
+    from s3_uploader import S3Uploader
+    uploader = S3Uploader('uspto-bdr')
+    uploader.test_pfx = 'test/'
+
+    uploader.post_document(b'{"a": 1}', '13/13000001_X.json')
+
+    assert fake_s3.objects[('uspto-bdr', 'test/13/13000001_X.json')] == b'{"a": 1}'
+    assert uploader.get_document('test/13/13000001_X.json') == b'{"a": 1}'
@@ -1,3 +1,4 @@
+import collections
 import json
 
 import requests
@@ -11,16 +12,30 @@ class SolrException(BaseException):
         return repr(self.value)
 
 
+# Outcome of one flushed update request. keys are the caller supplied keys of
+# every document in the batch, status is the Solr responseHeader status
+# (-1 when the request itself failed).
+SolrBatch = collections.namedtuple('SolrBatch', ['keys', 'status', 'response'])
+
+
 class Solr(object):
-    def __init__(self, url, core):
+    def __init__(self, url, core, batch_size=500, batch_bytes=8 * 1024 * 1024, commit_within=10000):
         self.url = url
         self.core = core
+        self.batch_size = batch_size
+        self.batch_bytes = batch_bytes
+        self.commit_within = commit_within
+        self.session = requests.Session()
+
+        self.pending_keys = []
+        self.pending_docs = []
+        self.pending_bytes = 0
 
     def send_request(self, command, data):
         url = "/".join((self.url, "solr", self.core, command))
         headers = {"Content-type": "application/json"}
 
-        rv = requests.post(url, data=data, headers=headers)
+        rv = self.session.post(url, data=data, headers=headers)
 
         return rv.json()
 
@@ -41,3 +56,53 @@ class Solr(object):
             raise SolrException(rv['errors'])
 
         return rv
+
+    def add_documents(self, docs):
+        # docs is an iterable of (key, doc) pairs where doc is either a JSON
+        # string or a dict. Documents are buffered and sent as one JSON array
+        # update once batch_size documents or batch_bytes bytes are pending.
+        # Returns the list of batches flushed by this call.
+        batches = []
+
+        for key, doc in docs:
+            if not isinstance(doc, str):
+                doc = json.dumps(doc)
+
+            size = len(doc.encode('utf-8'))
+
+            if self.pending_docs and self.pending_bytes + size > self.batch_bytes:
+                batches.append(self.flush_batch())
+
+            self.pending_keys.append(key)
+            self.pending_docs.append(doc)
+            self.pending_bytes += size
+
+            if len(self.pending_docs) >= self.batch_size:
+                batches.append(self.flush_batch())
+
+        return batches
+
+    def flush(self):
+        if not self.pending_docs:
+            return []
+
+        return [self.flush_batch()]
+
+    def flush_batch(self):
+        keys = self.pending_keys
+        data = '[' + ','.join(self.pending_docs) + ']'
+
+        self.pending_keys = []
+        self.pending_docs = []
+        self.pending_bytes = 0
+
+        command = 'update?wt=json&overwrite=true&commitWithin={}'.format(self.commit_within)
+
+        try:
+            rv = self.send_request(command, data)
+            status = rv['responseHeader']['status']
+        except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+            rv = {'error': str(e)}
+            status = -1
+
+        return SolrBatch(keys, status, rv)
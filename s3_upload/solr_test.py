@@ -1,3 +1,5 @@
+import json
+
 import pytest
 from solr import Solr, SolrException
 
@@ -17,3 +19,76 @@ def test_we_can_add_field(solr):
     with pytest.raises(SolrException):
         rv = solr.add_field('s3_url', type="string", multi_valued=False)
         assert rv == 0
+
+
+class FakeResponse(object):
+    def __init__(self, status):
+        self.status = status
+
+    def json(self):
+        return {'responseHeader': {'status': self.status}}
+
+
+class FakeSession(object):
+    def __init__(self, status=0):
+        self.status = status
+        self.requests = []
+
+    def post(self, url, data=None, headers=None):
+        self.requests.append((url, data))
+        return FakeResponse(self.status)
+
+
+@pytest.fixture
+def batching_solr():
+    s = Solr('http://localhost:8983', 'ptab', batch_size=3)
+    s.session = FakeSession()
+    return s
+
+
+def test_documents_are_buffered_until_batch_is_full(batching_solr):
+    rv = batching_solr.add_documents([('a', '{"id": "a"}'), ('b', '{"id": "b"}')])
+
+    assert rv == []
+    assert batching_solr.session.requests == []
+
+    rv = batching_solr.add_documents([('c', {'id': 'c'})])
+
+    assert len(rv) == 1
+    assert rv[0].keys == ['a', 'b', 'c']
+    assert rv[0].status == 0
+
+    url, data = batching_solr.session.requests[0]
+    assert url.startswith('http://localhost:8983/solr/ptab/update?')
+    assert 'commitWithin=10000' in url
+    assert [d['id'] for d in json.loads(data)] == ['a', 'b', 'c']
+
+
+def test_flush_sends_remaining_documents(batching_solr):
+    batching_solr.add_documents([('a', '{"id": "a"}')])
+
+    rv = batching_solr.flush()
+
+    assert len(rv) == 1
+    assert rv[0].keys == ['a']
+    assert batching_solr.flush() == []
+
+
+def test_batches_are_split_by_size(batching_solr):
+    batching_solr.batch_bytes = 25
+
+    rv = batching_solr.add_documents([('a', '{"id": "aaaaaaaaaa"}'), ('b', '{"id": "bbbbbbbbbb"}')])
+
+    assert len(rv) == 1
+    assert rv[0].keys == ['a']
+    assert batching_solr.flush()[0].keys == ['b']
+
+
+def test_failed_batches_report_their_status(batching_solr):
+    batching_solr.session.status = 400
+
+    batching_solr.add_documents([('a', '{"id": "a"}')])
+    rv = batching_solr.flush()
+
+    assert rv[0].status == 400
+    assert rv[0].keys == ['a']
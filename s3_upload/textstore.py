@@ -0,0 +1,64 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+
+class TextStore(object):
+    # Extracted text of PDFs keyed on the SHA-256 of the PDF, so a PDF that
+    # shows up again (in a later week, or on another machine sharing root)
+    # costs a hash instead of an extraction. Entries are written under a
+    # temporary name and renamed, so readers never see a partial text.
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    @classmethod
+    def digest(cls, fd, chunksize=1 << 20):
+        sha = hashlib.sha256()
+        for chunk in iter(lambda: fd.read(chunksize), b''):
+            sha.update(chunk)
+        return sha.hexdigest()
+
+    @classmethod
+    def digest_file(cls, pdfpath):
+        with open(pdfpath, 'rb') as fd:
+            return cls.digest(fd)
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], digest[2:4], digest + '.txt')
+
+    def __contains__(self, digest):
+        return os.path.isfile(self.path(digest))
+
+    def get(self, digest, txtpath):
+        # Copies the stored text to txtpath, returns False when there is none
+        try:
+            with open(self.path(digest), 'rb') as src:
+                self.write(src, txtpath)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def put(self, digest, txtpath):
+        # Empty texts are what a failed extraction leaves behind, those are
+        # not kept so the PDF is tried again
+        if os.path.getsize(txtpath) == 0 or digest in self:
+            return
+        with open(txtpath, 'rb') as src:
+            self.write(src, self.path(digest))
+
+    @classmethod
+    def write(cls, src, dest):
+        dirname = os.path.dirname(dest)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+
+        fd, tmp = tempfile.mkstemp(dir=dirname or '.', prefix='.' + os.path.basename(dest))
+        try:
+            with os.fdopen(fd, 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            os.replace(tmp, dest)
+        except:
+            os.remove(tmp)
+            raise
@@ -0,0 +1,35 @@
+import hashlib
+import io
+
+from textstore import TextStore
+
+
+def test_digest_is_the_sha256_of_the_pdf(tmpdir):
+    tmpdir.join('a.pdf').write_binary(b'%PDF-1.4 a')
+
+    assert TextStore.digest_file(str(tmpdir.join('a.pdf'))) == hashlib.sha256(b'%PDF-1.4 a').hexdigest()
+    assert TextStore.digest(io.BytesIO(b'%PDF-1.4 a'), chunksize=3) == hashlib.sha256(b'%PDF-1.4 a').hexdigest()
+
+
+def test_stored_text_is_copied_out(tmpdir):
+    store = TextStore(str(tmpdir.join('store')))
+    digest = hashlib.sha256(b'pdf').hexdigest()
+    tmpdir.join('a.txt').write('text of a')
+
+    assert not store.get(digest, str(tmpdir.join('b.txt')))
+    store.put(digest, str(tmpdir.join('a.txt')))
+
+    assert digest in store
+    assert store.path(digest).startswith(str(tmpdir.join('store', digest[:2], digest[2:4])))
+    assert store.get(digest, str(tmpdir.join('week2', 'b.txt')))
+    assert tmpdir.join('week2', 'b.txt').read() == 'text of a'
+
+
+def test_empty_text_is_not_stored(tmpdir):
+    store = TextStore(str(tmpdir.join('store')))
+    digest = hashlib.sha256(b'pdf').hexdigest()
+    tmpdir.join('a.txt').write('')
+
+    store.put(digest, str(tmpdir.join('a.txt')))
+
+    assert digest not in store
@@ -0,0 +1,194 @@
+import concurrent.futures
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from s3_upload.extraction import ExtractionResult, OK, FAILED, ERROR
+from s3_upload.ptab import PtabArchive
+
+
+class TikaEndpoint(object):
+    # One tika-server instance. latency is a moving average of the seconds a
+    # document takes, an endpoint that fails is left alone until down_until
+    # and for longer each time it fails again.
+    def __init__(self, url):
+        self.url = url
+        self.in_flight = 0
+        self.failures = 0
+        self.down_until = 0.0
+        self.latency = 0.0
+        self.requests = 0
+
+    def score(self):
+        # Expected wait for a new document, ties (as before the first
+        # answer) go to the endpoint with fewer requests in flight
+        return ((self.in_flight + 1) * self.latency, self.in_flight)
+
+    def available(self, now, max_in_flight):
+        return self.in_flight < max_in_flight and self.down_until <= now
+
+
+class TikaClient(object):
+    # Sends PDFs to a pool of tika-server endpoints. Each endpoint has up to
+    # max_in_flight requests on keep-alive connections, new documents go to
+    # the endpoint expected to answer first, and a failed request is retried
+    # on another endpoint after an exponential backoff. With a TextStore,
+    # PDFs whose text is already in the store are not sent.
+    def __init__(self, urls, max_in_flight=4, retries=3, backoff=0.5, max_backoff=30,
+                 cooldown=10, max_cooldown=300, timeout=300, store=None):
+        self.endpoints = [TikaEndpoint(url.rstrip('/') + '/tika') for url in urls]
+        self.max_in_flight = max_in_flight
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.timeout = timeout
+        self.store = store
+
+        self.lock = threading.Lock()
+        self.ready = threading.Condition(self.lock)
+        self.archives = {}
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(self.endpoints),
+                              pool_maxsize=max_in_flight, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def acquire(self):
+        # Blocks until an endpoint that is not resting after a failure has a
+        # free slot
+        with self.ready:
+            while True:
+                now = time.time()
+                candidates = [e for e in self.endpoints if e.available(now, self.max_in_flight)]
+                if candidates:
+                    endpoint = min(candidates, key=TikaEndpoint.score)
+                    endpoint.in_flight += 1
+                    return endpoint
+
+                wake = [e.down_until - now for e in self.endpoints if e.down_until > now]
+                self.ready.wait(min(wake) if wake else None)
+
+    def release(self, endpoint, seconds, ok):
+        with self.ready:
+            endpoint.in_flight -= 1
+            endpoint.requests += 1
+            if ok:
+                endpoint.failures = 0
+                if endpoint.latency:
+                    endpoint.latency = 0.8 * endpoint.latency + 0.2 * seconds
+                else:
+                    endpoint.latency = seconds
+            else:
+                endpoint.failures += 1
+                endpoint.down_until = time.time() + min(self.cooldown * 2 ** (endpoint.failures - 1),
+                                                        self.max_cooldown)
+            self.ready.notify_all()
+
+    def open(self, task):
+        # Body of the request. Archive members are streamed from the zip file.
+        if task.member is None:
+            return open(task.source, 'rb')
+
+        with self.lock:
+            archive = self.archives.get(task.source)
+            if archive is None:
+                archive = self.archives[task.source] = PtabArchive(task.source)
+        return archive.open(task.member)
+
+    def send(self, endpoint, task):
+        headers = {'Content-type': 'application/pdf', 'Accept': 'text/plain'}
+        with self.open(task) as body:
+            response = self.session.put(endpoint.url, data=body, headers=headers, timeout=self.timeout)
+        return response
+
+    def extract(self, task):
+        # Writes the text of one ExtractionTask and returns its
+        # ExtractionResult. Connection errors and server errors are retried,
+        # a PDF the server rejects is not.
+        start = time.time()
+        error = None
+
+        digest = None
+        if self.store is not None:
+            with self.open(task) as body:
+                digest = self.store.digest(body)
+            if self.store.get(digest, task.txtpath):
+                return ExtractionResult(task, OK, time.time() - start, 0, None, True)
+
+        for attempt in range(self.retries + 1):
+            if attempt:
+                delay = min(self.backoff * 2 ** (attempt - 1), self.max_backoff)
+                time.sleep(delay * random.uniform(0.5, 1.0))
+
+            endpoint = self.acquire()
+            sent = time.time()
+            try:
+                response = self.send(endpoint, task)
+            except requests.exceptions.RequestException as e:
+                self.release(endpoint, time.time() - sent, False)
+                error = repr(e)
+                continue
+
+            if response.status_code >= 500:
+                self.release(endpoint, time.time() - sent, False)
+                error = '{} returned {}'.format(endpoint.url, response.status_code)
+                continue
+
+            self.release(endpoint, time.time() - sent, True)
+            if response.status_code != 200:
+                return ExtractionResult(task, FAILED, time.time() - start, 0,
+                                        '{} returned {}'.format(endpoint.url, response.status_code))
+
+            self.write_text(task.txtpath, response.content)
+            if digest is not None:
+                self.store.put(digest, task.txtpath)
+            return ExtractionResult(task, OK, time.time() - start, 0, None)
+
+        return ExtractionResult(task, ERROR, time.time() - start, 0, error)
+
+    @classmethod
+    def write_text(cls, txtpath, content):
+        dirname = os.path.dirname(txtpath)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        tmp = txtpath + '.tmp'
+        with open(tmp, 'wb') as fd:
+            fd.write(content)
+        os.replace(tmp, txtpath)
+
+    def run(self, tasks):
+        # Yields an ExtractionResult per task, in completion order. Tasks are
+        # read ahead only as far as there are free slots.
+        tasks = iter(tasks)
+        slots = len(self.endpoints) * self.max_in_flight
+        with concurrent.futures.ThreadPoolExecutor(max_workers=slots) as executor:
+            pending = set()
+            for task in tasks:
+                pending.add(executor.submit(self.extract, task))
+                if len(pending) < slots:
+                    continue
+                done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+            for future in concurrent.futures.as_completed(pending):
+                yield future.result()
+
+    def close(self):
+        for archive in self.archives.values():
+            archive.close()
+        self.archives = {}
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
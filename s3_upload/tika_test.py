@@ -0,0 +1,174 @@
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+import pytest
+from extraction import ExtractionTask, OK, FAILED, ERROR
+from textstore import TextStore
+from tika import TikaClient
+
+
+class StubTikaHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_PUT(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers['Content-Length']))
+
+        with server.lock:
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            server.bodies.append(body)
+        try:
+            time.sleep(server.delay)
+            status = server.status
+            if b'rejected' in body:
+                status = 422
+            data = b'text of ' + body if status == 200 else b''
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubTikaServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, status=200, delay=0.0):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), StubTikaHandler)
+        self.status = status
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.bodies = []
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:%d' % self.server_address[1]
+
+
+@pytest.fixture
+def tika_servers():
+    servers = []
+
+    def start(status=200, delay=0.0):
+        server = StubTikaServer(status, delay)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        servers.append(server)
+        return server
+
+    yield start
+
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def pdfdir(tmpdir):
+    leaf = tmpdir.mkdir('pdfs')
+    for i in range(12):
+        leaf.join('doc%02d.pdf' % i).write_binary(b'%PDF-1.4 doc' + str(i).encode())
+    return leaf
+
+
+def pdf_tasks(pdfdir):
+    return [ExtractionTask(str(p), None, str(p)[:-4] + '.txt') for p in sorted(pdfdir.listdir('*.pdf'))]
+
+
+def test_documents_are_spread_over_endpoints_within_the_cap(tika_servers, pdfdir):
+    first = tika_servers(delay=0.05)
+    second = tika_servers(delay=0.05)
+
+    with TikaClient([first.url, second.url], max_in_flight=2) as client:
+        results = list(client.run(pdf_tasks(pdfdir)))
+
+    assert [r.status for r in results] == [OK] * 12
+    assert first.bodies and second.bodies
+    assert len(first.bodies) + len(second.bodies) == 12
+    assert first.max_in_flight <= 2 and second.max_in_flight <= 2
+    assert pdfdir.join('doc03.txt').read_binary() == b'text of %PDF-1.4 doc3'
+
+
+def test_failed_endpoint_is_routed_around(tika_servers, pdfdir):
+    healthy = tika_servers()
+    failing = tika_servers(status=503)
+
+    with TikaClient([failing.url, 'http://127.0.0.1:1', healthy.url], max_in_flight=2,
+                    backoff=0.01, cooldown=60) as client:
+        results = list(client.run(pdf_tasks(pdfdir)))
+
+    assert [r.status for r in results] == [OK] * 12
+    assert len(healthy.bodies) == 12
+    # each bad endpoint rests after its first failure
+    assert len(failing.bodies) <= 2
+
+
+def test_server_errors_are_retried_with_backoff(tika_servers, pdfdir):
+    failing = tika_servers(status=503)
+    task = pdf_tasks(pdfdir)[0]
+
+    client = TikaClient([failing.url], retries=2, backoff=0.05, cooldown=0.01)
+    start = time.time()
+    result = client.extract(task)
+    client.close()
+
+    assert result.status == ERROR
+    assert '503' in result.error
+    assert len(failing.bodies) == 3
+    assert time.time() - start >= 0.05
+    assert not pdfdir.join('doc00.txt').check()
+
+
+def test_rejected_documents_are_not_retried(tika_servers, tmpdir):
+    server = tika_servers()
+    tmpdir.join('bad.pdf').write_binary(b'rejected')
+
+    with TikaClient([server.url]) as client:
+        result = client.extract(ExtractionTask(str(tmpdir.join('bad.pdf')), None, str(tmpdir.join('bad.txt'))))
+
+    assert result.status == FAILED
+    assert len(server.bodies) == 1
+
+
+def test_archive_members_are_streamed(tika_servers, tmpdir):
+    server = tika_servers()
+    path = str(tmpdir.join('PTAB_20160108_WK01.zip'))
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('PTAB_20160108/PDF_image/a.pdf', b'%PDF-1.4 member a')
+
+    txtpath = str(tmpdir.join('PTAB_20160108', 'PDF_image', 'a.txt'))
+    with TikaClient([server.url]) as client:
+        result = client.extract(ExtractionTask(path, 'PTAB_20160108/PDF_image/a.pdf', txtpath))
+
+    assert result.status == OK
+    assert server.bodies == [b'%PDF-1.4 member a']
+    assert open(txtpath, 'rb').read() == b'text of %PDF-1.4 member a'
+
+
+def test_stored_text_is_not_sent(tika_servers, tmpdir):
+    server = tika_servers()
+    store = TextStore(str(tmpdir.join('store')))
+    for week in ('week1', 'week2'):
+        tmpdir.mkdir(week).join('a.pdf').write_binary(b'%PDF-1.4 same')
+
+    with TikaClient([server.url], store=store) as client:
+        first = client.extract(ExtractionTask(str(tmpdir.join('week1', 'a.pdf')), None, str(tmpdir.join('week1', 'a.txt'))))
+        second = client.extract(ExtractionTask(str(tmpdir.join('week2', 'a.pdf')), None, str(tmpdir.join('week2', 'a.txt'))))
+
+    assert not first.cached and second.cached
+    assert len(server.bodies) == 1
+    assert tmpdir.join('week2', 'a.txt').read_binary() == b'text of %PDF-1.4 same'
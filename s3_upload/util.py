@@ -1,9 +1,14 @@
 import json
+import logging
 import math
 import os
 from datetime import datetime
 import time
 
+import dateutil.tz
+import numpy as np
+import pandas as pd
+
 
 class Util(object):
     @classmethod
@@ -120,6 +125,35 @@ class Util(object):
         return dt
 
 
+    @classmethod
+    # convert a whole column of dates to UTC timestamps in one pass, with the
+    # same local time rules as convertToUTC. Missing or unparseable dates are
+    # set to missing, the distinct unparseable ones are logged
+    def convertColumnToUTC(cls, dates, format='%d-%b-%y', missing=''):
+        dates = pd.Series(dates, dtype=object)
+        parsed = pd.to_datetime(dates, format=format, errors='coerce')
+
+        given = dates.notnull() & ~dates.isin(['', 'nan'])
+        bad = dates[given & parsed.isnull()].unique()
+        if len(bad):
+            shown = sorted(str(d) for d in bad)[:50]
+            logging.warning('-- {} dates not in format {} set to missing: {}{}'.format(
+                len(bad), format, ', '.join(shown), ' ...' if len(bad) > len(shown) else ''))
+        local = parsed.dt.tz_localize(dateutil.tz.tzlocal(), ambiguous='NaT', nonexistent='NaT')
+        seconds = ((local - pd.Timestamp(0, tz='UTC')) / pd.Timedelta(seconds=1)).to_numpy(dtype=float, copy=True)
+
+        # Times falling into a DST change are left to mktime
+        for i in np.flatnonzero(parsed.notnull().to_numpy() & np.isnan(seconds)):
+            seconds[i] = time.mktime(parsed.iloc[i].timetuple())
+
+        if isinstance(missing, float):
+            seconds[np.isnan(seconds)] = missing
+            return seconds
+
+        converted = seconds.astype(object)
+        converted[np.isnan(seconds)] = missing
+        return converted
+
     @classmethod
     # convert day-month-year to UTC timestamp
     def convertUTCtoText(cls, date, format='%m/%d/%Y'):
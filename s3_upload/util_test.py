@@ -282,3 +282,38 @@ def test_we_do_not_allow_other_objects(util):
     assert not util.allowed_key("13/13473434")
     assert not util.allowed_key("13/13573434")
     assert not util.allowed_key("13/13873434")
+
+
+def test_column_date_conversion_matches_single_conversion(util):
+
+    dates = ['19-AUG-13', '10-MAR-13', '03-NOV-13', '31-DEC-99', '01-JAN-01']
+    rv = util.convertColumnToUTC(dates, '%d-%b-%y')
+
+    assert list(rv) == [util.convertToUTC(d, '%d-%b-%y') for d in dates]
+    assert rv[0] == 1376884800
+
+
+def test_column_date_conversion_keeps_missing_dates(util):
+
+    rv = util.convertColumnToUTC(['19-AUG-13', '', None, float('nan'), 'nan'], '%d-%b-%y')
+
+    assert list(rv) == [1376884800, '', '', '', '']
+
+
+def test_column_date_conversion_logs_unparseable_dates(util, caplog):
+
+    rv = util.convertColumnToUTC(['19-AUG-13', '2013-08-19', '', 'nan', '2013-08-19', '31-FEB-13'], '%d-%b-%y')
+
+    assert list(rv) == [1376884800, '', '', '', '', '']
+    assert '2 dates not in format %d-%b-%y set to missing: 2013-08-19, 31-FEB-13' in caplog.text
+
+
+def test_column_date_conversion_with_sentinel(util):
+
+    rv = util.convertColumnToUTC(['2013-12-17 00:00:00', '2013-11-03 12:30:00', ''],
+                                 '%Y-%m-%d %H:%M:%S', 978325200.0)
+
+    assert rv.dtype == float
+    assert rv[0] == 1387256400
+    assert rv[1] == util.convertToUTC('2013-11-03 12:30:00', '%Y-%m-%d %H:%M:%S')
+    assert rv[2] == 978325200.0
@@ -0,0 +1,306 @@
+import collections
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+# States of the run list load
+LOADING = 'loading'
+LOADED = 'loaded'
+
+# A chunk of the run list held by one worker until expires. token tells the
+# lease apart from a later lease of the same chunk by another worker.
+Lease = collections.namedtuple('Lease', ['chunk', 'keys', 'token', 'expires'])
+
+# A key handed out by LeasedKeys, with the token of the lease it came with
+LeasedKey = collections.namedtuple('LeasedKey', ['token', 'key'])
+
+
+class WorkQueue(object):
+    # Run list split into chunks in a SQLite database shared by all workers
+    # of a stage. Workers lease a chunk at a time, renew the lease while they
+    # work through it and mark it done at the end. The lease of a worker that
+    # stopped runs out and another worker takes the chunk over, so the stage
+    # finishes when the work is done rather than when the slowest worker is.
+    # A chunk with keys that failed goes back to the queue until it has been
+    # leased max_attempts times.
+    def __init__(self, path, lease_seconds=300, poll_seconds=5, timeout=60, max_attempts=3):
+
+        dirname = os.path.dirname(path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+
+        self.conn = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS chunks ('
+                          'id INTEGER PRIMARY KEY, '
+                          'keys TEXT NOT NULL, '
+                          'state TEXT NOT NULL, '
+                          'token TEXT, '
+                          'expires REAL, '
+                          'attempts INTEGER NOT NULL DEFAULT 0)')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS run ('
+                          'id INTEGER PRIMARY KEY CHECK (id = 1), '
+                          'run_id TEXT NOT NULL, '
+                          'state TEXT NOT NULL, '
+                          'token TEXT, '
+                          'chunks INTEGER NOT NULL, '
+                          'updated REAL NOT NULL)')
+
+    def transaction(self, func, *args):
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                rv = func(*args)
+            except:
+                self.conn.execute('ROLLBACK')
+                raise
+            self.conn.execute('COMMIT')
+            return rv
+
+    def execute(self, sql, args=()):
+        with self.lock:
+            return self.conn.execute(sql, args).rowcount
+
+    def load(self, keys, chunksize=100, run_id='', batch_chunks=100):
+        # Splits keys, the run list run_id, into chunks. Only the first worker
+        # to get here loads them, committing batch_chunks chunks at a time so
+        # the database is not locked for the whole run list. The others wait
+        # for the load to finish and just join in. A queue of another run list
+        # is cleared first, and a load that stopped for lease_seconds is
+        # started over. Returns the number of chunks loaded by this worker, 0
+        # when the queue was loaded by another.
+        token = uuid.uuid4().hex
+        while True:
+            state = self.transaction(self.claim_load, run_id, token)
+            if state == LOADED:
+                return 0
+            if state == LOADING:
+                n = self.load_chunks(keys, chunksize, batch_chunks, token)
+                if n is not None:
+                    return n
+                # Taken over, the keys are gone so only wait for the other load
+                token = None
+            time.sleep(self.poll_seconds)
+
+    def claim_load(self, run_id, token):
+        # LOADED when the run list is in, LOADING when it is this worker's to
+        # load, None while another worker loads it
+        t = time.time()
+        row = self.conn.execute('SELECT run_id, state, updated FROM run').fetchone()
+        if row is not None and row[0] == run_id:
+            if row[1] == LOADED:
+                return LOADED
+            if row[2] + self.lease_seconds > t:
+                return None
+        if token is None:
+            return None
+
+        self.conn.execute('DELETE FROM chunks')
+        self.conn.execute('INSERT OR REPLACE INTO run (id, run_id, state, token, chunks, updated) '
+                          'VALUES (1, ?, ?, ?, 0, ?)', (run_id, LOADING, token, t))
+        return LOADING
+
+    def load_chunks(self, keys, chunksize, batch_chunks, token):
+        # Returns the number of chunks, None when the load was taken over
+        def add(batch, n, state):
+            row = self.conn.execute('SELECT token FROM run').fetchone()
+            if row is None or row[0] != token:
+                return False
+            for chunk in batch:
+                self.add_chunk(chunk)
+            self.conn.execute('UPDATE run SET state = ?, chunks = ?, updated = ?', (state, n, time.time()))
+            return True
+
+        n = 0
+        batch = []
+        chunk = []
+        for key in keys:
+            chunk.append(key)
+            if len(chunk) == chunksize:
+                batch.append(chunk)
+                chunk = []
+            if len(batch) == batch_chunks:
+                n += len(batch)
+                if not self.transaction(add, batch, n, LOADING):
+                    return None
+                batch = []
+        if chunk:
+            batch.append(chunk)
+        n += len(batch)
+        if not self.transaction(add, batch, n, LOADED):
+            return None
+        return n
+
+    def add_chunk(self, chunk):
+        self.conn.execute('INSERT INTO chunks (keys, state) VALUES (?, ?)', (json.dumps(chunk), PENDING))
+
+    def lease(self, now=None):
+        # Leases the first pending chunk, or the first one whose lease ran
+        # out. Returns None when there is neither.
+        def take():
+            t = time.time() if now is None else now
+            row = self.conn.execute('SELECT id, keys FROM chunks '
+                                    'WHERE state = ? OR (state = ? AND expires < ?) '
+                                    'ORDER BY id LIMIT 1', (PENDING, LEASED, t)).fetchone()
+            if row is None:
+                return None
+
+            token = uuid.uuid4().hex
+            expires = t + self.lease_seconds
+            self.conn.execute('UPDATE chunks SET state = ?, token = ?, expires = ?, attempts = attempts + 1 '
+                              'WHERE id = ?', (LEASED, token, expires, row[0]))
+            return Lease(row[0], json.loads(row[1]), token, expires)
+
+        return self.transaction(take)
+
+    def renew(self, lease, now=None):
+        # Extends a lease, returns None when it was taken over by another
+        # worker in the meantime
+        t = time.time() if now is None else now
+        expires = t + self.lease_seconds
+        updated = self.execute('UPDATE chunks SET expires = ? WHERE id = ? AND token = ? AND state = ?',
+                               (expires, lease.chunk, lease.token, LEASED))
+        if updated != 1:
+            return None
+        return lease._replace(expires=expires)
+
+    def release(self, lease):
+        # Hands a chunk back unfinished
+        self.execute('UPDATE chunks SET state = ?, token = NULL, expires = NULL '
+                     'WHERE id = ? AND token = ? AND state = ?',
+                     (PENDING, lease.chunk, lease.token, LEASED))
+
+    def complete(self, lease):
+        updated = self.execute('UPDATE chunks SET state = ?, expires = NULL WHERE id = ? AND token = ?',
+                               (DONE, lease.chunk, lease.token))
+        return updated == 1
+
+    def fail(self, lease):
+        # Hands back a chunk some keys of which failed, for another try. After
+        # max_attempts leases it is left failed, for a rerun of the stage.
+        updated = self.execute('UPDATE chunks SET state = CASE WHEN attempts < ? THEN ? ELSE ? END, '
+                               'token = NULL, expires = NULL WHERE id = ? AND token = ? AND state = ?',
+                               (self.max_attempts, PENDING, FAILED, lease.chunk, lease.token, LEASED))
+        return updated == 1
+
+    def counts(self):
+        counts = dict.fromkeys([PENDING, LEASED, DONE, FAILED], 0)
+        with self.lock:
+            rows = self.conn.execute('SELECT state, COUNT(*) FROM chunks GROUP BY state').fetchall()
+        for state, n in rows:
+            counts[state] = n
+        return counts
+
+    def next_expiry(self):
+        with self.lock:
+            row = self.conn.execute('SELECT MIN(expires) FROM chunks WHERE state = ?', (LEASED,)).fetchone()
+        return row[0]
+
+    def leases(self):
+        # Chunks for this worker, one after another. Ends when no chunk is
+        # left to lease, waiting on the chunks other workers still hold in
+        # case their lease runs out.
+        while True:
+            lease = self.lease()
+            if lease is None:
+                expires = self.next_expiry()
+                if expires is None:
+                    return
+                time.sleep(min(self.poll_seconds, max(0.0, expires - time.time()) + 0.01))
+                continue
+            yield lease
+
+    def keep(self, lease):
+        # Renews a lease once a third of it is used up. None when the chunk
+        # was taken over by another worker.
+        if lease.expires - time.time() < self.lease_seconds * 2 / 3:
+            return self.renew(lease)
+        return lease
+
+    def close(self):
+        self.conn.close()
+
+
+class LeasedKeys(object):
+    # Keys of the chunks leased from queue, one chunk after another, for a
+    # consumer that has many keys on the go at once, such as a Pipeline. The
+    # consumer reports each key back with done(), and a chunk is completed
+    # only once all its keys are back, or handed back with fail() when some
+    # failed. The keys are LeasedKey pairs, so a key is told apart from the
+    # same key of an earlier lease of its chunk.
+    def __init__(self, queue):
+        self.queue = queue
+        self.lock = threading.Lock()
+        # token -> [lease, keys not back yet, whether any failed]
+        self.held = collections.OrderedDict()
+
+    def __iter__(self):
+        for lease in self.queue.leases():
+            with self.lock:
+                self.held[lease.token] = [lease, len(lease.keys), False]
+            for key in lease.keys:
+                yield LeasedKey(lease.token, key)
+
+    def done(self, item, failed=False):
+        # Returns the lease the key finished, None while the chunk has keys
+        # out or when it was taken over by another worker
+        with self.lock:
+            held = self.held.get(item.token)
+            if held is None:
+                return None
+            held[1] -= 1
+            held[2] = held[2] or failed
+            if held[1] > 0:
+                return None
+            del self.held[item.token]
+
+        lease, left, failed = held
+        if failed:
+            self.queue.fail(lease)
+        else:
+            self.queue.complete(lease)
+        return lease
+
+    def keep(self):
+        # Renews the leases held, returns those taken over by another worker.
+        # Their keys still out are done by both workers.
+        with self.lock:
+            held = list(self.held.values())
+
+        lost = []
+        for entry in held:
+            lease = self.queue.keep(entry[0])
+            with self.lock:
+                if entry[0].token not in self.held:
+                    # Finished meanwhile
+                    continue
+                if lease is None:
+                    lost.append(entry[0])
+                    del self.held[entry[0].token]
+                else:
+                    entry[0] = lease
+        return lost
+
+    def release(self):
+        # Hands back the chunks with keys still out, when the consumer stops
+        # early
+        with self.lock:
+            held = list(self.held.values())
+            self.held.clear()
+
+        for entry in held:
+            self.queue.release(entry[0])
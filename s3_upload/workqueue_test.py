@@ -0,0 +1,223 @@
+import multiprocessing
+import os
+import time
+
+import pytest
+from pipeline import Pipeline
+from workqueue import WorkQueue, LeasedKeys, PENDING, LEASED, DONE, FAILED
+
+
+@pytest.fixture
+def queue(tmpdir):
+    return WorkQueue(str(tmpdir.join('queue.db')), lease_seconds=60, poll_seconds=0.1)
+
+
+def test_run_list_is_loaded_once(queue):
+    assert queue.load(('k%d' % i for i in range(250)), chunksize=100) == 3
+
+    other = WorkQueue(queue.path)
+    assert other.load(['more'], chunksize=100) == 0
+    assert queue.counts() == {PENDING: 3, LEASED: 0, DONE: 0, FAILED: 0}
+
+
+def test_a_new_run_list_replaces_the_queue(queue):
+    queue.load(['a', 'b', 'c'], chunksize=2, run_id='list1')
+    queue.complete(queue.lease())
+
+    assert WorkQueue(queue.path).load(['a', 'b'], chunksize=2, run_id='list1') == 0
+    assert WorkQueue(queue.path).load(['x', 'y', 'z'], chunksize=1, run_id='list2') == 3
+    assert queue.counts() == {PENDING: 3, LEASED: 0, DONE: 0, FAILED: 0}
+    assert queue.lease().keys == ['x']
+
+
+def test_run_list_is_committed_in_batches(queue):
+    other = WorkQueue(queue.path, timeout=0.5)
+    seen = []
+
+    def keys():
+        for i in range(100):
+            if i == 50:
+                # The first batches are in and the database is not locked
+                seen.append(other.counts()[PENDING])
+                seen.append(other.lease() is not None)
+            yield 'k%d' % i
+
+    assert queue.load(keys(), chunksize=5, batch_chunks=3) == 20
+    assert seen == [9, True]
+
+
+def test_stopped_load_is_started_over(tmpdir):
+    path = str(tmpdir.join('queue.db'))
+
+    def keys():
+        yield 'a'
+        yield 'b'
+        raise IOError('run list gone')
+
+    with pytest.raises(IOError):
+        WorkQueue(path, lease_seconds=0.2).load(keys(), chunksize=1, batch_chunks=1)
+
+    other = WorkQueue(path, lease_seconds=0.2, poll_seconds=0.05)
+    assert other.load(['a', 'b', 'c'], chunksize=1) == 3
+    assert other.counts() == {PENDING: 3, LEASED: 0, DONE: 0, FAILED: 0}
+
+
+def test_leased_chunks_are_not_handed_out_twice(queue):
+    queue.load(['a', 'b', 'c'], chunksize=2)
+
+    first = queue.lease()
+    second = WorkQueue(queue.path).lease()
+
+    assert first.keys == ['a', 'b']
+    assert second.keys == ['c']
+    assert queue.lease() is None
+
+
+def test_expired_leases_are_taken_over(queue):
+    queue.load(['a', 'b'], chunksize=2)
+    stale = queue.lease(now=1000)
+
+    other = WorkQueue(queue.path, lease_seconds=60)
+    assert other.lease(now=1030) is None
+    taken = other.lease(now=1061)
+
+    assert taken.chunk == stale.chunk
+    assert queue.renew(stale) is None
+    assert not queue.complete(stale)
+    assert other.complete(taken)
+    assert queue.counts()[DONE] == 1
+
+
+def test_released_chunks_go_back_to_the_queue(queue):
+    queue.load(['a', 'b', 'c'], chunksize=2)
+
+    queue.release(queue.lease())
+    assert queue.counts() == {PENDING: 2, LEASED: 0, DONE: 0, FAILED: 0}
+
+    for lease in queue.leases():
+        queue.complete(lease)
+    assert queue.counts() == {PENDING: 0, LEASED: 0, DONE: 2, FAILED: 0}
+
+
+def test_failed_chunks_are_retried_up_to_max_attempts(tmpdir):
+    queue = WorkQueue(str(tmpdir.join('queue.db')), max_attempts=2)
+    queue.load(['a', 'b'], chunksize=1)
+
+    leased = []
+    for lease in queue.leases():
+        leased.append(lease.keys)
+        if lease.keys == ['a']:
+            assert queue.fail(lease)
+        else:
+            queue.complete(lease)
+
+    assert leased == [['a'], ['a'], ['b']]
+    assert queue.counts() == {PENDING: 0, LEASED: 0, DONE: 1, FAILED: 1}
+
+
+def test_chunks_read_ahead_are_completed_when_all_their_keys_are_done(queue):
+    queue.load(['a', 'b', 'c', 'd'], chunksize=2)
+    leased = LeasedKeys(queue)
+
+    items = iter(leased)
+    taken = [next(items) for i in range(3)]
+    assert [item.key for item in taken] == ['a', 'b', 'c']
+    assert queue.counts()[LEASED] == 2
+
+    assert leased.done(taken[1]) is None
+    assert leased.done(taken[0]).keys == ['a', 'b']
+    assert queue.counts() == {PENDING: 0, LEASED: 1, DONE: 1, FAILED: 0}
+
+
+def test_chunks_with_failed_keys_are_handed_back(queue):
+    queue.load(['a', 'b'], chunksize=2)
+    leased = LeasedKeys(queue)
+
+    items = iter(leased)
+    leased.done(next(items), failed=True)
+    leased.done(next(items))
+
+    assert queue.counts() == {PENDING: 1, LEASED: 0, DONE: 0, FAILED: 0}
+
+
+def test_chunks_still_out_are_released(queue):
+    queue.load(['a', 'b', 'c'], chunksize=2)
+    leased = LeasedKeys(queue)
+
+    items = iter(leased)
+    leased.done(next(items))
+    next(items)
+    next(items)
+    leased.release()
+
+    assert queue.counts() == {PENDING: 2, LEASED: 0, DONE: 0, FAILED: 0}
+
+
+def test_chunks_taken_over_are_dropped(tmpdir):
+    queue = WorkQueue(str(tmpdir.join('queue.db')), lease_seconds=0.2)
+    queue.load(['a', 'b'], chunksize=2)
+    leased = LeasedKeys(queue)
+
+    item = next(iter(leased))
+    time.sleep(0.3)
+    taken = WorkQueue(queue.path).lease()
+
+    assert [lease.chunk for lease in leased.keep()] == [taken.chunk]
+    assert leased.done(item) is None
+    assert queue.counts()[LEASED] == 1
+
+
+def test_pipeline_runs_on_leased_keys(queue):
+    queue.load(('k%03d' % i for i in range(250)), chunksize=20)
+    leased = LeasedKeys(queue)
+    pipeline = Pipeline(lambda item: item.key, lambda k: k.upper(), lambda k: k, fetchers=4, storers=4,
+                        queue_size=8)
+
+    stored = []
+    for result in pipeline.run(leased):
+        stored.append(result.value)
+        leased.done(result.item, result.error is not None)
+        leased.keep()
+
+    assert sorted(stored) == ['K%03d' % i for i in range(250)]
+    assert queue.counts() == {PENDING: 0, LEASED: 0, DONE: 13, FAILED: 0}
+
+
+def run_worker(path, outdir, n, die):
+    queue = WorkQueue(path, lease_seconds=1, poll_seconds=0.1)
+    queue.load(('k%03d' % i for i in range(400)), chunksize=20)
+
+    with open(os.path.join(outdir, 'worker%d.txt' % n), 'a') as out:
+        for lease in queue.leases():
+            if die:
+                # Stops holding its lease without releasing it
+                os._exit(1)
+            for key in lease.keys:
+                out.write(key + '\n')
+                out.flush()
+                time.sleep(0.002 * (n + 1))
+            queue.complete(lease)
+
+
+def test_workers_share_the_run_list(tmpdir):
+    path = str(tmpdir.join('queue.db'))
+    workers = [multiprocessing.Process(target=run_worker, args=(path, str(tmpdir), n, n == 3))
+               for n in range(4)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join(60)
+
+    done = []
+    per_worker = []
+    for n in range(3):
+        with open(str(tmpdir.join('worker%d.txt' % n))) as fd:
+            keys = fd.read().split()
+        per_worker.append(len(keys))
+        done += keys
+
+    assert sorted(done) == ['k%03d' % i for i in range(400)]
+    assert workers[3].exitcode == 1
+    # the fastest worker did the most
+    assert per_worker[0] > per_worker[2]
+    assert WorkQueue(path).counts() == {PENDING: 0, LEASED: 0, DONE: 20, FAILED: 0}